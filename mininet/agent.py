@@ -0,0 +1,59 @@
+"""
+agent.py: framed protocol for the mnexec command server (mnexec -s)
+
+An AgentHost's namespaces are held open by mnexec -s, which reads
+requests from and writes responses to a socket, one command at a time.
+Each frame is a type byte and a 4-byte (network order) payload length,
+followed by the payload, so output can contain any bytes, and we never
+have to search it for a prompt or PID markers.
+
+Requests:  'c' argv (NUL-separated): run a command
+           'i' data: write data to the command's stdin
+           'z': close the command's stdin
+           's' signal number: signal the command's process group
+Responses: 'r' pid: server ready
+           'p' pid: command started
+           'o' data, 'e' data: command's stdout/stderr
+           'x' status: command exited (128 + signal if killed)
+"""
+
+import struct
+
+from mininet.util import encode
+
+HEADER = struct.Struct( '!cI' )
+
+def packFrame( kind, data=b'' ):
+    """Return a frame as bytes
+       kind: frame type character
+       data: payload (bytes or str)"""
+    if not isinstance( data, bytes ):
+        data = encode( data )
+    return HEADER.pack( encode( kind ), len( data ) ) + data
+
+def packCommand( argv ):
+    "Return a 'c' frame to run argv (list of strings)"
+    return packFrame( 'c', b'\0'.join( encode( arg ) for arg in argv ) )
+
+
+class FrameReader( object ):
+    "Incremental parser for frames received in arbitrary chunks"
+
+    def __init__( self ):
+        self.buf = b''
+
+    def feed( self, data ):
+        """Add data and return a list of complete frames
+           data: bytes received
+           returns: list of ( kind, payload ), where kind is a str"""
+        buf = self.buf + data
+        frames, pos = [], 0
+        while len( buf ) - pos >= HEADER.size:
+            kind, size = HEADER.unpack_from( buf, pos )
+            end = pos + HEADER.size + size
+            if end > len( buf ):
+                break
+            frames.append( ( kind.decode(), buf[ pos + HEADER.size: end ] ) )
+            pos = end
+        self.buf = buf[ pos: ]
+        return frames
@@ -0,0 +1,321 @@
+"""
+cgroup.py: manage cgroups by reading and writing their files directly
+
+CPULimitedHost used to run cgcreate, cgclassify, cgset, cgget and
+cgdelete, so configuring each host took several processes. A Cgroup
+instead creates its directories and writes its parameters and member
+processes itself, so we don't need any processes at all.
+
+We support both the cgroup v1 hierarchy, with a directory for each
+controller (e.g. /sys/fs/cgroup/cpu/h1), and the cgroup v2 unified
+hierarchy, with a single directory (/sys/fs/cgroup/h1) whose files
+are named by controller (e.g. cpu.max). Parameters are given in v1
+terms (e.g. cpu.cfs_quota_us); see setCFS() for the v2 equivalent.
+
+A ResourceSampler reads the CPU, memory and pids accounting files of
+many cgroups at a fixed rate, for per-host utilization time series.
+"""
+
+import os
+import threading
+from array import array
+from errno import EEXIST, ENOENT
+from time import time, sleep
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # ResourceSampler.values() returns lists instead
+
+from mininet.log import debug
+from mininet.util import numCores
+
+CGROUP_DIR = '/sys/fs/cgroup'
+
+
+def cgroupVersion( cgroupDir=CGROUP_DIR ):
+    "Return 2 if cgroupDir is a cgroup v2 (unified) hierarchy, else 1"
+    return ( 2 if os.path.exists( os.path.join( cgroupDir,
+                                                'cgroup.controllers' ) )
+             else 1 )
+
+
+class Cgroup( object ):
+    "A cgroup, managed through its cgroup filesystem files"
+
+    # Controllers that we enable in v2 child cgroups
+    v2Controllers = ( 'cpu', 'cpuset', 'memory', 'pids' )
+
+    # Accounting-only controllers, which we skip if they're unavailable
+    optional = ( 'memory', 'pids' )
+
+    def __init__( self, name,
+                  controllers=( 'cpu', 'cpuacct', 'cpuset', 'memory',
+                                'pids' ),
+                  cgroupDir=CGROUP_DIR ):
+        """name: cgroup name (relative to root cgroup)
+           controllers: v1 controllers that we use
+           cgroupDir: where cgroup filesystems are mounted"""
+        self.name = name
+        self.cgroupDir = cgroupDir
+        self.version = cgroupVersion( cgroupDir )
+        if self.version == 1:
+            controllers = tuple(
+                c for c in controllers if c not in self.optional or
+                os.path.isdir( os.path.join( cgroupDir, c ) ) )
+        self.controllers = controllers
+
+    def dir( self, controller ):
+        "Return our directory for controller"
+        if self.version == 2:
+            return os.path.join( self.cgroupDir, self.name )
+        return os.path.join( self.cgroupDir, controller, self.name )
+
+    def dirs( self ):
+        "Return our (distinct) directories"
+        dirs = []
+        for controller in self.controllers:
+            path = self.dir( controller )
+            if path not in dirs:
+                dirs.append( path )
+        return dirs
+
+    def path( self, resource, param ):
+        "Return path of resource.param, e.g. cpu.cfs_quota_us"
+        return os.path.join( self.dir( resource ),
+                             '%s.%s' % ( resource, param ) )
+
+    def create( self ):
+        "Create our cgroup, enabling v2 controllers if necessary"
+        if self.version == 2:
+            self.enableControllers()
+        for path in self.dirs():
+            try:
+                os.mkdir( path )
+            except OSError as e:
+                if e.errno != EEXIST:
+                    raise
+
+    def enableControllers( self ):
+        "Enable our v2 controllers for child cgroups of the root"
+        path = os.path.join( self.cgroupDir, 'cgroup.subtree_control' )
+        with open( path ) as f:
+            enabled = f.read().split()
+        with open( os.path.join( self.cgroupDir,
+                                 'cgroup.controllers' ) ) as f:
+            available = f.read().split()
+        missing = [ c for c in self.v2Controllers if c not in enabled and
+                    ( c in available or c not in self.optional ) ]
+        if missing:
+            self.writeFile( path, ' '.join( '+' + c for c in missing ) )
+
+    @staticmethod
+    def writeFile( path, value ):
+        "Write value to a cgroup file"
+        debug( '*** cgroup: %s <- %s\n' % ( path, value ) )
+        with open( path, 'w' ) as f:
+            f.write( '%s\n' % value )
+
+    def set( self, resource, param, value ):
+        "Set resource.param to value"
+        self.writeFile( self.path( resource, param ), value )
+
+    def get( self, resource, param ):
+        "Return value of resource.param as a string"
+        with open( self.path( resource, param ) ) as f:
+            return f.read().strip()
+
+    def attach( self, pid, controllers=None ):
+        """Move a process into our cgroup
+           pid: process ID
+           controllers: v1 controllers (default: all but cpuset, which
+                        needs cpus and mems to be set first)"""
+        if self.version == 2:
+            controllers = self.controllers[ :1 ]
+        elif controllers is None:
+            controllers = [ c for c in self.controllers if c != 'cpuset' ]
+        done = []
+        for controller in controllers:
+            path = self.dir( controller )
+            if path not in done:
+                self.writeFile( os.path.join( path, 'cgroup.procs' ), pid )
+                done.append( path )
+
+    def setCFS( self, period, quota ):
+        """Set CFS bandwidth: quota us of CPU time every period us
+           (quota < 0 for unlimited)
+           returns: period and quota that are in effect"""
+        if self.version == 2:
+            self.set( 'cpu', 'max', '%s %d' % (
+                quota if quota >= 0 else 'max', period ) )
+            quota, period = self.get( 'cpu', 'max' ).split()
+            return int( period ), -1 if quota == 'max' else int( quota )
+        self.set( 'cpu', 'cfs_period_us', period )
+        self.set( 'cpu', 'cfs_quota_us', quota )
+        return ( int( self.get( 'cpu', 'cfs_period_us' ) ),
+                 int( self.get( 'cpu', 'cfs_quota_us' ) ) )
+
+    def setCPUs( self, cpus, mems ):
+        """Restrict us to CPUs and memory nodes
+           cpus, mems: strings, e.g. '0-2,4'"""
+        self.set( 'cpuset', 'cpus', cpus )
+        self.set( 'cpuset', 'mems', mems )
+
+    def statPaths( self ):
+        """Return paths of the files that report our CPU time, memory
+           usage and number of processes
+           returns: dict of 'cpu', 'memory' and 'pids' to paths"""
+        if self.version == 2:
+            return { 'cpu': self.path( 'cpu', 'stat' ),
+                     'memory': self.path( 'memory', 'current' ),
+                     'pids': self.path( 'pids', 'current' ) }
+        return { 'cpu': self.path( 'cpuacct', 'usage' ),
+                 'memory': self.path( 'memory', 'usage_in_bytes' ),
+                 'pids': self.path( 'pids', 'current' ) }
+
+    def delete( self ):
+        """Remove our cgroup, which must have no processes
+           returns: True if our cgroup no longer exists"""
+        for path in self.dirs():
+            try:
+                os.rmdir( path )
+            except OSError as e:
+                if e.errno != ENOENT:
+                    debug( '*** cgroup: rmdir %s: %s\n' % ( path, e ) )
+                    return False
+        return True
+
+
+class ResourceSampler( object ):
+    """Sample CPU time, memory usage and process count for several
+       cgroups (e.g. those of CPULimitedHosts) at regular intervals,
+       keeping their stat files open and storing the results in
+       preallocated arrays, indexed by sample and then by host"""
+
+    stats = ( 'cpu', 'memory', 'pids' )
+
+    def __init__( self, hosts, interval=1.0, maxSamples=3600 ):
+        """hosts: hosts (or anything else) with a Cgroup as .cgroup
+           interval: time between samples, in seconds
+           maxSamples: maximum number of samples to store"""
+        self.hosts = list( hosts )
+        self.interval = interval
+        self.maxSamples = maxSamples
+        self.count = 0  # number of samples taken
+        width = len( self.hosts )
+        self.times = array( 'd', [ 0.0 ] ) * maxSamples
+        missing = array( 'd', [ float( 'nan' ) ] )
+        self.data = { stat: missing * ( maxSamples * width )
+                      for stat in self.stats }
+        self.fds = {}  # ( stat, host index ) -> fd of stat file
+        self.versions = []  # cgroup version for each host
+        for i, host in enumerate( self.hosts ):
+            self.versions.append( host.cgroup.version )
+            for stat, path in host.cgroup.statPaths().items():
+                try:
+                    self.fds[ stat, i ] = os.open( path, os.O_RDONLY )
+                except OSError:
+                    debug( '*** ResourceSampler: cannot open %s\n' % path )
+        self.thread, self.running = None, False
+
+    @staticmethod
+    def parse( stat, data, version ):
+        """Return value of stat from stat file contents
+           returns: CPU seconds, memory bytes or process count"""
+        if stat == 'cpu':
+            if version == 2:
+                # cpu.stat: "usage_usec <microseconds>" comes first
+                return int( data.split()[ 1 ] ) / 1e6
+            return int( data ) / 1e9
+        return float( data )
+
+    def sample( self ):
+        """Take a single sample of all stats for all hosts
+           returns: sample index, or None if we're full"""
+        if self.count >= self.maxSamples:
+            return None
+        index, width = self.count, len( self.hosts )
+        self.times[ index ] = time()
+        for ( stat, i ), fd in self.fds.items():
+            os.lseek( fd, 0, os.SEEK_SET )
+            data = os.read( fd, 4096 )
+            try:
+                value = self.parse( stat, data, self.versions[ i ] )
+            except ( ValueError, IndexError ):
+                continue
+            self.data[ stat ][ index * width + i ] = value
+        self.count += 1
+        return index
+
+    def run( self, duration ):
+        """Sample every interval for duration seconds
+           (plus an initial sample)"""
+        start = time()
+        for i in range( int( round( duration / self.interval ) ) + 1 ):
+            self.waitUntil( start + i * self.interval )
+            if self.sample() is None:
+                break
+
+    def start( self ):
+        "Start sampling in a background thread"
+        self.running = True
+        self.thread = threading.Thread( target=self.runUntilStopped )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def runUntilStopped( self ):
+        "Sample every interval until stop() is called or we're full"
+        start, i = time(), 0
+        while self.running and self.sample() is not None:
+            i += 1
+            self.waitUntil( start + i * self.interval )
+
+    @staticmethod
+    def waitUntil( when ):
+        "Sleep until time when"
+        delay = when - time()
+        if delay > 0:
+            sleep( delay )
+
+    def stop( self ):
+        "Stop sampling and wait for our thread to exit"
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def close( self ):
+        "Stop sampling and close our stat files"
+        self.stop()
+        for fd in self.fds.values():
+            os.close( fd )
+        self.fds = {}
+
+    def values( self, stat ):
+        """Return samples of stat for each host: a NumPy array with
+           shape ( samples, hosts ) if NumPy is available, otherwise
+           a list of rows
+           stat: 'cpu' (seconds), 'memory' (bytes) or 'pids'"""
+        width = len( self.hosts )
+        data = self.data[ stat ][ :self.count * width ]
+        if numpy is not None:
+            return numpy.frombuffer( data, dtype=float ).reshape(
+                self.count, width )
+        return [ list( data[ i * width: ( i + 1 ) * width ] )
+                 for i in range( self.count ) ]
+
+    def series( self, host, stat ):
+        """Return samples of stat for a single host
+           returns: list of values"""
+        width, i = len( self.hosts ), self.hosts.index( host )
+        return list( self.data[ stat ][ i: self.count * width: width ] )
+
+    def cpuUtilization( self, host, cores=None ):
+        """Return host's CPU utilization (as a fraction of the whole
+           system) during each sample interval
+           cores: number of cores (default: numCores())"""
+        cpu, times = self.series( host, 'cpu' ), self.times
+        cores = cores or numCores()
+        return [ ( cpu[ j + 1 ] - cpu[ j ] ) /
+                 ( times[ j + 1 ] - times[ j ] ) / cores
+                 for j in range( len( cpu ) - 1 ) ]
@@ -12,11 +12,14 @@
 
 from subprocess import ( Popen, PIPE, check_output as co,
                          CalledProcessError )
+import os
+import socket
 import time
 
 from mininet.log import info
+from mininet.ovsdb import VSwitchDB, OVSDBError
 from mininet.term import cleanUpScreens
-from mininet.util import decode
+from mininet.util import decode, batchRun, recordedNetns, recordNetns
 
 def sh( cmd ):
     "Print a command and send it to the shell"
@@ -39,6 +42,53 @@ def killprocs( pattern ):
         else:
             break
 
+def delBridges( timeout=5 ):
+    """Delete all OVS bridges in a single OVSDB transaction
+       timeout: time to wait for ovs-vswitchd
+       returns: True if there are no bridges left"""
+    try:
+        db = VSwitchDB()
+    except ( socket.error, OSError, OVSDBError ):
+        return False
+    try:
+        names = sorted( db.bridges() )
+        if names:
+            info( 'Deleting bridges using OVSDB: %s\n' % ' '.join( names ) )
+        db.commit( db.delBridgeOps( *names ), timeout=timeout )
+        db.flush()
+        return not db.bridges()
+    except ( socket.error, EOFError, OVSDBError ) as e:
+        info( 'OVSDB error: %s\n' % e )
+        return False
+    finally:
+        db.close()
+
+def staleNetns( netnsDir='/var/run/netns', names=None ):
+    """Return names of network namespaces that Mininet registered (see
+       Node.attachNetnsAll()) which no process is using any more; we
+       leave other namespaces (e.g. from ip netns add) alone
+       netnsDir: directory where ip netns registers namespaces
+       names: names to check (default: recordedNetns())"""
+    names = recordedNetns() if names is None else names
+    inUse = set()
+    for pid in os.listdir( '/proc' ):
+        try:
+            st = os.stat( '/proc/%s/ns/net' % pid )
+            inUse.add( ( st.st_dev, st.st_ino ) )
+        except OSError:
+            pass
+    stale = []
+    for name in names:
+        try:
+            st = os.stat( os.path.join( netnsDir, name ) )
+        except OSError:
+            # Already gone, so it's only our record that is stale
+            stale.append( name )
+            continue
+        if ( st.st_dev, st.st_ino ) not in inUse:
+            stale.append( name )
+    return sorted( stale )
+
 class Cleanup( object ):
     "Wrapper for cleanup()"
 
@@ -78,14 +128,16 @@ def cleanup( cls):
             if dp:
                 sh( 'dpctl deldp ' + dp )
         info( "***  Removing OVS datapaths\n" )
-        dps = sh("ovs-vsctl --timeout=1 list-br").strip().splitlines()
-        if dps:
-            sh( "ovs-vsctl " + " -- ".join( "--if-exists del-br " + dp
-                                            for dp in dps if dp ) )
-        # And in case the above didn't work...
-        dps = sh( "ovs-vsctl --timeout=1 list-br" ).strip().splitlines()
-        for dp in dps:
-            sh( 'ovs-vsctl del-br ' + dp )
+        # Talk to ovsdb-server directly if we can, else use ovs-vsctl
+        if not delBridges():
+            dps = sh("ovs-vsctl --timeout=1 list-br").strip().splitlines()
+            if dps:
+                sh( "ovs-vsctl " + " -- ".join( "--if-exists del-br " + dp
+                                                for dp in dps if dp ) )
+            # And in case the above didn't work...
+            dps = sh( "ovs-vsctl --timeout=1 list-br" ).strip().splitlines()
+            for dp in dps:
+                sh( 'ovs-vsctl del-br ' + dp )
 
         info( "*** Removing all links of the pattern foo-ethX\n" )
         links = sh( "ip link show | "
@@ -105,6 +157,14 @@ def cleanup( cls):
         info( "*** Killing stale mininet node processes\n" )
         killprocs( 'mininet:' )
 
+        info( "*** Removing stale netns registrations\n" )
+        names = staleNetns()
+        if names:
+            info( ' '.join( names ) + '\n' )
+            batchRun( [ 'ip', '-force', '-batch', '-' ],
+                      [ 'netns delete ' + name for name in names ] )
+            recordNetns( remove=names )
+
         info( "*** Shutting down stale tunnels\n" )
         killprocs( 'Tunnel=Ethernet' )
         killprocs( '.ssh/mn')
@@ -27,6 +27,7 @@
 
 from subprocess import call
 from cmd import Cmd
+from fnmatch import fnmatch
 from os import isatty
 from select import poll, POLLIN
 import select
@@ -399,6 +400,84 @@ def do_switch( self, line ):
                 error( 'invalid command: '
                        'switch <switch name> {start, stop}\n' )
 
+    def do_parallel( self, line ):
+        """Run a command on several nodes at once, printing each line
+           of output prefixed with its node's name, and then how long
+           each node took.
+           Usage: parallel <nodes> <cmd>
+           nodes: comma-separated node names or patterns, e.g. h*,s1"""
+        args = line.split( None, 1 )
+        if len( args ) < 2:
+            error( 'usage: parallel <nodes> <cmd>\n' )
+            return
+        patterns = args[ 0 ].split( ',' )
+        nodes = [ node for node in self.mn.values()
+                  if any( fnmatch( node.name, pattern )
+                          for pattern in patterns ) ]
+        if not nodes:
+            error( '*** No nodes match %s\n' % args[ 0 ] )
+            return
+        times = self.runParallel( nodes, self.substitute( args[ 1 ] ) )
+        elapsed = sorted( times.values() )
+        output( '*** Times: %s\n' % ' '.join(
+            '%s %.3fs' % ( node.name, times[ node ] ) for node in nodes ) )
+        output( '*** %d nodes: min %.3fs, median %.3fs, max %.3fs\n' % (
+            len( elapsed ), elapsed[ 0 ], elapsed[ len( elapsed ) // 2 ],
+            elapsed[ -1 ] ) )
+
+    def runParallel( self, nodes, cmd ):
+        """Send cmd to nodes, and print their output, a line at a time
+           and prefixed with node names, as it arrives.
+           nodes: nodes to run cmd on
+           cmd: command string
+           returns: dict of node to seconds it took to complete"""
+        start = time.time()
+        for node in nodes:
+            node.sendCmd( cmd )
+        # Register streams after sendCmd(), which may change them
+        poller, fdToNode, nodeToFd = poll(), {}, {}
+        for node in nodes:
+            fd = nodeToFd[ node ] = node.stdout.fileno()
+            fdToNode[ fd ] = node
+            poller.register( fd, POLLIN )
+        partial = dict.fromkeys( nodes, '' )
+        times = {}
+        while len( times ) < len( nodes ):
+            try:
+                # Nodes may already have buffered output
+                ready = [ node for node in nodes
+                          if node.readbuf and node not in times ]
+                ready += [ fdToNode[ fd ] for fd, _event in
+                           poller.poll( 0 if ready else None ) ]
+                for node in ready:
+                    if node in times:
+                        continue
+                    data = partial[ node ] + node.monitor( timeoutms=0 )
+                    lines = data.split( '\n' )
+                    partial[ node ] = lines.pop()
+                    if not node.waiting:
+                        times[ node ] = time.time() - start
+                        poller.unregister( nodeToFd[ node ] )
+                        if partial[ node ]:
+                            lines.append( partial[ node ] )
+                    for text in lines:
+                        output( '%s: %s\n' % ( node.name,
+                                               text.rstrip( '\r' ) ) )
+            except KeyboardInterrupt:
+                for node in nodes:
+                    if node not in times:
+                        node.sendInt()
+        return times
+
+    def substitute( self, args ):
+        """Return args with node names replaced by their IP addresses
+           args: argument string"""
+        # Addresses are cached until they change (see Intf.currentIP());
+        # if there is no address, then use node name
+        return ' '.join( self.mn[ arg ].defaultIntf().currentIP() or arg
+                         if arg in self.mn else arg
+                         for arg in args.split( ' ' ) )
+
     def default( self, line ):
         """Called on an input line when the command prefix is not recognized.
            Overridden to run shell commands when a node is the first
@@ -413,13 +492,8 @@ def default( self, line ):
                        % first )
                 return
             node = self.mn[ first ]
-            rest = args.split( ' ' )
             # Substitute IP addresses for node names in command
-            # If updateIP() returns None, then use node name
-            rest = [ self.mn[ arg ].defaultIntf().updateIP() or arg
-                     if arg in self.mn else arg
-                     for arg in rest ]
-            rest = ' '.join( rest )
+            rest = self.substitute( args )
             # Run cmd on node:
             node.sendCmd( rest )
             self.waitForNode( node )
@@ -25,7 +25,8 @@
 """
 
 from mininet.log import info, error, debug
-from mininet.util import makeIntfPair
+from mininet.util import makeIntfPair, makeIntfPairs, batchRun, batchRunAll
+from mininet.netlink import NetlinkError
 import re
 
 class Intf( object ):
@@ -43,6 +44,8 @@ def __init__( self, name, node=None, port=None, link=None,
         self.link = link
         self.mac = mac
         self.ip, self.prefixLen = None, None
+        # Has our address changed since we recorded it? (see IP())
+        self.addrStale = False
 
         # if interface is lo, we know the ip is 127.0.0.1.
         # This saves an ifconfig command per node
@@ -64,47 +67,100 @@ def cmd( self, *args, **kwargs ):
         "Run a command in our owning node"
         return self.node.cmd( *args, **kwargs )
 
+    def cmdBatch( self, cmds ):
+        "Run a batch of commands in our owning node (see Node.cmdBatch())"
+        return self.node.cmdBatch( cmds )
+
+    def cmds( self, cmds ):
+        "Run commands one at a time and return their merged output"
+        return ''.join( self.cmd( cmd ) for cmd in cmds if cmd )
+
+    def nl( self ):
+        "Return our node's Netlink socket if it uses netlink, or None"
+        return self.node.nl() if self.node else None
+
+    def nlRun( self, method, *args, **kwargs ):
+        "Call a Netlink method for ourselves (see Node.nlRun())"
+        return self.node.nlRun( method, self.name, *args, **kwargs )
+
+    def ifconfigCmd( self, *args ):
+        "Return ifconfig command to configure ourselves (or None)"
+        return ' '.join( [ 'ifconfig', self.name ] +
+                         [ str( arg ) for arg in args ] )
+
     def ifconfig( self, *args ):
         "Configure ourselves using ifconfig"
-        return self.cmd( 'ifconfig', self.name, *args )
+        cmd = self.ifconfigCmd( *args )
+        return self.cmd( cmd ) if cmd else None
 
-    def setIP( self, ipstr, prefixLen=None ):
-        """Set our IP address"""
+    def ifconfigCmds( self, *args ):
+        "Return list of ifconfig commands for config()"
+        return [ self.ifconfigCmd( *args ) ]
+
+    def setIPCmds( self, ipstr, prefixLen=None ):
+        """Return commands to set our IP address (and record it)"""
         # This is a sign that we should perhaps rethink our prefix
         # mechanism and/or the way we specify IP addresses
         if '/' in ipstr:
             self.ip, self.prefixLen = ipstr.split( '/' )
-            return self.ifconfig( ipstr, 'up' )
+            return [ self.ifconfigCmd( ipstr, 'up' ) ]
         else:
             if prefixLen is None:
                 raise Exception( 'No prefix length set for IP address %s'
                                  % ( ipstr, ) )
             self.ip, self.prefixLen = ipstr, prefixLen
-            return self.ifconfig( '%s/%s' % ( ipstr, prefixLen ) )
+            return [ self.ifconfigCmd( '%s/%s' % ( ipstr, prefixLen ) ) ]
+
+    def setIP( self, ipstr, prefixLen=None ):
+        """Set our IP address"""
+        if self.nl():
+            # Parse and record address, as setIPCmds() does; like
+            # ifconfig, setting an address also sets us up
+            self.setIPCmds( ipstr, prefixLen )
+            result = self.nlRun( 'setIP', self.ip, self.prefixLen, up=True )
+        else:
+            result = self.cmds( self.setIPCmds( ipstr, prefixLen ) )
+        # Our own change isn't news, but other interfaces may be stale
+        self.node.checkAddrs()
+        self.addrStale = False
+        return result
+
+    def setMACCmds( self, macstr ):
+        """Return commands to set our MAC address (and record it)
+           macstr: MAC address as string"""
+        self.mac = macstr
+        return [ self.ifconfigCmd( 'down' ),
+                 self.ifconfigCmd( 'hw', 'ether', macstr ),
+                 self.ifconfigCmd( 'up' ) ]
 
     def setMAC( self, macstr ):
         """Set the MAC address for an interface.
            macstr: MAC address as string"""
-        self.mac = macstr
-        return ( self.ifconfig( 'down' ) +
-                 self.ifconfig( 'hw', 'ether', macstr ) +
-                 self.ifconfig( 'up' ) )
+        if self.nl():
+            self.mac = macstr
+            return self.nlRun( 'setMAC', macstr )
+        return self.cmds( self.setMACCmds( macstr ) )
 
     _ipMatchRegex = re.compile( r'\d+\.\d+\.\d+\.\d+' )
     _macMatchRegex = re.compile( r'..:..:..:..:..:..' )
 
     def updateIP( self ):
         "Return updated IP address based on ifconfig"
+        if self.nl():
+            return self.nlUpdateAddr()[ 0 ]
         # use pexec instead of node.cmd so that we dont read
         # backgrounded output from the cli.
         ifconfig, _err, _exitCode = self.node.pexec(
             'ifconfig %s' % self.name )
         ips = self._ipMatchRegex.findall( ifconfig )
         self.ip = ips[ 0 ] if ips else None
+        self.addrStale = False
         return self.ip
 
     def updateMAC( self ):
         "Return updated MAC address based on ifconfig"
+        if self.nl():
+            return self.nlUpdateAddr()[ 1 ]
         ifconfig = self.ifconfig()
         macs = self._macMatchRegex.findall( ifconfig )
         self.mac = macs[ 0 ] if macs else None
@@ -116,25 +172,57 @@ def updateMAC( self ):
 
     def updateAddr( self ):
         "Return IP address and MAC address based on ifconfig."
+        if self.nl():
+            return self.nlUpdateAddr()
         ifconfig = self.ifconfig()
         ips = self._ipMatchRegex.findall( ifconfig )
         macs = self._macMatchRegex.findall( ifconfig )
         self.ip = ips[ 0 ] if ips else None
         self.mac = macs[ 0 ] if macs else None
+        self.addrStale = False
+        return self.ip, self.mac
+
+    def nlUpdateAddr( self ):
+        "Return IP address and MAC address using netlink"
+        nl = self.nl()
+        try:
+            link = nl.link( self.name )
+            addrs = nl.addrs( link[ 'index' ] )
+        except ( NetlinkError, OSError ) as e:
+            error( 'Error updating %s address: %s\n' % ( self.name, e ) )
+            link, addrs = {}, []
+        self.ip = addrs[ 0 ][ 0 ] if addrs else None
+        self.mac = link.get( 'mac' )
+        self.addrStale = False
         return self.ip, self.mac
 
     def IP( self ):
-        "Return IP address"
+        """Return IP address: the one that we recorded, unless our node
+           has seen address changes since (see Node.watchAddrs())"""
+        if self.node:
+            self.node.checkAddrs()
+        if self.addrStale:
+            self.updateIP()
         return self.ip
 
+    def currentIP( self ):
+        """Return current IP address: IP() if our node is watching for
+           address changes, otherwise updateIP()"""
+        if self.node and self.node.addrWatch:
+            return self.IP()
+        return self.updateIP()
+
     def MAC( self ):
         "Return MAC address"
         return self.mac
 
-    def isUp( self, setUp=False ):
-        "Return whether interface is up"
+    def isUpCmds( self, setUp=False ):
+        "Return commands for isUp()"
+        return self.ifconfigCmds( 'up' ) if setUp else self.ifconfigCmds()
+
+    def isUpResult( self, cmdOutput, setUp=False ):
+        "Return result of isUp() from the output of isUpCmds()"
         if setUp:
-            cmdOutput = self.ifconfig( 'up' )
             # no output indicates success
             if cmdOutput:
                 error( "Error setting %s up: %s " % ( self.name, cmdOutput ) )
@@ -142,13 +230,29 @@ def isUp( self, setUp=False ):
             else:
                 return True
         else:
-            return "UP" in self.ifconfig()
+            return "UP" in cmdOutput
+
+    def isUp( self, setUp=False ):
+        "Return whether interface is up"
+        if self.nl():
+            if setUp:
+                return self.isUpResult( self.nlRun( 'setLinkUp' ), setUp )
+            try:
+                return self.nl().link( self.name )[ 'isUp' ]
+            except ( NetlinkError, OSError ):
+                return False
+        return self.isUpResult( self.cmds( self.isUpCmds( setUp ) ), setUp )
 
     def rename( self, newname ):
         "Rename interface"
         if self.node and self.name in self.node.nameToIntf:
             # rename intf in node's nameToIntf
             self.node.nameToIntf[newname] = self.node.nameToIntf.pop(self.name)
+        if self.nl():
+            result = ( self.nlRun( 'setLinkUp', False ) or
+                       self.nlRun( 'rename', newname ) )
+            self.name = newname
+            return result + self.nlRun( 'setLinkUp' )
         self.ifconfig( 'down' )
         result = self.cmd( 'ip link set', self.name, 'name', newname )
         self.name = newname
@@ -180,6 +284,21 @@ def setParam( self, results, method, **param ):
         results[ name ] = result
         return result
 
+    def setParamCmds( self, steps, method, **param ):
+        """Internal method: like setParam(), but append
+           ( name, commands ) from method to steps for cmdBatch()"""
+        name, value = list( param.items() )[ 0 ]
+        f = getattr( self, method, None )
+        if not f or value is None:
+            return
+        if isinstance( value, list ):
+            cmds = f( *value )
+        elif isinstance( value, dict ):
+            cmds = f( **value )
+        else:
+            cmds = f( value )
+        steps.append( ( name, [ cmd for cmd in cmds if cmd ] ) )
+
     def config( self, mac=None, ip=None, ifconfig=None,
                 up=True, **_params ):
         """Configure Node according to (optional) parameters:
@@ -192,10 +311,27 @@ def config( self, mac=None, ip=None, ifconfig=None,
         # the superclass config method here as follows:
         # r = Parent.config( **params )
         r = {}
-        self.setParam( r, 'setMAC', mac=mac )
-        self.setParam( r, 'setIP', ip=ip )
-        self.setParam( r, 'isUp', up=up )
-        self.setParam( r, 'ifconfig', ifconfig=ifconfig )
+        if self.nl():
+            # Netlink requests don't need the shell, so just call setters
+            self.setParam( r, 'setMAC', mac=mac )
+            self.setParam( r, 'setIP', ip=ip )
+            self.setParam( r, 'isUp', up=up )
+            self.setParam( r, 'ifconfig', ifconfig=ifconfig )
+            return r
+        # Send all of our configuration commands in a single batch
+        steps = []
+        self.setParamCmds( steps, 'setMACCmds', mac=mac )
+        self.setParamCmds( steps, 'setIPCmds', ip=ip )
+        self.setParamCmds( steps, 'isUpCmds', up=up )
+        self.setParamCmds( steps, 'ifconfigCmds', ifconfig=ifconfig )
+        if not steps:
+            return r
+        outputs = iter( self.cmdBatch(
+            [ cmd for _name, cmds in steps for cmd in cmds ] ) )
+        for name, cmds in steps:
+            r[ name ] = ''.join( next( outputs )[ 0 ] or '' for _cmd in cmds )
+        if 'up' in r:
+            r[ 'up' ] = self.isUpResult( r[ 'up' ], up )
         return r
 
     def delete( self ):
@@ -305,12 +441,146 @@ def delayCmds( parent, delay=None, jitter=None,
                 parent = ' parent 10:1 '
         return cmds, parent
 
+    def tcCmd( self, cmd, tc='tc' ):
+        "Return tc command for our interface"
+        return cmd % ( tc, self )  # Add in tc command and our name
+
     def tc( self, cmd, tc='tc' ):
         "Execute tc command for our interface"
-        c = cmd % (tc, self)  # Add in tc command and our name
+        c = self.tcCmd( cmd, tc )
         debug(" *** executing command: %s\n" % c)
         return self.cmd( c )
 
+    # Incremental tc configuration: rather than deleting and
+    # re-creating our qdiscs every time config() is called, we
+    # compute the desired qdisc tree, compare it with the tree we
+    # last applied (if the kernel still has it), and only add or
+    # change what differs, using tc -batch for many intfs at once.
+
+    tcState = None  # qdisc tree we last applied
+    tcPending = None  # ( ethtool command, desired qdisc tree )
+    batch = None  # list of pending TCIntfs (see beginBatch())
+
+    _tcRegex = re.compile( r'%s (qdisc|class) add dev %s\s+'
+                           r'(root|parent \S+)\s+(handle|classid) (\S+) '
+                           r'(\S+)\s*(.*)' )
+
+    @classmethod
+    def tcTree( cls, cmds ):
+        """Return qdisc tree for tc command templates from bwCmds()
+           and delayCmds(), as a list of ( type, parent, idtype, id,
+           kind, args ) with the root qdisc first"""
+        tree = []
+        for cmd in cmds:
+            match = cls._tcRegex.match( cmd.strip() )
+            if not match:
+                raise Exception( 'TCIntf: cannot parse tc command ' + cmd )
+            tree.append( match.groups() )
+        return tree
+
+    @staticmethod
+    def tcLine( verb, dev, entry ):
+        "Return tc -batch line to add/change an entry in a qdisc tree"
+        objtype, parent, idtype, ident, kind, args = entry
+        return ' '.join( [ objtype, verb, 'dev', dev, parent,
+                           idtype, ident, kind, args ] ).strip()
+
+    @staticmethod
+    def tcHandle( handle ):
+        "Return canonical qdisc handle as shown by tc (e.g. 5:0 -> 5:)"
+        return handle[ :-1 ] if handle.endswith( ':0' ) else handle
+
+    @classmethod
+    def tcDiff( cls, dev, current, desired, root ):
+        """Return tc -batch lines to change current tree to desired tree
+           dev: interface name
+           current: tree we last applied (or None)
+           desired: desired tree (see tcTree())
+           root: ( kind, handle ) of root qdisc in kernel (or None)"""
+        valid = bool( current ) and root == (
+            current[ 0 ][ 4 ], cls.tcHandle( current[ 0 ][ 3 ] ) )
+        if not desired:
+            # Remove our configuration, if we have one
+            return [ 'qdisc del dev %s root' % dev ] if valid else []
+
+        def structure( tree ):
+            "Return tree without parameters"
+            return [ entry[ :5 ] for entry in tree ]
+        if valid and structure( current ) == structure( desired ):
+            # Same qdiscs and classes: just change parameters
+            return [ cls.tcLine( 'change', dev, new )
+                     for old, new in zip( current, desired ) if old != new ]
+        # Otherwise, rebuild from scratch
+        lines = []
+        if root and root[ 1 ] != '0:':
+            lines.append( 'qdisc del dev %s root' % dev )
+        lines += [ cls.tcLine( 'add', dev, entry ) for entry in desired ]
+        return lines
+
+    @staticmethod
+    def tcRoots( qdiscs ):
+        "Return dict of dev to root ( kind, handle ) from tc qdisc show"
+        roots = {}
+        for line in qdiscs.split( '\n' ):
+            match = re.match( r'qdisc (\S+) (\S+) dev (\S+) root', line )
+            if match:
+                kind, handle, dev = match.groups()
+                roots[ dev ] = ( kind, handle )
+        return roots
+
+    @classmethod
+    def beginBatch( cls ):
+        """Defer applying config() for TCIntfs until endBatch(), which
+           configures them in a single batch per node"""
+        if TCIntf.batch is None:
+            TCIntf.batch = []
+
+    @classmethod
+    def endBatch( cls ):
+        "Apply deferred configuration (see beginBatch())"
+        intfs, TCIntf.batch = TCIntf.batch or [], None
+        return cls.applyBatch( intfs )
+
+    @classmethod
+    def applyBatch( cls, intfs ):
+        """Apply pending configuration for intfs: run their ethtool
+           commands in one cmdBatch() and their tc changes in one
+           tc -batch per node
+           returns: dict of intf to list of tc errors (or '')"""
+        nodes, results = {}, {}
+        for intf in intfs:
+            if intf.tcPending:
+                nodes.setdefault( intf.node, [] ).append( intf )
+        for node, nodeIntfs in nodes.items():
+            cmds = [ intf.tcPending[ 0 ] for intf in nodeIntfs ]
+            needTC = any( intf.tcPending[ 1 ] or intf.tcState
+                          for intf in nodeIntfs )
+            if needTC:
+                cmds.append( 'tc qdisc show' )
+            outputs = node.cmdBatch( cmds )
+            roots = cls.tcRoots( outputs[ -1 ][ 0 ] or '' ) if needTC else {}
+            lines, owners = [], []
+            for intf in nodeIntfs:
+                desired = intf.tcPending[ 1 ]
+                intfLines = cls.tcDiff( intf.name, intf.tcState, desired,
+                                        roots.get( intf.name ) )
+                lines += intfLines
+                owners += [ intf ] * len( intfLines )
+                intf.tcState, intf.tcPending = desired, None
+                results[ intf ] = []
+            if not lines:
+                continue
+            debug( 'tc -batch for %s: %s\n' % ( node, lines ) )
+            errors = batchRun( [ 'tc', '-force', '-batch', '-' ], lines,
+                               node if node.inNamespace else None )
+            for intf, line, err in zip( owners, lines, errors ):
+                results[ intf ].append( err )
+                if err:
+                    error( '*** Error: %s: %s' % ( line, err ) )
+                    # Rebuild from scratch next time
+                    intf.tcState = None
+        return results
+
     def config( self, bw=None, delay=None, jitter=None, loss=None,
                 gro=False, txo=True, rxo=True,
                 speedup=0, use_hfsc=False, use_tbf=False,
@@ -342,31 +612,15 @@ def on( isOn ):
             return 'on' if isOn else 'off'
 
         # Set offload parameters with ethool
-        self.cmd( 'ethtool -K', self,
-                  'gro', on( gro ),
-                  'tx', on( txo ),
-                  'rx', on( rxo ) )
-
-        # Optimization: return if nothing else to configure
-        # Question: what happens if we want to reset things?
-        if ( bw is None and not delay and not loss
-             and max_queue_size is None ):
-            return
-
-        # Clear existing configuration
-        tcoutput = self.tc( '%s qdisc show dev %s' )
-        if "priomap" not in tcoutput and "noqueue" not in tcoutput:
-            cmds = [ '%s qdisc del dev %s root' ]
-        else:
-            cmds = []
+        ethtool = 'ethtool -K %s gro %s tx %s rx %s' % (
+                  self, on( gro ), on( txo ), on( rxo ) )
 
         # Bandwidth limits via various methods
-        bwcmds, parent = self.bwCmds( bw=bw, speedup=speedup,
-                                      use_hfsc=use_hfsc, use_tbf=use_tbf,
-                                      latency_ms=latency_ms,
-                                      enable_ecn=enable_ecn,
-                                      enable_red=enable_red )
-        cmds += bwcmds
+        cmds, parent = self.bwCmds( bw=bw, speedup=speedup,
+                                    use_hfsc=use_hfsc, use_tbf=use_tbf,
+                                    latency_ms=latency_ms,
+                                    enable_ecn=enable_ecn,
+                                    enable_red=enable_red )
 
         # Delay/jitter/loss/max_queue_size using netem
         delaycmds, parent = self.delayCmds( delay=delay, jitter=jitter,
@@ -374,28 +628,30 @@ def on( isOn ):
                                             max_queue_size=max_queue_size,
                                             parent=parent )
         cmds += delaycmds
+        self.tcPending = ( ethtool, self.tcTree( cmds ) )
+
+        if cmds:
+            # Ugly but functional: display configuration info
+            stuff = ( ( [ '%.2fMbit' % bw ] if bw is not None else [] ) +
+                      ( [ '%s delay' % delay ] if delay is not None
+                        else [] ) +
+                      ( [ '%s jitter' % jitter ] if jitter is not None
+                        else [] ) +
+                      ( ['%.5f%% loss' % loss ] if loss is not None
+                        else [] ) +
+                      ( [ 'ECN' ] if enable_ecn else [ 'RED' ]
+                        if enable_red else [] ) )
+            info( '(' + ' '.join( stuff ) + ') ' )
+            result[ 'parent' ] = parent
+
+        if TCIntf.batch is not None:
+            # endBatch() will configure us
+            TCIntf.batch.append( self )
+        else:
+            result[ 'tcoutputs' ] = self.applyBatch( [ self ] )[ self ]
 
-        # Ugly but functional: display configuration info
-        stuff = ( ( [ '%.2fMbit' % bw ] if bw is not None else [] ) +
-                  ( [ '%s delay' % delay ] if delay is not None else [] ) +
-                  ( [ '%s jitter' % jitter ] if jitter is not None else [] ) +
-                  ( ['%.5f%% loss' % loss ] if loss is not None else [] ) +
-                  ( [ 'ECN' ] if enable_ecn else [ 'RED' ]
-                    if enable_red else [] ) )
-        info( '(' + ' '.join( stuff ) + ') ' )
-
-        # Execute all the commands in our node
-        debug("at map stage w/cmds: %s\n" % cmds)
-        tcoutputs = [ self.tc(cmd) for cmd in cmds ]
-        for output in tcoutputs:
-            if output != '':
-                error( "*** Error: %s" % output )
-        debug( "cmds:", cmds, '\n' )
-        debug( "outputs:", tcoutputs, '\n' )
-        result[ 'tcoutputs'] = tcoutputs
-        result[ 'parent' ] = parent
-
-        return result
+        # Return None (as we used to) if we have nothing to configure
+        return result if cmds or self.tcState else None
 
 
 class Link( object ):
@@ -407,7 +663,7 @@ class Link( object ):
     def __init__( self, node1, node2, port1=None, port2=None,
                   intfName1=None, intfName2=None, addr1=None, addr2=None,
                   intf=Intf, cls1=None, cls2=None, params1=None,
-                  params2=None, fast=True, **params ):
+                  params2=None, fast=True, batch=False, **params ):
         """Create veth link to another node, making two new interfaces.
            node1: first node
            node2: second node
@@ -419,6 +675,7 @@ def __init__( self, node1, node2, port1=None, port2=None,
            intfName2: node2  interface name (optional)
            params1: parameters for interface 1 (optional)
            params2: parameters for interface 2 (optional)
+           batch: defer creating interfaces to makeIntfPairs()?
            **params: additional parameters for both interfaces"""
 
         # This is a bit awkward; it seems that having everything in
@@ -430,6 +687,9 @@ def __init__( self, node1, node2, port1=None, port2=None,
             params1[ 'port' ] = port1
         if port2 is not None:
             params2[ 'port' ] = port2
+        # We can only defer creating interfaces if we know our ports
+        batch = ( batch and 'port' in params1 and 'port' in params2 and
+                  fast and self.canBatch() )
         if 'port' not in params1:
             params1[ 'port' ] = node1.newPort()
         if 'port' not in params2:
@@ -444,28 +704,71 @@ def __init__( self, node1, node2, port1=None, port2=None,
         params2.update( params )
 
         self.fast = fast
+        if not cls1:
+            cls1 = intf
+        if not cls2:
+            cls2 = intf
+
+        # Save arguments for finishInit()
+        self.pair = ( intfName1, intfName2, addr1, addr2, node1, node2 )
+        self.intfArgs = ( ( cls1, intfName1, node1, addr1, params1 ),
+                          ( cls2, intfName2, node2, addr2, params2 ) )
+        self.intf1, self.intf2 = None, None
+
         if fast:
             params1.setdefault( 'moveIntfFn', self._ignore )
             params2.setdefault( 'moveIntfFn', self._ignore )
+            if batch:
+                # makeIntfPairs() will create our pair and call finishInit()
+                self.pending = True
+                return
             self.makeIntfPair( intfName1, intfName2, addr1, addr2,
                                node1, node2, deleteIntfs=False )
         else:
             self.makeIntfPair( intfName1, intfName2, addr1, addr2 )
 
-        if not cls1:
-            cls1 = intf
-        if not cls2:
-            cls2 = intf
+        self.finishInit()
 
-        intf1 = cls1( name=intfName1, node=node1,
-                      link=self, mac=addr1, **params1  )
-        intf2 = cls2( name=intfName2, node=node2,
-                      link=self, mac=addr2, **params2 )
+    # pylint: enable=too-many-branches
 
+    pending = False  # waiting for makeIntfPairs()?
+
+    def finishInit( self ):
+        "Create our interfaces once our pair has been created"
+        self.pending = False
+        intfs = [ cls( name=name, node=node, link=self, mac=addr, **params )
+                  for cls, name, node, addr, params in self.intfArgs ]
         # All we are is dust in the wind, and our two interfaces
-        self.intf1, self.intf2 = intf1, intf2
+        self.intf1, self.intf2 = intfs
 
-    # pylint: enable=too-many-branches
+    def canBatch( self ):
+        """Can makeIntfPairs() create our pair? Only if we use the
+           default makeIntfPair()"""
+        return ( getattr( self.makeIntfPair, '__func__', None ) is
+                 Link.makeIntfPair.__func__ )
+
+    @classmethod
+    def makeIntfPairs( cls, links, chunkSize=1000 ):
+        """Create interface pairs for links created with batch=True
+           using ip -batch, and then finish initializing the links
+           links: list of links (those not pending are ignored)
+           chunkSize: maximum number of pairs per ip command
+           raises Exception on failure, like makeIntfPair()"""
+        assert cls
+        links = [ link for link in links if getattr( link, 'pending', False ) ]
+        errors = makeIntfPairs( [ link.pair for link in links ],
+                                chunkSize=chunkSize )
+        # Configure any TCIntfs in a single batch per node
+        TCIntf.beginBatch()
+        try:
+            for link, err in zip( links, errors ):
+                if err:
+                    raise Exception(
+                        "Error creating interface pair (%s,%s): %s " %
+                        ( link.pair[ 0 ], link.pair[ 1 ], err ) )
+                link.finishInit()
+        finally:
+            TCIntf.endBatch()
 
     @staticmethod
     def _ignore( *args, **kwargs ):
@@ -506,6 +809,54 @@ def stop( self ):
         "Override to stop and clean up link as needed"
         self.delete()
 
+    def canBatchStop( self ):
+        """Can batchStop() stop us? Only if we use the default stop()
+           and delete() methods for us and our interfaces"""
+        def isDefault( method, default ):
+            "Is method the default implementation?"
+            return ( getattr( method, '__func__', None ) is
+                     getattr( default, '__func__', default ) )
+        return bool( self.intf1 and self.intf2 and
+                     isDefault( self.stop, Link.stop ) and
+                     isDefault( self.delete, Link.delete ) and
+                     isDefault( self.intf1.delete, Intf.delete ) and
+                     isDefault( self.intf2.delete, Intf.delete ) )
+
+    @classmethod
+    def batchStop( cls, links ):
+        """Stop links using ip -batch rather than running ip link del
+           in a node's shell for each interface. Since deleting one end
+           of a veth pair deletes the other, we delete the end in the
+           root namespace if there is one, so that we usually need one
+           ip command for the root namespace plus one for each other
+           namespace, all of which run in parallel
+           links: links to stop (those which can't be batched are
+                  ignored, see canBatchStop())
+           returns: list of links which were stopped"""
+        assert cls
+        links = [ link for link in links if link.canBatchStop() ]
+        nodeLines = {}
+        for link in links:
+            intf = link.intf1
+            if intf.node.inNamespace and not link.intf2.node.inNamespace:
+                intf = link.intf2
+            if isinstance( intf, OVSIntf ):
+                continue  # patch ports are deleted with their switches
+            node = intf.node if intf.node.inNamespace else None
+            nodeLines.setdefault( node, [] ).append( 'link del %s' % intf )
+        results = batchRunAll( [ 'ip', '-force', '-batch', '-' ],
+                               nodeLines )
+        for node, errors in results.items():
+            for line, err in zip( nodeLines[ node ], errors ):
+                if err:
+                    debug( '*** batchStop: %s: %s' % ( line, err ) )
+        for link in links:
+            for intf in link.intf1, link.intf2:
+                intf.node.delIntf( intf )
+                intf.link = None
+            link.intf1 = link.intf2 = None
+        return links
+
     def status( self ):
         "Return link status as a string"
         return "(%s %s)" % ( self.intf1.status(), self.intf2.status() )
@@ -517,11 +868,15 @@ def __str__( self ):
 class OVSIntf( Intf ):
     "Patch interface on an OVSSwitch"
 
-    def ifconfig( self, *args ):
+    def nl( self ):
+        "Patch ports aren't kernel interfaces, so we never use netlink"
+        return None
+
+    def ifconfigCmd( self, *args ):
         cmd = ' '.join( args )
         if cmd == 'up':
             # OVSIntf is always up
-            return
+            return None
         else:
             raise Exception( 'OVSIntf cannot do ifconfig ' + cmd )
 
@@ -93,6 +93,7 @@
 import random
 
 from time import sleep
+from subprocess import STDOUT
 from itertools import chain, groupby
 from math import ceil
 
@@ -102,14 +103,78 @@
                            Controller )
 from mininet.nodelib import NAT
 from mininet.link import Link, Intf
+from mininet.cgroup import ResourceSampler
+from mininet.placement import CpuPlacer
 from mininet.util import ( quietRun, fixLimits, numCores, ensureRoot,
                            macColonHex, ipStr, ipParse, netParse, ipAdd,
-                           waitListening, BaseString )
+                           waitListening, BaseString, PhaseTimer, pmonitor,
+                           batchRunAll, IndexedList )
 from mininet.term import cleanUpScreens, makeTerms
 
 # Mininet version: should be consistent with README and LICENSE
 VERSION = "2.3.0d6"
 
+class PingMatrix( object ):
+    """Results of pinging between all pairs of a list of hosts
+       (see Mininet.pingMatrix())"""
+
+    def __init__( self, hosts ):
+        self.hosts = list( hosts )
+        # ( src, dst ) -> ( sent, received, rttmin, rttavg, rttmax, rttdev )
+        self.results = {}
+
+    def add( self, src, dst, result ):
+        "Record ping result for src -> dst"
+        self.results[ src, dst ] = result
+
+    def result( self, src, dst ):
+        "Return ( sent, received, rttmin, rttavg, rttmax, rttdev ) or None"
+        return self.results.get( ( src, dst ) )
+
+    def loss( self, src, dst ):
+        "Return packet loss percentage for src -> dst, or None"
+        result = self.result( src, dst )
+        if not result or not result[ 0 ]:
+            return None
+        sent, received = result[ :2 ]
+        return 100.0 * ( sent - received ) / sent
+
+    def rtt( self, src, dst ):
+        "Return average rtt in ms for src -> dst, or None"
+        result = self.result( src, dst )
+        return result[ 3 ] if result and result[ 1 ] else None
+
+    def matrix( self, value=None ):
+        """Return N x N list of lists of value( src, dst ), with
+           None on the diagonal
+           value: function of src, dst (default: loss())"""
+        value = value or self.loss
+        return [ [ value( src, dst ) if src != dst else None
+                   for dst in self.hosts ] for src in self.hosts ]
+
+    def packets( self ):
+        "Return total packets sent and received"
+        sent = sum( r[ 0 ] for r in self.results.values() )
+        received = sum( r[ 1 ] for r in self.results.values() )
+        return sent, received
+
+    def ploss( self ):
+        "Return overall packet loss percentage, or None if nothing was sent"
+        sent, received = self.packets()
+        return 100.0 * ( sent - received ) / sent if sent else None
+
+    def __str__( self ):
+        "Return loss matrix as a table"
+        names = [ h.name for h in self.hosts ]
+        width = max( [ len( n ) for n in names ] + [ 4 ] )
+        fmt = '%%%ds' % width
+        lines = [ ' '.join( [ fmt % '' ] + [ fmt % n for n in names ] ) ]
+        for name, row in zip( names, self.matrix() ):
+            cells = [ '-' if loss is None else '%d%%' % loss for loss in row ]
+            lines.append( ' '.join( fmt % c for c in [ name ] + cells ) )
+        return '\n'.join( lines )
+
+
 class Mininet( object ):
     "Network emulation with hosts spawned in network namespaces."
 
@@ -118,7 +183,8 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
                   build=True, xterms=False, cleanup=False, ipBase='10.0.0.0/8',
                   inNamespace=False,
                   autoSetMacs=False, autoStaticArp=False, autoPinCpus=False,
-                  listenPort=None, waitConnected=False ):
+                  listenPort=None, waitConnected=False, netlink=False,
+                  netns=False, pool=None ):
         """Create Mininet object.
            topo: Topo (topology) object or None
            switch: default Switch class
@@ -134,8 +200,13 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
            autoSetMacs: set MAC addrs automatically like IP addresses?
            autoStaticArp: set all-pairs static MAC addrs?
            autoPinCpus: pin hosts to (real) cores (requires CPULimitedHost)?
+               (True or a CpuPlacer)
            listenPort: base listening port to open; will be incremented for
-               each additional switch in the net if inNamespace=False"""
+               each additional switch in the net if inNamespace=False
+           netlink: configure hosts and switches using netlink?
+           netns: register hosts' and switches' namespaces with ip netns
+               under their names, e.g. for ip -n <name>?
+           pool: NodePool for reusing hosts and switches (see pool.py)"""
         self.topo = topo
         self.switch = switch
         self.host = host
@@ -154,19 +225,32 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
         self.autoStaticArp = autoStaticArp
         self.autoPinCpus = autoPinCpus
         self.numCores = numCores()
-        self.nextCore = 0  # next core for pinning hosts to CPUs
+        self.cpuPlan = {}  # host name -> CPU (see cpuFor())
         self.listenPort = listenPort
         self.waitConn = waitConnected
+        self.netlink = netlink
+        self.netns = netns
+        self.pool = pool
 
-        self.hosts = []
-        self.switches = []
-        self.controllers = []
-        self.links = []
+        # IndexedLists (rather than lists) so that we can add and
+        # delete nodes and links in constant time
+        self.hosts = IndexedList()
+        self.switches = IndexedList()
+        self.controllers = IndexedList()
+        self.links = IndexedList()
 
         self.nameToNode = {}  # name to Node (Host/Switch) objects
+        self.nodeLinks = {}  # node to IndexedList of its links
+        self.linkNodes = {}  # link to ( node1, node2 )
+        self.nodePairLinks = {}  # frozenset( node1, node2 ) to links
 
         self.terms = []  # list of spawned xterm processes
 
+        self.buildTimes = None  # PhaseTimer for buildFromTopo()
+        self.stopTimes = None  # PhaseTimer for stop()
+        self.lastPing = None  # PingMatrix from last ping()/pingFull()
+        self.arpEntries = {}  # host -> ( IP, MAC ) from staticArp()
+
         Mininet.init()  # Initialize Mininet if necessary
 
         self.built = False
@@ -182,18 +266,30 @@ def waitConnected( self, timeout=None, delay=.5 ):
         info( '*** Waiting for switches to connect\n' )
         time = 0
         remaining = list( self.switches )
-        while True:
-            for switch in tuple( remaining ):
-                if switch.connected():
-                    info( '%s ' % switch )
-                    remaining.remove( switch )
+        # Wait for all switches using a single OVSDB monitor if we can
+        waitAll = [ s.waitConnectedAll for s in remaining
+                    if hasattr( s, 'waitConnectedAll' ) ]
+        result = ( waitAll[ 0 ]( remaining, timeout=timeout, delay=delay )
+                   if waitAll else None )
+        if result is not None:
+            remaining, time = result, timeout
             if not remaining:
                 info( '\n' )
                 return True
-            if timeout is not None and time > timeout:
-                break
-            sleep( delay )
-            time += delay
+        else:
+            # Poll each switch
+            while True:
+                for switch in tuple( remaining ):
+                    if switch.connected():
+                        info( '%s ' % switch )
+                        remaining.remove( switch )
+                if not remaining:
+                    info( '\n' )
+                    return True
+                if timeout is not None and time > timeout:
+                    break
+                sleep( delay )
+                time += delay
         warn( 'Timed out after %d seconds\n' % time )
         for switch in remaining:
             if not switch.connected():
@@ -217,19 +313,23 @@ def addHost( self, name, cls=None, **params ):
         if self.autoSetMacs:
             defaults[ 'mac' ] = macColonHex( self.nextIP )
         if self.autoPinCpus:
-            defaults[ 'cores' ] = self.nextCore
-            self.nextCore = ( self.nextCore + 1 ) % self.numCores
+            defaults[ 'cores' ] = self.cpuFor( name )
+        if self.netlink:
+            defaults[ 'netlink' ] = True
+        if self.netns:
+            defaults[ 'netns' ] = True
         self.nextIP += 1
         defaults.update( params )
         if not cls:
             cls = self.host
-        h = cls( name, **defaults )
+        h = ( self.pool.node( cls, name, **defaults ) if self.pool else
+              cls( name, **defaults ) )
         self.hosts.append( h )
         self.nameToNode[ name ] = h
         return h
 
     def delNode( self, node, nodes=None):
-        """Delete node
+        """Delete node (and any links to it)
            node: node to delete
            nodes: optional list to delete from (e.g. self.hosts)"""
         if nodes is None:
@@ -237,6 +337,10 @@ def delNode( self, node, nodes=None):
                       ( self.switches if node in self.switches else
                         ( self.controllers if node in self.controllers else
                           [] ) ) )
+        if node in self.arpEntries:
+            self.delStaticArp( [ node ] )
+        for link in self.linksFor( node ):
+            self.delLink( link )
         node.stop( deleteIntfs=True )
         node.terminate()
         nodes.remove( node )
@@ -254,10 +358,15 @@ def addSwitch( self, name, cls=None, **params ):
            side effect: increments listenPort ivar ."""
         defaults = { 'listenPort': self.listenPort,
                      'inNamespace': self.inNamespace }
+        if self.netlink:
+            defaults[ 'netlink' ] = True
+        if self.netns:
+            defaults[ 'netns' ] = True
         defaults.update( params )
         if not cls:
             cls = self.switch
-        sw = cls( name, **defaults )
+        sw = ( self.pool.node( cls, name, **defaults ) if self.pool else
+               cls( name, **defaults ) )
         if not self.inNamespace and self.listenPort:
             self.listenPort += 1
         self.switches.append( sw )
@@ -399,19 +508,38 @@ def addLink( self, node1, node2, port1=None, port2=None,
         cls = self.link if cls is None else cls
         link = cls( node1, node2, **options )
         self.links.append( link )
+        self.linkNodes[ link ] = ( node1, node2 )
+        for node in node1, node2:
+            self.nodeLinks.setdefault( node, IndexedList() ).append( link )
+        self.nodePairLinks.setdefault( frozenset( ( node1, node2 ) ),
+                                       IndexedList() ).append( link )
         return link
 
     def delLink( self, link ):
         "Remove a link from this network"
         link.delete()
         self.links.remove( link )
+        if link not in self.linkNodes:
+            return  # not added by addLink()
+        node1, node2 = self.linkNodes.pop( link )
+        for node in node1, node2:
+            links = self.nodeLinks[ node ]
+            links.discard( link )
+            if not links:
+                del self.nodeLinks[ node ]
+        pair = frozenset( ( node1, node2 ) )
+        self.nodePairLinks[ pair ].remove( link )
+        if not self.nodePairLinks[ pair ]:
+            del self.nodePairLinks[ pair ]
 
     def linksBetween( self, node1, node2 ):
         "Return Links between node1 and node2"
-        return [ link for link in self.links
-                 if ( node1, node2 ) in (
-                    ( link.intf1.node, link.intf2.node ),
-                    ( link.intf2.node, link.intf1.node ) ) ]
+        return list( self.nodePairLinks.get( frozenset( ( node1, node2 ) ),
+                                             () ) )
+
+    def linksFor( self, node ):
+        "Return Links connected to node"
+        return list( self.nodeLinks.get( node, () ) )
 
     def delLinkBetween( self, node1, node2, index=0, allLinks=False ):
         """Delete link(s) between node1 and node2
@@ -454,6 +582,7 @@ def buildFromTopo( self, topo=None ):
             pass
 
         info( '*** Creating network\n' )
+        timer = self.buildTimes = PhaseTimer()
 
         if not self.controllers and self.controller:
             # Add a default controller
@@ -467,29 +596,143 @@ def buildFromTopo( self, topo=None ):
                     self.addController( cls )
                 else:
                     self.addController( 'c%d' % i, cls )
+        timer.phase( 'controllers' )
+
+        if self.autoPinCpus and not getattr( topo, 'lazy', False ):
+            # Keep hosts under the same switch on the same NUMA node
+            self.cpuPlan = self.cpuPlacer().place(
+                CpuPlacer.topoGroups( topo ) )
+
+        if getattr( topo, 'lazy', False ):
+            self.streamFromTopo( topo, timer )
+        else:
+            self.addFromTopo( topo, timer )
+
+        info( '\n' )
+        debug( '*** Build times: %s (total %.3fs)\n' %
+               ( timer, timer.total() ) )
+
+    def cpuPlacer( self ):
+        "Return our CpuPlacer for autoPinCpus, creating it if necessary"
+        if not isinstance( self.autoPinCpus, CpuPlacer ):
+            self.autoPinCpus = CpuPlacer()
+        return self.autoPinCpus
+
+    def cpuFor( self, name ):
+        "Return the CPU to pin host name to (see autoPinCpus)"
+        if name in self.cpuPlan:
+            return self.cpuPlan.pop( name )
+        return self.cpuPlacer().cpuFor()
+
+    def topoHostParams( self, params ):
+        "Return params for a topo host, deferring its start if possible"
+        params = dict( params )
+        cls = params.get( 'cls', self.host )
+        if hasattr( cls, 'waitStartedAll' ):
+            params.setdefault( 'deferStart', True )
+        return params
+
+    def topoSwitchParams( self, params ):
+        "Return params for a topo switch, batching its startup if possible"
+        # A bit ugly: add batch parameter if appropriate
+        cls = params.get( 'cls', self.switch )
+        if hasattr( cls, 'batchStartup' ):
+            params.setdefault( 'batch', True )
+        if hasattr( cls, 'waitStartedAll' ):
+            params = dict( params, deferStart=True )
+        return params
+
+    def topoLinkParams( self, params ):
+        "Return params for a topo link, deferring its veth pair if possible"
+        # Create veth pairs in bulk if possible (see makeIntfPairs())
+        cls = params.get( 'cls', self.link )
+        if hasattr( cls, 'makeIntfPairs' ):
+            params = dict( params, batch=True )
+        return params
+
+    def addFromTopo( self, topo, timer ):
+        "Add all of topo's hosts, then switches, then (sorted) links"
+        # Node shells are started in parallel: we create all of the
+        # hosts and switches first, and then wait for their shells
+        nodes = []
 
         info( '*** Adding hosts:\n' )
         for hostName in topo.hosts():
-            self.addHost( hostName, **topo.nodeInfo( hostName ) )
+            params = self.topoHostParams( topo.nodeInfo( hostName ) )
+            nodes.append( self.addHost( hostName, **params ) )
             info( hostName + ' ' )
+        timer.phase( 'hosts' )
 
         info( '\n*** Adding switches:\n' )
         for switchName in topo.switches():
-            # A bit ugly: add batch parameter if appropriate
-            params = topo.nodeInfo( switchName)
-            cls = params.get( 'cls', self.switch )
-            if hasattr( cls, 'batchStartup' ):
-                params.setdefault( 'batch', True )
-            self.addSwitch( switchName, **params )
+            params = self.topoSwitchParams( topo.nodeInfo( switchName ) )
+            nodes.append( self.addSwitch( switchName, **params ) )
             info( switchName + ' ' )
+        timer.phase( 'switches' )
+
+        Node.waitStartedAll( nodes )
+        timer.phase( 'shells' )
 
         info( '\n*** Adding links:\n' )
+        links = []
         for srcName, dstName, params in topo.links(
                 sort=True, withInfo=True ):
-            self.addLink( **params )
+            links.append( self.addLink( **self.topoLinkParams( params ) ) )
             info( '(%s, %s) ' % ( srcName, dstName ) )
-
-        info( '\n' )
+        timer.phase( 'links' )
+        Link.makeIntfPairs( links )
+        timer.phase( 'intfs' )
+
+    # Number of links which streamFromTopo() buffers before creating them
+    streamChunk = 1000
+
+    def streamFromTopo( self, topo, timer ):
+        """Add nodes and links as topo.stream() generates them, in
+           chunks of up to streamChunk links: we start each chunk's
+           node shells in parallel, then create its links (and veth
+           pairs) in bulk. Only one chunk of links is held at a time,
+           so memory use doesn't depend on the size of the topology."""
+        info( '*** Adding nodes and links:\n' )
+        nodes, links = [], []
+
+        def addNode( name, params ):
+            "Add a host or switch and start its shell"
+            if params.get( 'isSwitch' ):
+                params = self.topoSwitchParams( params )
+                nodes.append( self.addSwitch( name, **params ) )
+            else:
+                params = self.topoHostParams( params )
+                nodes.append( self.addHost( name, **params ) )
+            info( name + ' ' )
+            if len( nodes ) >= self.streamChunk:
+                Node.waitStartedAll( nodes )
+                nodes[ : ] = []
+
+        def addLink( params ):
+            "Buffer a link until its chunk is full"
+            links.append( params )
+            if len( links ) >= self.streamChunk:
+                flush()
+
+        def flush():
+            "Wait for pending shells, then create pending links"
+            Node.waitStartedAll( nodes )
+            timer.phase( 'nodes' )
+            created = []
+            for params in links:
+                params = self.topoLinkParams( params )
+                # Batched links need to know their ports in advance
+                for node, port in ( 'node1', 'port1' ), ( 'node2', 'port2' ):
+                    if port not in params:
+                        params[ port ] = self[ params[ node ] ].newPort()
+                created.append( self.addLink( **params ) )
+                info( '(%s, %s) ' % ( params[ 'node1' ], params[ 'node2' ] ) )
+            Link.makeIntfPairs( created )
+            timer.phase( 'links' )
+            nodes[ : ], links[ : ] = [], []
+
+        topo.stream( addNode, addLink )
+        flush()
 
     def configureControlNetwork( self ):
         "Control net config hook: override in subclass"
@@ -527,12 +770,69 @@ def stopXterms( self ):
             os.kill( term.pid, signal.SIGKILL )
         cleanUpScreens()
 
-    def staticArp( self ):
-        "Add all-pairs ARP entries to remove the need to handle broadcast."
-        for src in self.hosts:
-            for dst in self.hosts:
-                if src != dst:
-                    src.setARP( ip=dst.IP(), mac=dst.MAC() )
+    @staticmethod
+    def arpIntf( src, ip ):
+        """Return src's interface for a static ARP entry for ip: the
+           interface with the longest matching subnet, as for arp -s,
+           or the default interface"""
+        ipNum, best, bestLen = ipParse( ip ), src.defaultIntf(), -1
+        for intf in src.intfList():
+            if intf.ip and intf.prefixLen is not None:
+                prefixLen = int( intf.prefixLen )
+                mask = ( 0xffffffff << ( 32 - prefixLen ) ) & 0xffffffff
+                if ( ipParse( intf.ip ) & mask == ipNum & mask and
+                     prefixLen > bestLen ):
+                    best, bestLen = intf, prefixLen
+        return best
+
+    def staticArp( self, hosts=None ):
+        """Add all-pairs ARP entries to remove the need to handle broadcast.
+           Each host's entries are installed with a single ip -batch,
+           in parallel across hosts.
+           hosts: hosts to add (default: all hosts); if we already added
+                  entries for other hosts, only the new entries are added"""
+        if hosts is None:
+            hosts = self.hosts
+            self.arpEntries = {}
+        new = dict( ( host, ( host.IP(), host.MAC() ) ) for host in hosts
+                    if host.IP() and host.MAC() )
+        # Remove stale entries for hosts whose addresses have changed
+        self.delStaticArp( [ host for host in new
+                             if self.arpEntries.get( host, new[ host ] ) !=
+                             new[ host ] ] )
+        self.arpEntries.update( new )
+        # New hosts get all entries; old hosts get entries for new hosts
+        lines = {}
+        for src in self.arpEntries:
+            entries = self.arpEntries if src in new else new
+            lines[ src ] = [
+                'neigh replace %s lladdr %s dev %s nud permanent' %
+                ( ip, mac, self.arpIntf( src, ip ) )
+                for dst, ( ip, mac ) in entries.items() if dst != src ]
+        self.runArp( lines )
+
+    def delStaticArp( self, hosts ):
+        "Remove ARP entries for hosts from other hosts (see staticArp())"
+        removed = [ ( host, self.arpEntries.pop( host ) ) for host in hosts
+                    if host in self.arpEntries ]
+        lines = {}
+        for src in self.arpEntries:
+            lines[ src ] = [ 'neigh del %s dev %s' %
+                             ( ip, self.arpIntf( src, ip ) )
+                             for _dst, ( ip, _mac ) in removed ]
+        self.runArp( lines )
+
+    @staticmethod
+    def runArp( lines ):
+        "Run ip neigh commands for each host in parallel"
+        lines = dict( ( h, l ) for h, l in lines.items() if l )
+        if not lines:
+            return
+        results = batchRunAll( [ 'ip', '-force', '-batch', '-' ], lines )
+        for host, errors in results.items():
+            for line, err in zip( lines[ host ], errors ):
+                if err:
+                    error( '*** Error: %s: %s: %s' % ( host, line, err ) )
 
     def start( self ):
         "Start controller and switches."
@@ -560,7 +860,9 @@ def start( self ):
             self.waitConnected()
 
     def stop( self ):
-        "Stop the controller(s), switches and hosts"
+        """Stop the controller(s), switches and hosts, recording the
+           time for each phase in self.stopTimes"""
+        timer = self.stopTimes = PhaseTimer()
         info( '*** Stopping %i controllers\n' % len( self.controllers ) )
         for controller in self.controllers:
             info( controller.name + ' ' )
@@ -569,30 +871,44 @@ def stop( self ):
         if self.terms:
             info( '*** Stopping %i terms\n' % len( self.terms ) )
             self.stopXterms()
+        timer.phase( 'controllers' )
         info( '*** Stopping %i links\n' % len( self.links ) )
+        # Delete links in bulk if possible (see Link.batchStop())
+        stopped = set( Link.batchStop( self.links ) )
         for link in self.links:
             info( '.' )
-            link.stop()
+            if link not in stopped:
+                link.stop()
         info( '\n' )
+        timer.phase( 'links' )
         info( '*** Stopping %i switches\n' % len( self.switches ) )
         stopped = {}
         for swclass, switches in groupby(
                 sorted( self.switches,
                         key=lambda s: str( type( s ) ) ), type ):
             switches = tuple( switches )
-            if hasattr( swclass, 'batchShutdown' ):
+            # batchShutdown() terminates switches, so we can't pool them
+            if hasattr( swclass, 'batchShutdown' ) and not self.pool:
                 success = swclass.batchShutdown( switches )
                 stopped.update( { s: s for s in success } )
         for switch in self.switches:
             info( switch.name + ' ' )
             if switch not in stopped:
                 switch.stop()
-            switch.terminate()
         info( '\n' )
+        timer.phase( 'switches' )
         info( '*** Stopping %i hosts\n' % len( self.hosts ) )
         for host in self.hosts:
             info( host.name + ' ' )
-            host.terminate()
+        if self.pool:
+            # Reset nodes and keep them for reuse
+            self.pool.release( self.switches + self.hosts )
+            timer.phase( 'release' )
+        else:
+            # Signal all of the shells at once, then wait for them
+            Node.terminateAll( self.switches + self.hosts, timer )
+        debug( '\n*** Stop times: %s (total %.3fs)\n' %
+               ( timer, timer.total() ) )
         info( '\n*** Done\n' )
 
     def run( self, test, *args, **kwargs ):
@@ -645,43 +961,110 @@ def _parsePing( pingOutput ):
         sent, received = int( m.group( 1 ) ), int( m.group( 2 ) )
         return sent, received
 
+    # Ping script for pingMatrix(): ping each ( index, IP ) argument
+    # pair in the background, up to $1 at a time, and print a line
+    # with the index and ping output (newlines replaced by \037)
+    pingScript = ( 'n=$1; opts=$2; shift 2; i=0; while [ $# -gt 0 ]; do '
+                   '( r=$(ping $opts $2 2>&1 | tr "\\n" "\\037"); '
+                   'printf "%s\\036%s\\n" $1 "$r" ) & shift 2; '
+                   'i=$((i+1)); [ $((i%n)) -eq 0 ] && wait; done; wait' )
+
+    @classmethod
+    def parsePingLine( cls, line ):
+        """Parse a line of pingScript output
+           returns: ( index, result ) (see _parsePingFull()), or None"""
+        if '\036' not in line:
+            return None
+        index, output = line.rstrip( '\n' ).split( '\036', 1 )
+        return int( index ), cls._parsePingFull(
+            output.replace( '\037', '\n' ) )
+
+    def pingMatrix( self, hosts=None, timeout=None, count=1, parallel=16,
+                    rowDone=None ):
+        """Ping between all specified hosts concurrently: each host
+           runs up to parallel pings at once, and all hosts run at once
+           hosts: list of hosts (default: all hosts)
+           timeout: time to wait for a response, as string
+           count: number of pings per pair
+           parallel: maximum concurrent pings per host
+           rowDone: optional function called with ( src, results ),
+                    where results is a list of ( dst, result ), for each
+                    src in order, as soon as its pings have completed
+           returns: PingMatrix"""
+        if not hosts:
+            hosts = self.hosts
+        results = PingMatrix( hosts )
+        opts = '-c%d' % count + ( ' -W %s' % timeout if timeout else '' )
+        popens, pending, dests = {}, {}, {}
+        for node in hosts:
+            dests[ node ] = [ dest for dest in hosts if dest != node ]
+            args = []
+            for i, dest in enumerate( dests[ node ] ):
+                if dest.intfs and dest.IP():
+                    args += [ str( i ), dest.IP() ]
+                else:
+                    results.add( node, dest, ( 0, 0, 0, 0, 0, 0 ) )
+            pending[ node ] = len( args ) // 2
+            if args:
+                popens[ node ] = node.popen(
+                    [ 'sh', '-c', self.pingScript, 'ping',
+                      str( parallel ), opts ] + args, stderr=STDOUT )
+        rows = list( hosts )
+
+        def finishRows():
+            "Report completed rows in order"
+            while rows and not pending[ rows[ 0 ] ]:
+                src = rows.pop( 0 )
+                if rowDone:
+                    rowDone( src, [ ( dst, results.result( src, dst ) )
+                                    for dst in dests[ src ] ] )
+
+        finishRows()
+        for node, line in pmonitor( popens ):
+            parsed = self.parsePingLine( line ) if node else None
+            if not parsed:
+                continue
+            index, result = parsed
+            results.add( node, dests[ node ][ index ], result )
+            pending[ node ] -= 1
+            finishRows()
+        # Pings that never reported (e.g. if ping failed) were lost
+        for node in rows:
+            for dest in dests[ node ]:
+                if results.result( node, dest ) is None:
+                    error( '*** Error: no ping result from %s to %s\n' %
+                           ( node, dest ) )
+                    results.add( node, dest, ( count, 0, 0, 0, 0, 0 ) )
+            pending[ node ] = 0
+        finishRows()
+        return results
+
     def ping( self, hosts=None, timeout=None ):
         """Ping between all specified hosts.
            hosts: list of hosts
            timeout: time to wait for a response, as string
            returns: ploss packet loss percentage"""
         # should we check if running?
-        packets = 0
-        lost = 0
         ploss = None
         if not hosts:
             hosts = self.hosts
             output( '*** Ping: testing ping reachability\n' )
-        for node in hosts:
-            output( '%s -> ' % node.name )
-            for dest in hosts:
-                if node != dest:
-                    opts = ''
-                    if timeout:
-                        opts = '-W %s' % timeout
-                    if dest.intfs:
-                        result = node.cmd( 'ping -c1 %s %s' %
-                                           (opts, dest.IP()) )
-                        sent, received = self._parsePing( result )
-                    else:
-                        sent, received = 0, 0
-                    packets += sent
-                    if received > sent:
-                        error( '*** Error: received too many packets' )
-                        error( '%s' % result )
-                        node.cmdPrint( 'route' )
-                        exit( 1 )
-                    lost += sent - received
-                    output( ( '%s ' % dest.name ) if received else 'X ' )
+
+        def rowDone( src, row ):
+            "Print results for src"
+            output( '%s -> ' % src.name )
+            for dest, ( sent, received ) in ( ( d, r[ :2 ] ) for d, r in row ):
+                if received > sent:
+                    error( '*** Error: received too many packets' )
+                    src.cmdPrint( 'route' )
+                    exit( 1 )
+                output( ( '%s ' % dest.name ) if received else 'X ' )
             output( '\n' )
+
+        self.lastPing = self.pingMatrix( hosts, timeout, rowDone=rowDone )
+        packets, received = self.lastPing.packets()
         if packets > 0:
-            ploss = 100.0 * lost / packets
-            received = packets - lost
+            ploss = self.lastPing.ploss()
             output( "*** Results: %i%% dropped (%d/%d received)\n" %
                     ( ploss, received, packets ) )
         else:
@@ -731,19 +1114,16 @@ def pingFull( self, hosts=None, timeout=None ):
         if not hosts:
             hosts = self.hosts
             output( '*** Ping: testing ping reachability\n' )
-        for node in hosts:
-            output( '%s -> ' % node.name )
-            for dest in hosts:
-                if node != dest:
-                    opts = ''
-                    if timeout:
-                        opts = '-W %s' % timeout
-                    result = node.cmd( 'ping -c1 %s %s' % (opts, dest.IP()) )
-                    outputs = self._parsePingFull( result )
-                    sent, received, rttmin, rttavg, rttmax, rttdev = outputs
-                    all_outputs.append( (node, dest, outputs) )
-                    output( ( '%s ' % dest.name ) if received else 'X ' )
+
+        def rowDone( src, row ):
+            "Print and record results for src"
+            output( '%s -> ' % src.name )
+            for dest, outputs in row:
+                all_outputs.append( ( src, dest, outputs ) )
+                output( ( '%s ' % dest.name ) if outputs[ 1 ] else 'X ' )
             output( '\n' )
+
+        self.lastPing = self.pingMatrix( hosts, timeout, rowDone=rowDone )
         output( "*** Results: \n" )
         for outputs in all_outputs:
             src, dest, ping_outputs = outputs
@@ -842,10 +1222,13 @@ def iperf( self, hosts=None, l4Type='TCP', udpBw='10M', fmt=None,
         output( '*** Results: %s\n' % result )
         return result
 
-    def runCpuLimitTest( self, cpu, duration=5 ):
-        """run CPU limit test with 'while true' processes.
+    def runCpuLimitTest( self, cpu, duration=5,
+                         cmd='while true; do a=1; done' ):
+        """run CPU limit test with busy processes, sampling each host's
+        cgroup CPU usage once per second (see ResourceSampler)
         cpu: desired CPU fraction of each host
         duration: test duration in seconds (integer)
+        cmd: busy command to run (in the background) on each core
         returns a single list of measured CPU fractions as floats.
         """
         pct = cpu * 100
@@ -858,32 +1241,19 @@ def runCpuLimitTest( self, cpu, duration=5 ):
         for h in hosts:
             pids[ h ] = []
             for _core in range( num_procs ):
-                h.cmd( 'while true; do a=1; done &' )
+                h.cmd( cmd + ' &' )
                 pids[ h ].append( h.cmd( 'echo $!' ).strip() )
-        outputs = {}
-        time = {}
-        # get the initial cpu time for each host
-        for host in hosts:
-            outputs[ host ] = []
-            with open( '/sys/fs/cgroup/cpuacct/%s/cpuacct.usage' %
-                       host, 'r' ) as f:
-                time[ host ] = float( f.read() )
-        for _ in range( duration ):
-            sleep( 1 )
-            for host in hosts:
-                with open( '/sys/fs/cgroup/cpuacct/%s/cpuacct.usage' %
-                           host, 'r' ) as f:
-                    readTime = float( f.read() )
-                outputs[ host ].append( ( ( readTime - time[ host ] )
-                                        / 1000000000 ) / cores * 100 )
-                time[ host ] = readTime
+        sampler = ResourceSampler( hosts, interval=1,
+                                   maxSamples=duration + 1 )
+        sampler.run( duration )
+        sampler.close()
         for h, pids in pids.items():
             for pid in pids:
                 h.cmd( 'kill -9 %s' % pid )
         cpu_fractions = []
-        for _host, outputs in outputs.items():
-            for pct in outputs:
-                cpu_fractions.append( pct )
+        for host in hosts:
+            cpu_fractions += [ 100 * frac for frac in
+                               sampler.cpuUtilization( host, cores ) ]
         output( '*** Results: %s\n' % cpu_fractions )
         return cpu_fractions
 
@@ -0,0 +1,393 @@
+"""
+netlink.py: minimal rtnetlink client for configuring interfaces,
+addresses and routes without running ifconfig/ip
+
+Each Netlink object owns a NETLINK_ROUTE socket which is created
+inside a node's network namespace (by briefly entering it with
+setns(2)); the socket stays bound to that namespace, so we can
+configure the node's interfaces directly from Mininet, and we can
+send several requests in a single write.
+
+This is used by Node and Intf when they are created with
+netlink=True; see Intf.setIP(), Intf.setMAC(), etc.
+"""
+
+import os
+import socket
+import struct
+import ctypes
+import ctypes.util
+from errno import ESRCH, EAGAIN, EWOULDBLOCK, ENOBUFS
+
+from mininet.util import Python3
+
+# Netlink message types and flags (linux/netlink.h, linux/rtnetlink.h)
+
+NETLINK_ROUTE = 0
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+NLM_F_REQUEST, NLM_F_MULTI, NLM_F_ACK = 1, 2, 4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE, NLM_F_EXCL, NLM_F_CREATE = 0x100, 0x200, 0x400
+
+# Multicast groups for change notifications
+RTMGRP_LINK, RTMGRP_IPV4_IFADDR = 0x1, 0x10
+
+RTM_NEWLINK, RTM_GETLINK = 16, 18
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+RTM_NEWROUTE, RTM_DELROUTE = 24, 25
+
+IFLA_ADDRESS, IFLA_IFNAME = 1, 3
+IFA_ADDRESS, IFA_LOCAL, IFA_BROADCAST = 1, 2, 4
+RTA_DST, RTA_OIF, RTA_GATEWAY = 1, 4, 5
+
+IFF_UP = 1
+RT_TABLE_MAIN = 254
+RTPROT_BOOT = 3
+RT_SCOPE_UNIVERSE, RT_SCOPE_LINK, RT_SCOPE_NOWHERE = 0, 253, 255
+RTN_UNICAST = 1
+
+CLONE_NEWNET = 0x40000000
+
+# Message header and payload formats
+NLMSGHDR = '=LHHLL'  # len, type, flags, seq, pid
+IFINFOMSG = '=BxHiII'  # family, type, index, flags, change
+IFADDRMSG = '=BBBBi'  # family, prefixlen, flags, scope, index
+# RTMSG: family, dst_len, src_len, tos, table, protocol, scope, type, flags
+RTMSG = '=BBBBBBBBI'
+RTATTR = '=HH'  # len, type
+
+
+class NetlinkError( Exception ):
+    "Error returned by the kernel for a netlink request"
+
+    def __init__( self, errno, request='' ):
+        self.errno = errno
+        Exception.__init__( self, '%s: %s' % ( request, os.strerror( errno ) )
+                            if request else os.strerror( errno ) )
+
+
+def _align( length ):
+    "Round length up to netlink alignment (4 bytes)"
+    return ( length + 3 ) & ~3
+
+def _attr( atype, data ):
+    "Return packed rtattr"
+    length = struct.calcsize( RTATTR ) + len( data )
+    padding = b'\0' * ( _align( length ) - length )
+    return struct.pack( RTATTR, length, atype ) + data + padding
+
+def _attrs( data ):
+    "Return dict of rtattr type to data"
+    attrs, offset, hdrlen = {}, 0, struct.calcsize( RTATTR )
+    while offset + hdrlen <= len( data ):
+        length, atype = struct.unpack_from( RTATTR, data, offset )
+        if length < hdrlen:
+            break
+        attrs[ atype ] = data[ offset + hdrlen: offset + length ]
+        offset += _align( length )
+    return attrs
+
+def _messages( data ):
+    "Generator: parse ( type, flags, seq, payload ) messages in data"
+    offset, hdrlen = 0, struct.calcsize( NLMSGHDR )
+    while offset + hdrlen <= len( data ):
+        length, mtype, flags, seq, _pid = struct.unpack_from(
+            NLMSGHDR, data, offset )
+        if length < hdrlen:
+            break
+        yield mtype, flags, seq, data[ offset + hdrlen: offset + length ]
+        offset += _align( length )
+
+def _name( name ):
+    "Return interface name as NUL-terminated bytes"
+    return ( name.encode() if Python3 else name ) + b'\0'
+
+def _ip( ip ):
+    "Return packed IPv4 address"
+    return socket.inet_aton( ip )
+
+def _mac( mac ):
+    "Return packed MAC address"
+    return struct.pack( '6B', *[ int( b, 16 ) for b in mac.split( ':' ) ] )
+
+def _macstr( data ):
+    "Return MAC address string for packed MAC address"
+    return ':'.join( '%02x' % b for b in struct.unpack( '6B', data[ :6 ] ) )
+
+def _broadcast( ip, prefixLen ):
+    "Return packed broadcast address for ip/prefixLen"
+    hostmask = ( 1 << ( 32 - prefixLen ) ) - 1
+    addr = struct.unpack( '!I', _ip( ip ) )[ 0 ]
+    return struct.pack( '!I', addr | hostmask )
+
+
+_libc = None
+
+def setns( fd, nstype=CLONE_NEWNET ):
+    "Move the calling thread into the namespace referred to by fd"
+    if hasattr( os, 'setns' ):
+        return os.setns( fd, nstype )  # pylint: disable=no-member
+    global _libc  # pylint: disable=global-statement
+    if _libc is None:
+        _libc = ctypes.CDLL( ctypes.util.find_library( 'c' ),
+                             use_errno=True )
+    if _libc.setns( fd, nstype ) != 0:
+        errno = ctypes.get_errno()
+        raise OSError( errno, os.strerror( errno ) )
+    return None
+
+
+class Netlink( object ):
+    "NETLINK_ROUTE socket in a network namespace"
+
+    def __init__( self, pid=None, groups=0 ):
+        """pid: pid of a process in the desired network namespace,
+           or None for our own namespace
+           groups: multicast groups to receive notifications for
+                   (e.g. RTMGRP_IPV4_IFADDR; see events())"""
+        self.pid = pid
+        self.seq = 0
+        if pid is None:
+            self.sock = self.socket( groups )
+            return
+        # Enter the namespace just long enough to create our socket
+        rootns = os.open( '/proc/self/ns/net', os.O_RDONLY )
+        nodens = os.open( '/proc/%d/ns/net' % pid, os.O_RDONLY )
+        try:
+            setns( nodens )
+            try:
+                self.sock = self.socket( groups )
+            finally:
+                setns( rootns )
+        finally:
+            os.close( nodens )
+            os.close( rootns )
+
+    @staticmethod
+    def socket( groups=0 ):
+        "Return a new rtnetlink socket, bound to multicast groups"
+        sock = socket.socket( socket.AF_NETLINK, socket.SOCK_RAW,
+                              NETLINK_ROUTE )
+        sock.bind( ( 0, groups ) )
+        return sock
+
+    def close( self ):
+        "Close our socket"
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    # Low-level message support
+
+    def message( self, mtype, flags, payload ):
+        "Return ( seq, packed request message )"
+        self.seq += 1
+        header = struct.pack( NLMSGHDR, struct.calcsize( NLMSGHDR ) +
+                              len( payload ), mtype,
+                              flags | NLM_F_REQUEST, self.seq, 0 )
+        return self.seq, header + payload
+
+    def replies( self ):
+        "Generator: read and parse ( type, flags, seq, payload ) replies"
+        while True:
+            for reply in _messages( self.sock.recv( 65536 ) ):
+                yield reply
+
+    def events( self ):
+        """Return ( type, payload ) notifications that have arrived
+           for our multicast groups, without waiting for more
+           returns: list, containing ( None, b'' ) if the kernel
+                    dropped notifications because we fell behind"""
+        events = []
+        while True:
+            try:
+                data = self.sock.recv( 65536, socket.MSG_DONTWAIT )
+            except ( IOError, OSError ) as e:
+                if e.errno == ENOBUFS:
+                    events.append( ( None, b'' ) )
+                    continue
+                if e.errno in ( EAGAIN, EWOULDBLOCK ):
+                    return events
+                raise
+            events.extend( ( mtype, payload ) for mtype, _flags, _seq, payload
+                           in _messages( data ) )
+
+    @staticmethod
+    def errno( payload ):
+        "Return (positive) errno from an NLMSG_ERROR payload"
+        return -struct.unpack_from( '=i', payload )[ 0 ]
+
+    def batch( self, requests, ignore=() ):
+        """Send several ( type, flags, payload ) requests in a single
+           write and wait for all of their acknowledgements
+           ignore: errnos to ignore (e.g. ESRCH for deleting a missing
+                   route)
+           raises NetlinkError for the first failed request"""
+        pending, data = {}, b''
+        for mtype, flags, payload in requests:
+            seq, msg = self.message( mtype, flags | NLM_F_ACK, payload )
+            pending[ seq ] = mtype
+            data += msg
+        if not pending:
+            return
+        self.sock.sendall( data )
+        failure = None
+        for mtype, _flags, seq, payload in self.replies():
+            if mtype != NLMSG_ERROR or seq not in pending:
+                continue
+            del pending[ seq ]
+            errno = self.errno( payload )
+            if errno and errno not in ignore and not failure:
+                failure = errno
+            if not pending:
+                break
+        if failure:
+            raise NetlinkError( failure )
+
+    def dump( self, mtype, payload ):
+        "Return list of ( type, payload ) replies for a dump request"
+        seq, msg = self.message( mtype, NLM_F_DUMP, payload )
+        self.sock.sendall( msg )
+        results = []
+        for rtype, _flags, rseq, rpayload in self.replies():
+            if rseq != seq:
+                continue
+            if rtype == NLMSG_DONE:
+                break
+            if rtype == NLMSG_ERROR:
+                raise NetlinkError( self.errno( rpayload ) )
+            results.append( ( rtype, rpayload ) )
+        return results
+
+    def get( self, mtype, payload ):
+        "Return payload of the reply to a single get request"
+        seq, msg = self.message( mtype, 0, payload )
+        self.sock.sendall( msg )
+        for rtype, _flags, rseq, rpayload in self.replies():
+            if rseq != seq:
+                continue
+            if rtype == NLMSG_ERROR:
+                raise NetlinkError( self.errno( rpayload ) )
+            return rpayload
+
+    # Link operations
+
+    @staticmethod
+    def linkMsg( index=0, flags=0, change=0, name=None, mac=None ):
+        "Return ( type, flags, payload ) to modify a link"
+        payload = struct.pack( IFINFOMSG, socket.AF_UNSPEC, 0, index,
+                               flags, change )
+        if name:
+            payload += _attr( IFLA_IFNAME, _name( name ) )
+        if mac:
+            payload += _attr( IFLA_ADDRESS, _mac( mac ) )
+        return RTM_NEWLINK, 0, payload
+
+    def link( self, name ):
+        "Return dict of index, flags, mac and isUp for interface name"
+        payload = self.get( RTM_GETLINK, struct.pack(
+            IFINFOMSG, socket.AF_UNSPEC, 0, 0, 0, 0 ) +
+            _attr( IFLA_IFNAME, _name( name ) ) )
+        _family, _type, index, flags, _change = struct.unpack_from(
+            IFINFOMSG, payload )
+        attrs = _attrs( payload[ struct.calcsize( IFINFOMSG ): ] )
+        mac = attrs.get( IFLA_ADDRESS )
+        return { 'index': index, 'flags': flags,
+                 'isUp': bool( flags & IFF_UP ),
+                 'mac': _macstr( mac ) if mac and len( mac ) >= 6 else None }
+
+    def index( self, name ):
+        "Return interface index for name"
+        return self.link( name )[ 'index' ]
+
+    def setLinkUp( self, name, up=True ):
+        "Set interface up or down"
+        self.batch( [ self.linkMsg( self.index( name ),
+                                    IFF_UP if up else 0, IFF_UP ) ] )
+
+    def setMAC( self, name, mac ):
+        "Set MAC address (taking the interface down and up, like ifconfig)"
+        index = self.index( name )
+        self.batch( [ self.linkMsg( index, 0, IFF_UP ),
+                      self.linkMsg( index, mac=mac ),
+                      self.linkMsg( index, IFF_UP, IFF_UP ) ] )
+
+    def rename( self, name, newname ):
+        "Rename interface (which must be down)"
+        self.batch( [ self.linkMsg( self.index( name ), name=newname ) ] )
+
+    # Address operations
+
+    def addrs( self, index ):
+        "Return list of ( ip, prefixLen ) IPv4 addresses for index"
+        results = []
+        for _type, payload in self.dump( RTM_GETADDR, struct.pack(
+                IFADDRMSG, socket.AF_INET, 0, 0, 0, 0 ) ):
+            _family, prefixLen, _flags, _scope, aindex = struct.unpack_from(
+                IFADDRMSG, payload )
+            if aindex != index:
+                continue
+            attrs = _attrs( payload[ struct.calcsize( IFADDRMSG ): ] )
+            addr = attrs.get( IFA_LOCAL, attrs.get( IFA_ADDRESS ) )
+            if addr:
+                results.append( ( socket.inet_ntoa( addr ), prefixLen ) )
+        return results
+
+    @staticmethod
+    def addrMsg( mtype, index, ip, prefixLen, flags=0 ):
+        "Return ( type, flags, payload ) to add or delete an address"
+        payload = ( struct.pack( IFADDRMSG, socket.AF_INET, prefixLen, 0,
+                                 RT_SCOPE_UNIVERSE, index ) +
+                    _attr( IFA_LOCAL, _ip( ip ) ) +
+                    _attr( IFA_ADDRESS, _ip( ip ) ) )
+        if mtype == RTM_NEWADDR and prefixLen < 31:
+            payload += _attr( IFA_BROADCAST, _broadcast( ip, prefixLen ) )
+        return mtype, flags, payload
+
+    def setIP( self, name, ip, prefixLen, up=False ):
+        """Replace interface's IPv4 address(es) with ip/prefixLen,
+           as ifconfig does, and optionally set it up"""
+        index = self.index( name )
+        requests = [ self.addrMsg( RTM_DELADDR, index, addr, plen )
+                     for addr, plen in self.addrs( index ) ]
+        requests.append( self.addrMsg( RTM_NEWADDR, index, ip,
+                                       int( prefixLen ),
+                                       NLM_F_CREATE | NLM_F_REPLACE ) )
+        if up:
+            requests.append( self.linkMsg( index, IFF_UP, IFF_UP ) )
+        self.batch( requests )
+
+    # Route operations
+
+    @staticmethod
+    def routeMsg( mtype, dst=None, prefixLen=0, index=None, gw=None,
+                  flags=0 ):
+        "Return ( type, flags, payload ) to add or delete a route"
+        scope = RT_SCOPE_LINK if gw is None else RT_SCOPE_UNIVERSE
+        payload = struct.pack( RTMSG, socket.AF_INET, prefixLen, 0, 0,
+                               RT_TABLE_MAIN, RTPROT_BOOT, scope,
+                               RTN_UNICAST, 0 )
+        if dst:
+            payload += _attr( RTA_DST, _ip( dst ) )
+        if gw:
+            payload += _attr( RTA_GATEWAY, _ip( gw ) )
+        if index is not None:
+            payload += _attr( RTA_OIF, struct.pack( '=i', index ) )
+        return mtype, flags, payload
+
+    def addHostRoute( self, ip, name ):
+        "Add a route to host ip via interface name"
+        self.batch( [ self.routeMsg( RTM_NEWROUTE, ip, 32, self.index( name ),
+                                     flags=NLM_F_CREATE | NLM_F_EXCL ) ] )
+
+    def setDefaultRoute( self, name=None, gw=None ):
+        "Replace the default route with one via interface name and/or gw"
+        index = self.index( name ) if name else None
+        # As with ip route del, RT_SCOPE_NOWHERE matches any scope;
+        # deleting a missing default route fails with ESRCH
+        self.batch( [ ( RTM_DELROUTE, 0, struct.pack(
+                        RTMSG, socket.AF_INET, 0, 0, 0, RT_TABLE_MAIN,
+                        0, RT_SCOPE_NOWHERE, 0, 0 ) ),
+                      self.routeMsg( RTM_NEWROUTE, index=index, gw=gw,
+                                     flags=NLM_F_CREATE | NLM_F_EXCL ) ],
+                    ignore=( ESRCH, ) )
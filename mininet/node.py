@@ -15,6 +15,12 @@
     hosts share the root file system, but they may also specify private
     directories.
 
+LightHost: a host without a shell, whose namespaces are held open by
+    a tiny process; each command runs in a new shell in its namespace.
+
+AgentHost: a LightHost whose commands are run by a command server in
+    its namespace, which returns output and exit status in frames.
+
 CPULimitedHost: a virtual host whose CPU bandwidth is limited by
     RT or CFS bandwidth limiting.
 
@@ -57,15 +63,27 @@
 import re
 import signal
 import select
-from subprocess import Popen, PIPE
-from time import sleep
+import socket
+from subprocess import Popen, PIPE, STDOUT
+from time import sleep, time
 
-from mininet.log import info, error, warn, debug
-from mininet.util import ( quietRun, errRun, errFail, moveIntf, isShellBuiltin,
+try:
+    import asyncio
+except ImportError:
+    asyncio = None  # Python 2: no acmd() etc.
+
+from mininet.log import lg, LEVELS, info, error, warn, debug
+from mininet.util import ( quietRun, errRun, moveIntf, isShellBuiltin,
                            numCores, retry, mountCgroups, BaseString, decode,
-                           encode, getincrementaldecoder, Python3, which )
+                           encode, getincrementaldecoder, Python3, which,
+                           PortAllocator, batchRun, recordNetns )
 from mininet.moduledeps import moduleDeps, pathCheck, TUN
 from mininet.link import Link, Intf, TCIntf, OVSIntf
+from mininet.netlink import Netlink, NetlinkError, RTMGRP_IPV4_IFADDR
+from mininet.ovsdb import OVSDB, VSwitchDB, asList
+from mininet.agent import FrameReader, packFrame, packCommand
+from mininet.cgroup import Cgroup
+from mininet.placement import CpuTopology
 from re import findall
 from distutils.version import StrictVersion
 
@@ -79,6 +97,10 @@ def __init__( self, name, inNamespace=True, **params ):
         """name: name of node
            inNamespace: in network namespace?
            privateDirs: list of private directory strings or tuples
+           deferStart: don't wait for shell to start (see waitStarted())
+           netlink: configure intfs and routes using netlink (see nl())
+           netns: register our network namespace with ip netns, as
+                  our name (True) or the given name (see attachNetnsAll())
            params: Node parameters (see config() for details)"""
 
         # Make sure class actually works
@@ -98,21 +120,41 @@ def __init__( self, name, inNamespace=True, **params ):
         self.ports = {}  # dict of interfaces to port numbers
                          # replace with Port objects, eventually ?
         self.nameToIntf = {}  # dict of interface names to Intfs
+        self.portAllocator = PortAllocator( self.portBase )
 
         # Make pylint happy
         ( self.shell, self.execed, self.pid, self.stdin, self.stdout,
             self.lastPid, self.lastCmd, self.pollOut ) = (
                 None, None, None, None, None, None, None, None )
         self.waiting = False
-        self.readbuf = ''
+        self.readbuf = bytearray()  # undecoded output (see read())
+        self.lineScan = 0  # how much of readbuf readline() has searched
 
         # Incremental decoder for buffered reading
         self.decoder = getincrementaldecoder()
 
+        # Defer waiting for our shell prompt? (see waitStarted())
+        self.deferStart = params.get( 'deferStart', False )
+        self.starting = False
+
+        # Use netlink rather than ifconfig/ip/route? (see nl())
+        self.netlink = params.get( 'netlink', False )
+        self.nlsock = None
+
+        # Netlink socket for address change notifications, so that our
+        # interfaces can cache their addresses (see watchAddrs())
+        self.addrWatch = None
+
+        # Name for ip netns (/var/run/netns/<name>), and is it attached?
+        netns = params.get( 'netns', False )
+        self.netns = ( self.name if netns is True else netns ) or None
+        self.netnsAttached = False
+
         # Start command interpreter shell
         self.master, self.slave = None, None  # pylint
         self.startShell()
-        self.mountPrivateDirs()
+        if not self.deferStart:
+            self.mountPrivateDirs()
 
     # File descriptor to node mapping support
     # Class variables and methods
@@ -167,16 +209,67 @@ def startShell( self, mnopts=None ):
         self.execed = False
         self.lastCmd = None
         self.lastPid = None
-        self.readbuf = ''
-        # Wait for prompt
-        while True:
-            data = self.read( 1024 )
-            if data[ -1 ] == chr( 127 ):
-                break
-            self.pollOut.poll()
-        self.waiting = False
-        # +m: disable job control notification
-        self.cmd( 'unset HISTFILE; stty -echo; set +m' )
+        self.readbuf = bytearray()
+        self.lineScan = 0
+        # The prompt is our first sentinel, so we wait for it
+        # just as we would for the output of a command
+        self.waiting = True
+        self.starting = True
+        if not self.deferStart:
+            self.waitStarted()
+
+    # +m: disable job control notification
+    shellInit = 'unset HISTFILE; stty -echo; set +m'
+
+    def waitStarted( self ):
+        """Wait for our shell prompt and initialize the shell.
+           This is called by startShell(), or, if startShell() was
+           deferred, by sendCmd() or waitStartedAll()."""
+        if not self.starting:
+            return
+        self.waitOutput()
+        self.starting = False
+        self.cmd( self.shellInit )
+        if self.deferStart:
+            self.mountPrivateDirs()
+        self.attachNetnsAll( [ self ] )
+
+    @classmethod
+    def waitStartedAll( cls, nodes ):
+        """Wait for the shells of several nodes to start, using a
+           single poller rather than waiting for each node in turn.
+           nodes: nodes, typically created with deferStart=True"""
+        nodes = [ node for node in nodes if node.starting ]
+        poller = select.poll()
+        pending = {}
+        for node in nodes:
+            poller.register( node.stdout, select.POLLIN )
+            pending[ node.stdout.fileno() ] = node
+        while pending:
+            for fd, _event in poller.poll():
+                node = pending.get( fd )
+                if node and node.checkStarted():
+                    poller.unregister( fd )
+                    del pending[ fd ]
+        for node in nodes:
+            if node.deferStart:
+                node.mountPrivateDirs()
+        cls.attachNetnsAll( nodes )
+
+    def checkStarted( self ):
+        """Handle output from our starting shell without blocking
+           (see waitStartedAll())
+           returns: True once our shell is initialized"""
+        self.monitor( timeoutms=0 )
+        if self.waiting:
+            return False
+        if self.starting:
+            # Got prompt: send shell initialization command
+            self.starting = False
+            self.sendCmd( self.shellInit )
+            return False
+        # Shell initialization complete
+        return True
 
     def mountPrivateDirs( self ):
         "mount private directories"
@@ -196,6 +289,50 @@ def mountPrivateDirs( self ):
                 self.cmd( 'mkdir -p %s' % directory )
                 self.cmd( 'mount -n -t tmpfs tmpfs %s' % directory )
 
+    @staticmethod
+    def attachNetnsAll( nodes ):
+        """Register the network namespaces of nodes which have a netns
+           name as /var/run/netns/<name>, so that tools such as
+           ip -n <name> and tc -n <name> can use them directly.
+           We use a single ip -batch command for all of the nodes.
+           nodes: nodes whose shells have started"""
+        nodes = [ node for node in nodes if node.netns and node.inNamespace
+                  and not node.netnsAttached ]
+        if not nodes:
+            return
+        errors = batchRun( [ 'ip', '-force', '-batch', '-' ],
+                           [ 'netns attach %s %d' % ( node.netns, node.pid )
+                             for node in nodes ] )
+        for node, err in zip( nodes, errors ):
+            if err and 'unknown' in err:
+                # Older ip: no netns attach, so bind mount it ourselves
+                path = '/var/run/netns/' + node.netns
+                err = errRun( 'mkdir -p /var/run/netns && touch %s && '
+                              'mount --bind /proc/%d/ns/net %s' %
+                              ( path, node.pid, path ), shell=True )[ 1 ]
+            if err:
+                error( '*** %s: could not attach netns %s: %s\n' %
+                       ( node.name, node.netns, err.strip() ) )
+            else:
+                node.netnsAttached = True
+        # Let cleanup know which names are ours (see staleNetns())
+        recordNetns( add=[ node.netns for node in nodes
+                           if node.netnsAttached ] )
+
+    @staticmethod
+    def detachNetnsAll( nodes ):
+        """Remove the netns registrations of nodes, using a single
+           ip -batch command
+           nodes: nodes which may have attached netns names"""
+        nodes = [ node for node in nodes if node.netnsAttached ]
+        if not nodes:
+            return
+        batchRun( [ 'ip', '-force', '-batch', '-' ],
+                  [ 'netns delete ' + node.netns for node in nodes ] )
+        recordNetns( remove=[ node.netns for node in nodes ] )
+        for node in nodes:
+            node.netnsAttached = False
+
     def unmountPrivateDirs( self ):
         "mount private directories"
         for directory in self.privateDirs:
@@ -221,6 +358,12 @@ def cleanup( self ):
         # for intfName in self.intfNames():
         # if self.name in intfName:
         # quietRun( 'ip link del ' + intfName )
+        if self.nlsock:
+            self.nlsock.close()
+            self.nlsock = None
+        if self.addrWatch:
+            self.addrWatch.close()
+            self.addrWatch = None
         if self.shell:
             # Close ptys
             self.stdin.close()
@@ -232,45 +375,92 @@ def cleanup( self ):
 
     # Subshell I/O, commands and control
 
+    # Maximum number of bytes that readBytes() reads at once
+    readSize = 65536
+
+    def readBytes( self, size=None ):
+        """Unbuffered read of undecoded output, potentially blocking.
+           size: maximum number of bytes to return (default: readSize)
+           returns: bytes (empty at EOF)"""
+        return os.read( self.stdout.fileno(), size or self.readSize )
+
+    def takeBytes( self, size=None ):
+        """Remove and return bytes from the start of self.readbuf
+           size: number of bytes (default: all of them)"""
+        buf = self.readbuf
+        size = len( buf ) if size is None else min( size, len( buf ) )
+        data = bytes( buf[ :size ] )
+        # Deleting from the front of a bytearray doesn't copy the rest
+        del buf[ :size ]
+        self.lineScan = max( 0, self.lineScan - size )
+        return data
+
     def read( self, size=1024 ):
         """Buffered read from node, potentially blocking.
-           size: maximum number of characters to return"""
+           size: maximum number of bytes to return"""
         count = len( self.readbuf )
         if count < size:
-            data = os.read( self.stdout.fileno(), size - count )
-            self.readbuf += self.decoder.decode( data )
-        if size >= len( self.readbuf ):
-            result = self.readbuf
-            self.readbuf = ''
-        else:
-            result = self.readbuf[ :size ]
-            self.readbuf = self.readbuf[ size: ]
-        return result
+            self.readbuf += self.readBytes( size - count )
+        return self.decoder.decode( self.takeBytes( size ) )
 
     def readline( self ):
         """Buffered readline from node, potentially blocking.
            returns: line (minus newline) or None"""
-        self.readbuf += self.read( 1024 )
-        if '\n' not in self.readbuf:
+        # Only search output that we haven't already searched
+        pos = self.readbuf.find( b'\n', self.lineScan )
+        if pos < 0:
+            self.lineScan = len( self.readbuf )
+            self.readbuf += self.readBytes( 1024 )
+            pos = self.readbuf.find( b'\n', self.lineScan )
+        if pos < 0:
+            self.lineScan = len( self.readbuf )
             return None
-        pos = self.readbuf.find( '\n' )
-        line = self.readbuf[ 0: pos ]
-        self.readbuf = self.readbuf[ pos + 1: ]
-        return line
+        line = self.takeBytes( pos + 1 )[ :-1 ]
+        return self.decoder.decode( line )
 
     def write( self, data ):
         """Write data to node.
            data: string"""
         os.write( self.stdin.fileno(), encode( data ) )
 
-    def terminate( self ):
-        "Send kill signal to Node and clean up after it."
+    def hangup( self ):
+        "Send kill signal to Node without waiting for it to exit."
         self.unmountPrivateDirs()
         if self.shell:
             if self.shell.poll() is None:
                 os.killpg( self.shell.pid, signal.SIGHUP )
+
+    def terminate( self ):
+        "Send kill signal to Node and clean up after it."
+        self.detachNetnsAll( [ self ] )
+        self.hangup()
         self.cleanup()
 
+    @classmethod
+    def terminateAll( cls, nodes, timer=None ):
+        """Terminate nodes, signalling all of their shells before
+           cleaning up after (and waiting for) any of them, so that
+           they exit concurrently. Nodes which override terminate()
+           are terminated individually.
+           nodes: nodes to terminate
+           timer: optional PhaseTimer for 'signal' and 'reap' phases"""
+        default = getattr( Node.terminate, '__func__', Node.terminate )
+        nodes = list( nodes )
+        for node in nodes:
+            if getattr( node.terminate, '__func__', None ) is not default:
+                node.terminate()
+        nodes = [ node for node in nodes
+                  if getattr( node.terminate, '__func__', None ) is default ]
+        cls.detachNetnsAll( nodes )
+        for node in nodes:
+            node.hangup()
+        if timer:
+            timer.phase( 'signal' )
+        for node in nodes:
+            node.cleanup()
+        if timer:
+            timer.phase( 'reap' )
+
     def stop( self, deleteIntfs=False ):
         """Stop node.
            deleteIntfs: delete interfaces? (False)"""
@@ -284,12 +474,15 @@ def waitReadable( self, timeoutms=None ):
            returns: result of poll()"""
         if len( self.readbuf ) == 0:
             return self.pollOut.poll( timeoutms )
+        return [ ( self.stdout.fileno(), select.POLLIN ) ]
 
     def sendCmd( self, *args, **kwargs ):
         """Send a command, followed by a command to echo a sentinel,
            and return without waiting for the command to complete.
            args: command and arguments, or string
            printPid: print command's PID? (False)"""
+        if self.starting:
+            self.waitStarted()
         assert self.shell and not self.waiting
         printPid = kwargs.get( 'printPid', False )
         # Allow sendCmd( [ list ] )
@@ -325,59 +518,281 @@ def monitor( self, timeoutms=None, findPid=True ):
            Set self.waiting to False if command has completed.
            timeoutms: timeout in ms or None to wait indefinitely
            findPid: look for PID from mnexec -p"""
+        return self.decoder.decode( self.monitorBytes( timeoutms, findPid ) )
+
+    _jobRegex = re.compile( br'\[\d+\] \d+\r\n' )
+    _pidRegex = re.compile( b'\x01' + br'(\d+)\r\n' )
+
+    def monitorBytes( self, timeoutms=None, findPid=True ):
+        """Monitor and return the undecoded output of a command
+           (see monitor()); we only scan each chunk of output once"""
         ready = self.waitReadable( timeoutms )
         if not ready:
-            return ''
-        data = self.read( 1024 )
-        pidre = r'\[\d+\] \d+\r\n'
+            return b''
+        data = self.takeBytes() if self.readbuf else self.readBytes()
         # Look for PID
-        marker = chr( 1 ) + r'\d+\r\n'
-        if findPid and chr( 1 ) in data:
+        if findPid and b'\x01' in data:
             # suppress the job and PID of a backgrounded command
-            if re.findall( pidre, data ):
-                data = re.sub( pidre, '', data )
+            data = self._jobRegex.sub( b'', data )
             # Marker can be read in chunks; continue until all of it is read
-            while not re.findall( marker, data ):
-                data += self.read( 1024 )
-            markers = re.findall( marker, data )
-            if markers:
-                self.lastPid = int( markers[ 0 ][ 1: ] )
-                data = re.sub( marker, '', data )
+            while not self._pidRegex.search( data ):
+                data += self.readBytes( 1024 )
+            match = self._pidRegex.search( data )
+            self.lastPid = int( match.group( 1 ) )
+            data = self._pidRegex.sub( b'', data )
         # Look for sentinel/EOF
-        if len( data ) > 0 and data[ -1 ] == chr( 127 ):
+        if data.endswith( b'\x7f' ):
             self.waiting = False
             data = data[ :-1 ]
-        elif chr( 127 ) in data:
+        elif b'\x7f' in data:
             self.waiting = False
-            data = data.replace( chr( 127 ), '' )
+            data = data.replace( b'\x7f', b'' )
         return data
 
-    def waitOutput( self, verbose=False, findPid=True ):
+    def waitOutput( self, verbose=False, findPid=True, sink=None ):
         """Wait for a command to complete.
            Completion is signaled by a sentinel character, ASCII(127)
            appearing in the output stream.  Wait for the sentinel and return
            the output, including trailing newline.
-           verbose: print output interactively"""
+           verbose: print output interactively
+           findPid: look for PID from mnexec -p
+           sink: binary file or function to pass output (bytes) to as
+                 it arrives, rather than keeping it in memory
+           returns: output, or '' if sink was given"""
+        level = LEVELS[ 'info' if verbose else 'debug' ]
         log = info if verbose else debug
-        output = ''
+        # Only decode output as it arrives if we're going to log it
+        logDecoder = ( getincrementaldecoder( 'replace' )
+                       if lg.isEnabledFor( level ) else None )
+        write = getattr( sink, 'write', sink )
+        output = bytearray()
         while self.waiting:
-            data = self.monitor( findPid=findPid )
-            output += data
+            data = self.monitorBytes( findPid=findPid )
+            if write:
+                write( data )
+            else:
+                output += data
+            if logDecoder:
+                log( logDecoder.decode( data ) )
+        return self.decoder.decode( bytes( output ), True )
+
+    # asyncio support: these methods return asyncio futures, so that
+    # we can run commands on many nodes concurrently, e.g.
+    # await asyncio.gather( *( h.acmd( 'ls' ) for h in net.hosts ) )
+    # They must be called while an event loop is running.
+
+    @staticmethod
+    def runningLoop():
+        "Return the running asyncio event loop"
+        if hasattr( asyncio, 'get_running_loop' ):
+            return asyncio.get_running_loop()
+        # Python 3.6: get_event_loop() returns the running loop
+        return asyncio.get_event_loop()
+
+    def amonitor( self, findPid=True ):
+        """Return an asyncio future for the next output of our
+           current command (see monitor()), which sets self.waiting
+           to False once the command has completed"""
+        loop = self.runningLoop()
+        future = loop.create_future()
+        fd = self.stdout.fileno()
+
+        def readable():
+            "Our shell has output: read and return it"
+            loop.remove_reader( fd )
+            if future.done():
+                return
+            try:
+                future.set_result(
+                    self.monitor( timeoutms=0, findPid=findPid ) )
+            except Exception as e:  # pylint: disable=broad-except
+                future.set_exception( e )
+
+        loop.add_reader( fd, readable )
+        return future
+
+    def awaitOutput( self, verbose=False, findPid=True ):
+        """Return an asyncio future for the output of our current
+           command (see waitOutput())"""
+        log = info if verbose else debug
+        loop = self.runningLoop()
+        future = loop.create_future()
+        fd = self.stdout.fileno()
+        output = []
+
+        def readable():
+            "Our shell has output: read it, and finish if command is done"
+            try:
+                data = self.monitor( timeoutms=0, findPid=findPid )
+            except Exception as e:  # pylint: disable=broad-except
+                loop.remove_reader( fd )
+                future.set_exception( e )
+                return
+            output.append( data )
             log( data )
-        return output
+            if not self.waiting:
+                loop.remove_reader( fd )
+                if not future.done():
+                    future.set_result( ''.join( output ) )
+
+        if self.waiting:
+            loop.add_reader( fd, readable )
+        else:
+            future.set_result( '' )
+        return future
+
+    def asendCmd( self, *args, **kwargs ):
+        """Return an asyncio future which is done once a command has
+           been sent (see sendCmd()); if our shell is still starting,
+           we wait for it without blocking the event loop"""
+        loop = self.runningLoop()
+        future = loop.create_future()
+
+        def send( *_args ):
+            "Send our command"
+            try:
+                self.sendCmd( *args, **kwargs )
+                future.set_result( None )
+            except Exception as e:  # pylint: disable=broad-except
+                future.set_exception( e )
+
+        def started( prompt ):
+            "Got prompt: initialize shell as in waitStarted()"
+            if prompt.exception():
+                future.set_exception( prompt.exception() )
+                return
+            self.starting = False
+            try:
+                self.sendCmd( self.shellInit )
+            except Exception as e:  # pylint: disable=broad-except
+                future.set_exception( e )
+                return
+            self.awaitOutput().add_done_callback( initialized )
+
+        def initialized( _output ):
+            "Shell initialized: finish as in waitStarted() and send"
+            if self.deferStart:
+                self.mountPrivateDirs()
+            send()
+
+        if self.starting:
+            self.awaitOutput().add_done_callback( started )
+        else:
+            send()
+        return future
+
+    def acmd( self, *args, **kwargs ):
+        """Return an asyncio future for the output of a command
+           (see cmd())"""
+        verbose = kwargs.get( 'verbose', False )
+        log = info if verbose else debug
+        log( '*** %s : %s\n' % ( self.name, args ) )
+        loop = self.runningLoop()
+        future = loop.create_future()
+        if not self.shell:
+            warn( '(%s exited - ignoring acmd%s)\n' % ( self, args ) )
+            future.set_result( None )
+            return future
+
+        def sent( sendFuture ):
+            "Command sent: wait for its output"
+            if sendFuture.exception():
+                future.set_exception( sendFuture.exception() )
+            else:
+                self.awaitOutput( verbose ).add_done_callback( done )
+
+        def done( outputFuture ):
+            "Command complete: return its output"
+            if outputFuture.exception():
+                future.set_exception( outputFuture.exception() )
+            else:
+                future.set_result( outputFuture.result() )
+
+        self.asendCmd( *args, **kwargs ).add_done_callback( sent )
+        return future
 
     def cmd( self, *args, **kwargs ):
         """Send a command, wait for output, and return it.
-           cmd: string"""
+           cmd: string
+           sink: binary file or function to pass output to, rather
+                 than returning it (see waitOutput())"""
         verbose = kwargs.get( 'verbose', False )
         log = info if verbose else debug
         log( '*** %s : %s\n' % ( self.name, args ) )
         if self.shell:
             self.sendCmd( *args, **kwargs )
-            return self.waitOutput( verbose )
+            return self.waitOutput( verbose, sink=kwargs.get( 'sink' ) )
         else:
             warn( '(%s exited - ignoring cmd%s)\n' % ( self, args ) )
 
+    # Maximum number of characters of commands that cmdBatch() writes
+    # to our shell at once; the tty input buffer is only 4096 bytes
+    batchChars = 2048
+
+    def cmdBatch( self, cmds, verbose=False ):
+        """Send several commands to our shell at once, and wait for
+           all of them to complete. Each command is followed by a
+           command that prints its exit code as a delimiter, which
+           saves a round trip per command vs. calling cmd().
+           Commands should not read from stdin, run in the background
+           or print our delimiters, and must fit on a single line.
+           cmds: list of command strings
+           verbose: print output interactively
+           returns: list of ( output, exitcode ) for each command"""
+        log = info if verbose else debug
+        log( '*** %s : %s\n' % ( self.name, cmds ) )
+        if not self.shell:
+            warn( '(%s exited - ignoring cmdBatch%s)\n' % ( self, cmds ) )
+            return [ ( None, None ) for _cmd in cmds ]
+        for cmd in cmds:
+            if '\n' in cmd:
+                raise Exception( '%s: cmdBatch() commands must not contain '
+                                 'newlines: %r' % ( self.name, cmd ) )
+        if self.starting:
+            self.waitStarted()
+        assert not self.waiting
+        # Print ^^<exitcode>^^ after each command
+        exitCmd = 'printf "\\036%d\\036" $?'
+        prompt = chr( 127 )
+        results, chunk, size = [], [], 0
+        for i, cmd in enumerate( cmds ):
+            chunk += [ cmd, exitCmd ]
+            size += len( cmd ) + len( exitCmd ) + 2
+            if size < self.batchChars and i < len( cmds ) - 1:
+                continue
+            self.lastCmd = cmd
+            self.lastPid = None
+            self.write( '\n'.join( chunk ) + '\n' )
+            # Our shell prints a sentinel (prompt) after each line, so
+            # we are done once we have every exit code and the prompt
+            # that follows the last one
+            output, count, codes, pos = bytearray(), len( chunk ) // 2, 0, 0
+            while codes < count or b'\x7f' not in output[ pos: ]:
+                output += ( self.takeBytes() if self.readbuf
+                            else self.readBytes() )
+                for match in self._exitCodeBytes.finditer( output, pos ):
+                    codes += 1
+                    pos = match.end()
+            fields = self._exitCodeRegex.split(
+                self.decoder.decode( bytes( output ) ) )
+            if codes != count or len( fields ) != 2 * count + 1:
+                raise Exception( '%s: expected %d exit codes from cmdBatch(),'
+                                 ' got %d' % ( self.name, count, codes ) )
+            for j, ( out, code ) in enumerate( zip( fields[ 0::2 ],
+                                                    fields[ 1::2 ] ) ):
+                # Remove the prompts before and after the command
+                if j and out.startswith( prompt ):
+                    out = out[ 1: ]
+                if out.endswith( prompt ):
+                    out = out[ :-1 ]
+                log( out )
+                results.append( ( out, int( code ) ) )
+            chunk, size = [], 0
+        return results
+
+    _exitCodeRegex = re.compile( chr( 30 ) + r'(\d+)' + chr( 30 ) )
+    _exitCodeBytes = re.compile( br'\x1e\d+\x1e' )
+
     def cmdPrint( self, *args):
         """Call cmd and printing its output
            cmd: string"""
@@ -431,9 +846,11 @@ def pexec( self, *args, **kwargs ):
 
     def newPort( self ):
         "Return the next port number to allocate."
-        if len( self.ports ) > 0:
-            return max( self.ports.values() ) + 1
-        return self.portBase
+        port = self.portAllocator.allocate()
+        # Skip any ports which were added without addIntf()
+        while port in self.intfs:
+            port = self.portAllocator.allocate()
+        return port
 
     def addIntf( self, intf, port=None, moveIntfFn=moveIntf ):
         """Add an interface.
@@ -442,6 +859,7 @@ def addIntf( self, intf, port=None, moveIntfFn=moveIntf ):
            moveIntfFn: function to move interface (optional)"""
         if port is None:
             port = self.newPort()
+        self.portAllocator.reserve( port )
         self.intfs[ port ] = intf
         self.ports[ intf ] = port
         self.nameToIntf[ intf.name ] = intf
@@ -460,6 +878,14 @@ def delIntf( self, intf ):
             del self.intfs[ port ]
             del self.ports[ intf ]
             del self.nameToIntf[ intf.name ]
+            self.portAllocator.release( port )
+
+    def reset( self ):
+        """Forget our interfaces other than lo, which should already
+           have been deleted, so that we can be reused (see NodePool)"""
+        for intf in list( self.intfs.values() ):
+            if intf.name != 'lo':
+                self.delIntf( intf )
 
     def defaultIntf( self ):
         "Return interface for lowest port"
@@ -516,6 +942,55 @@ def deleteIntfs( self, checkName=True ):
 
     # Routing support
 
+    def nl( self ):
+        """Return our Netlink socket if we were created with netlink=True
+           (creating it in our namespace if necessary), or None"""
+        if not self.netlink or not self.shell:
+            return None
+        if not self.nlsock:
+            # Make sure our shell has entered its namespace
+            self.waitStarted()
+            self.nlsock = Netlink( self.pid if self.inNamespace else None )
+        return self.nlsock
+
+    def watchAddrs( self ):
+        """Start watching for address changes in our namespace (or
+           forget the ones we've seen), and trust the addresses that
+           our interfaces have recorded until we see another change"""
+        if not self.shell:
+            return
+        try:
+            if self.addrWatch:
+                self.addrWatch.events()
+            else:
+                self.waitStarted()
+                self.addrWatch = Netlink(
+                    self.pid if self.inNamespace else None,
+                    groups=RTMGRP_IPV4_IFADDR )
+        except ( IOError, OSError ) as e:
+            debug( '*** %s: cannot watch addresses: %s\n' % ( self, e ) )
+            return
+        for intf in self.intfList():
+            intf.addrStale = False
+
+    def checkAddrs( self ):
+        """Mark our interfaces' recorded addresses as stale if there
+           have been address changes in our namespace"""
+        if self.addrWatch and self.addrWatch.events():
+            for intf in self.intfList():
+                intf.addrStale = True
+
+    def nlRun( self, method, *args, **kwargs ):
+        """Call a Netlink method for our namespace, returning
+           '' on success or the error message (like a failed command)"""
+        try:
+            getattr( self.nl(), method )( *args, **kwargs )
+            return ''
+        except ( NetlinkError, OSError ) as e:
+            error( '%s: netlink %s%s failed: %s\n' %
+                   ( self.name, method, args, e ) )
+            return str( e )
+
     def setARP( self, ip, mac ):
         """Add an ARP entry.
            ip: IP address as string
@@ -527,10 +1002,12 @@ def setHostRoute( self, ip, intf ):
         """Add route to host.
            ip: IP address as dotted decimal
            intf: string, interface name"""
+        if self.nl():
+            return self.nlRun( 'addHostRoute', ip, str( intf ) )
         return self.cmd( 'route add -host', ip, 'dev', intf )
 
-    def setDefaultRoute( self, intf=None ):
-        """Set the default route to go through intf.
+    def setDefaultRouteCmds( self, intf=None ):
+        """Return commands to set the default route to go through intf.
            intf: Intf or {dev <intfname> via <gw-ip> ...}"""
         # Note setParam won't call us if intf is none
         if isinstance( intf, BaseString ) and ' ' in intf:
@@ -538,7 +1015,29 @@ def setDefaultRoute( self, intf=None ):
         else:
             params = 'dev %s' % intf
         # Do this in one line in case we're messing with the root namespace
-        self.cmd( 'ip route del default; ip route add default', params )
+        return [ 'ip route del default; ip route add default ' + params ]
+
+    def setDefaultRoute( self, intf=None ):
+        """Set the default route to go through intf.
+           intf: Intf or {dev <intfname> via <gw-ip> ...}"""
+        route = self.nl() and self.nlRoute( intf )
+        if route:
+            self.nlRun( 'setDefaultRoute', *route )
+        else:
+            self.cmd( self.setDefaultRouteCmds( intf )[ 0 ] )
+
+    @staticmethod
+    def nlRoute( intf ):
+        """Return ( intfname, gw ) for setDefaultRoute() via netlink,
+           or None if intf has options that we must pass to ip route"""
+        if not ( isinstance( intf, BaseString ) and ' ' in intf ):
+            return str( intf ), None
+        args = intf.split()
+        route = { 'dev': None, 'via': None }
+        while len( args ) >= 2 and args[ 0 ] in route:
+            key, value = args.pop( 0 ), args.pop( 0 )
+            route[ key ] = value
+        return None if args else ( route[ 'dev' ], route[ 'via' ] )
 
     # Convenience and configuration methods
 
@@ -548,6 +1047,14 @@ def setMAC( self, mac, intf=None ):
            mac: MAC address as string"""
         return self.intf( intf ).setMAC( mac )
 
+    def setMACCmds( self, mac, intf=None ):
+        "Return commands to set the MAC address for an interface"
+        return self.intf( intf ).setMACCmds( mac )
+
+    def setIPCmds( self, ip, prefixLen=8, intf=None, **kwargs ):
+        "Return commands to set the IP address for an interface"
+        return self.intf( intf ).setIPCmds( ip, prefixLen, **kwargs )
+
     def setIP( self, ip, prefixLen=8, intf=None, **kwargs ):
         """Set the IP address for an interface.
            intf: intf or intf name
@@ -595,6 +1102,35 @@ def setParam( self, results, method, **param ):
         results[ name ] = result
         return result
 
+    def setParamCmds( self, steps, method, **param ):
+        """Internal method: like setParam(), but append
+           ( name, commands ) from method to steps for cmdBatch()"""
+        name, value = list( param.items() )[ 0 ]
+        if value is None:
+            return
+        f = getattr( self, method, None )
+        if not f:
+            return
+        if isinstance( value, list ):
+            cmds = f( *value )
+        elif isinstance( value, dict ):
+            cmds = f( **value )
+        else:
+            cmds = f( value )
+        steps.append( ( name, [ cmd for cmd in cmds if cmd ] ) )
+
+    def runSteps( self, results, steps ):
+        """Internal method: run commands for steps using cmdBatch()
+           results: dict of results to update with merged output
+           steps: list of ( name, commands ) from setParamCmds()"""
+        outputs = iter( self.cmdBatch(
+            [ cmd for _name, cmds in steps for cmd in cmds ] ) )
+        for name, cmds in steps:
+            output = ''.join( next( outputs )[ 0 ] or '' for _cmd in cmds )
+            if name:
+                results[ name ] = output
+        return results
+
     def config( self, mac=None, ip=None,
                 defaultRoute=None, lo='up', **_params ):
         """Configure Node according to (optional) parameters:
@@ -607,11 +1143,27 @@ def config( self, mac=None, ip=None,
         # the superclass config method here as follows:
         # r = Parent.config( **_params )
         r = {}
-        self.setParam( r, 'setMAC', mac=mac )
-        self.setParam( r, 'setIP', ip=ip )
-        self.setParam( r, 'setDefaultRoute', defaultRoute=defaultRoute )
+        if self.nl():
+            # Netlink requests don't need the shell, so just call setters
+            self.setParam( r, 'setMAC', mac=mac )
+            self.setParam( r, 'setIP', ip=ip )
+            self.setParam( r, 'setDefaultRoute', defaultRoute=defaultRoute )
+            if lo in ( 'up', 'down' ):
+                self.nlRun( 'setLinkUp', 'lo', lo == 'up' )
+            else:
+                self.cmd( 'ifconfig lo ' + lo )
+            self.watchAddrs()
+            return r
+        # Send all of our configuration commands in a single batch
+        steps = []
+        self.setParamCmds( steps, 'setMACCmds', mac=mac )
+        self.setParamCmds( steps, 'setIPCmds', ip=ip )
+        self.setParamCmds( steps, 'setDefaultRouteCmds',
+                           defaultRoute=defaultRoute )
         # This should be examined
-        self.cmd( 'ifconfig lo ' + lo )
+        steps.append( ( None, [ 'ifconfig lo ' + lo ] ) )
+        self.runSteps( r, steps )
+        self.watchAddrs()
         return r
 
     def configDefault( self, **moreParams ):
@@ -668,6 +1220,366 @@ class Host( Node ):
     "A host is simply a Node"
     pass
 
+class LightHost( Host ):
+    """A host without a shell or pty: a tiny namespace holder process
+       keeps our namespaces alive, and each command runs in a new shell
+       which attaches to them with mnexec -a. This saves a pty and an
+       interactive bash per host, at the cost of a fork/exec per
+       command; cmdBatch() runs all of its commands in one shell.
+       Shell state (cwd, variables, etc.) does not persist between
+       commands, and output of background commands is discarded, so
+       redirect it to a file if you need it."""
+
+    # Shell (and option) to run each command with
+    shellCmd = [ 'bash', '-c' ]
+
+    # We have no interactive shell to initialize
+    shellInit = 'true'
+
+    def __init__( self, name, **kwargs ):
+        self.proc = None  # Popen for our current command
+        self.bgGroups = []  # process groups of background commands
+        Host.__init__( self, name, **kwargs )
+
+    def startShell( self, mnopts=None ):
+        "Start a namespace holder process (rather than a shell)"
+        if self.shell:
+            error( "%s: shell is already running\n" % self.name )
+            return
+        # mnexec: (c)lose descriptors, (d)etach from tty, run in
+        # (n)amespace, and then (p)rint pid to show that we're ready
+        opts = '-cd' if mnopts is None else mnopts
+        if self.inNamespace:
+            opts += 'n'
+        self.startHolder( opts )
+        self.pid = self.shell.pid
+        self.execed = False
+        self.lastCmd = None
+        self.lastPid = None
+        self.readbuf = bytearray()
+        self.lineScan = 0
+        self.waiting = True
+        self.starting = True
+        if not self.deferStart:
+            self.waitStarted()
+
+    def startHolder( self, opts ):
+        """Start our namespace holder process as self.shell
+           opts: mnexec options"""
+        # cat exits, releasing our namespaces, once its stdin is
+        # closed - even if we exit without cleaning up
+        self.shell = self._popen( [ 'mnexec', opts + 'p', 'cat' ],
+                                  stdin=PIPE, stdout=PIPE, close_fds=True )
+        self.setStreams( self.shell.stdin, self.shell.stdout )
+
+    def setStreams( self, stdin, stdout ):
+        "Use stdin and stdout for write() and monitor()"
+        self.stdin, self.stdout = stdin, stdout
+        self.pollOut = select.poll()
+        self.pollOut.register( self.stdout )
+        self.outToNode[ self.stdout.fileno() ] = self
+        self.inToNode[ self.stdin.fileno() ] = self
+        self.decoder = getincrementaldecoder()
+
+    def waitStarted( self ):
+        "Wait for our namespace holder to print its pid"
+        if not self.starting:
+            return
+        self.waitOutput()
+        self.starting = False
+        if self.deferStart:
+            self.mountPrivateDirs()
+        self.attachNetnsAll( [ self ] )
+
+    def checkStarted( self ):
+        """Check (without blocking) whether our namespace holder has
+           printed its pid (see waitStartedAll())"""
+        self.monitor( timeoutms=0 )
+        if self.waiting:
+            return False
+        self.starting = False
+        return True
+
+    def shellCommand( self, *args ):
+        """Return a command string for our shell, and set lastCmd.
+           Background commands' output is discarded, and they print
+           ^A and their pid so that monitor() can set lastPid.
+           args: command and arguments, or string
+           returns: command, background?"""
+        # Allow sendCmd( [ list ] )
+        if len( args ) == 1 and isinstance( args[ 0 ], list ):
+            cmd = args[ 0 ]
+        # Allow sendCmd( cmd, arg1, arg2... )
+        elif len( args ) > 0:
+            cmd = args
+        # Convert to string
+        if not isinstance( cmd, str ):
+            cmd = ' '.join( [ str( c ) for c in cmd ] )
+        self.lastCmd = cmd
+        background = cmd.rstrip().endswith( '&' )
+        if background:
+            cmd = ( '{ %s\n} </dev/null >/dev/null 2>&1 & '
+                    'printf "\\001%%d\\n" $!' % cmd.rstrip()[ :-1 ] )
+        return cmd, background
+
+    def sendCmd( self, *args, **kwargs ):
+        """Start a command in a new shell in our namespaces, and return
+           without waiting for it to complete.
+           args: command and arguments, or string
+           printPid: ignored; we always set lastPid"""
+        if self.starting:
+            self.waitStarted()
+        assert self.shell and not self.waiting
+        cmd, background = self.shellCommand( *args )
+        # mnexec -d puts the command in its own process group
+        self.proc = self._popen(
+            [ 'mnexec', '-da', str( self.pid ) ] + self.shellCmd + [ cmd ],
+            stdin=PIPE, stdout=PIPE, stderr=STDOUT, close_fds=True )
+        if background:
+            self.bgGroups.append( self.proc.pid )
+        self.setStreams( self.proc.stdin, self.proc.stdout )
+        self.lastPid = None if background else self.proc.pid
+        self.waiting = True
+
+    def sendInt( self, intr=chr( 3 ) ):
+        "Interrupt running command."
+        debug( 'sendInt: signalling %s\n' % self.lastCmd )
+        if self.proc:
+            try:
+                os.killpg( self.proc.pid, signal.SIGINT )
+            except OSError:
+                # mnexec hasn't called setsid() yet
+                self.proc.send_signal( signal.SIGINT )
+
+    # Background commands print ^A{pid}\n (see shellCommand())
+    _pidRegex = re.compile( b'\x01' + br'(\d+)\n' )
+
+    def monitorBytes( self, timeoutms=None, findPid=True ):
+        """Monitor and return the undecoded output of a command.
+           Set self.waiting to False if command has completed.
+           timeoutms: timeout in ms or None to wait indefinitely
+           findPid: look for PID of a background command"""
+        if self.readbuf:
+            # Left over from readline()
+            return self.takeBytes()
+        if not self.pollOut.poll( timeoutms ):
+            return b''
+        data = self.readBytes()
+        if self.starting:
+            if b'\x01' not in data:
+                raise Exception( '%s: could not start namespace holder'
+                                 % self.name )
+            # Our holder printed its pid, so our namespaces exist
+            self.waiting = False
+            return b''
+        if not data:
+            # EOF: our command (and its shell) has exited
+            self.commandDone()
+            return data
+        return self.findPid( data ) if findPid else data
+
+    def findPid( self, data ):
+        """Set lastPid from a background command's pid marker in data
+           returns: data without the marker"""
+        if b'\x01' not in data:
+            return data
+        # Marker can be read in chunks; continue until all of it is read
+        # (or our command completes, in which case there isn't one)
+        while self.waiting and not self._pidRegex.search( data ):
+            more = self.readBytes( 1024 )
+            if not more:
+                break
+            data += more
+        match = self._pidRegex.search( data )
+        if match:
+            self.lastPid = int( match.group( 1 ) )
+            data = self._pidRegex.sub( b'', data )
+        return data
+
+    def commandDone( self ):
+        "Reap our command, and go back to using our holder's pipes"
+        self.waiting = False
+        proc, self.proc = self.proc, None
+        if not proc:
+            return
+        self.outToNode.pop( proc.stdout.fileno(), None )
+        self.inToNode.pop( proc.stdin.fileno(), None )
+        proc.stdout.close()
+        proc.stdin.close()
+        proc.wait()
+        self.setStreams( self.shell.stdin, self.shell.stdout )
+
+    def cmdBatch( self, cmds, verbose=False ):
+        """Run several commands in a single shell, which reads them
+           from its stdin (see Node.cmdBatch())
+           cmds: list of command strings
+           verbose: print output interactively
+           returns: list of ( output, exitcode ) for each command"""
+        log = info if verbose else debug
+        log( '*** %s : %s\n' % ( self.name, cmds ) )
+        if not self.shell:
+            warn( '(%s exited - ignoring cmdBatch%s)\n' % ( self, cmds ) )
+            return [ ( None, None ) for _cmd in cmds ]
+        if self.starting:
+            self.waitStarted()
+        # Print ^^<exitcode>^^ after each command
+        exitCmd = 'printf "\\036%d\\036" $?'
+        script = ''.join( '%s\n%s\n' % ( cmd, exitCmd ) for cmd in cmds )
+        popen = self.popen( [ self.shellCmd[ 0 ], '-s' ], stdin=PIPE,
+                            stderr=STDOUT, close_fds=True )
+        output = decode( popen.communicate( encode( script ) )[ 0 ] )
+        fields = self._exitCodeRegex.split( output )
+        if len( fields ) != 2 * len( cmds ) + 1:
+            raise Exception( '%s: expected %d exit codes from cmdBatch(),'
+                             ' got %d' % ( self.name, len( cmds ),
+                                           len( fields ) // 2 ) )
+        results = []
+        for out, code in zip( fields[ 0::2 ], fields[ 1::2 ] ):
+            log( out )
+            results.append( ( out, int( code ) ) )
+        return results
+
+    def hangup( self ):
+        "Kill our holder and any commands we started, without waiting"
+        self.unmountPrivateDirs()
+        groups = list( self.bgGroups )
+        if self.proc:
+            groups.append( self.proc.pid )
+        if self.shell and self.shell.poll() is None:
+            groups.append( self.shell.pid )
+        for pgid in groups:
+            try:
+                os.killpg( pgid, signal.SIGHUP )
+            except OSError:
+                pass
+        self.bgGroups = []
+
+    def reset( self ):
+        "Forget our background commands (see NodePool) and interfaces"
+        self.bgGroups = []
+        Host.reset( self )
+
+    def cleanup( self ):
+        "Close our pipes and reap our holder and current command."
+        if self.nlsock:
+            self.nlsock.close()
+            self.nlsock = None
+        if self.addrWatch:
+            self.addrWatch.close()
+            self.addrWatch = None
+        for popen in self.proc, self.shell:
+            if not popen:
+                continue
+            for f in popen.stdin, popen.stdout:
+                if f:
+                    self.outToNode.pop( f.fileno(), None )
+                    self.inToNode.pop( f.fileno(), None )
+                    f.close()
+            if self.waitExited:
+                debug( 'waiting for', popen.pid, 'to terminate\n' )
+                popen.wait()
+        self.proc, self.shell = None, None
+
+class AgentHost( LightHost ):
+    """A LightHost whose namespaces are held open by an mnexec command
+       server (mnexec -s). It runs our commands, and sends us their
+       output, pid and exit status (as lastExit) in length-prefixed
+       frames over a socket (see mininet/agent.py), so we don't have
+       to scan output for sentinels, and output may be binary."""
+
+    def __init__( self, name, **kwargs ):
+        self.sock = None  # socket to our command server
+        self.frames = FrameReader()
+        self.background = False  # is our command a background command?
+        self.lastExit = None  # exit status of our last command
+        LightHost.__init__( self, name, **kwargs )
+
+    def startHolder( self, opts ):
+        """Start our command server as self.shell
+           opts: mnexec options"""
+        # Our server exits once its socket is closed
+        self.sock, child = socket.socketpair()
+        self.shell = self._popen( [ 'mnexec', opts + 's' ], stdin=child,
+                                  stdout=child, close_fds=True )
+        child.close()
+        self.frames = FrameReader()
+        self.setStreams( self.sock, self.sock )
+
+    def sendCmd( self, *args, **kwargs ):
+        """Send a command to our command server, and return without
+           waiting for it to complete.
+           args: command and arguments, or string
+           printPid: ignored; we always set lastPid"""
+        if self.starting:
+            self.waitStarted()
+        assert self.shell and not self.waiting
+        cmd, self.background = self.shellCommand( *args )
+        self.sock.sendall( packCommand( self.shellCmd + [ cmd ] ) )
+        # Output may be binary, so we replace anything we can't decode
+        self.decoder = getincrementaldecoder( 'replace' )
+        self.lastPid, self.lastExit = None, None
+        self.waiting = True
+
+    def sendInt( self, intr=chr( 3 ) ):
+        "Interrupt running command."
+        debug( 'sendInt: signalling %s\n' % self.lastCmd )
+        self.sock.sendall( packFrame( 's', '%d' % signal.SIGINT ) )
+
+    def write( self, data ):
+        """Write data to our command's stdin.
+           data: string"""
+        self.sock.sendall( packFrame( 'i', data ) )
+
+    def readBytes( self, size=None ):
+        """Receive and handle frames from our command server,
+           potentially blocking; set self.waiting to False if our
+           command has completed.
+           size: ignored; we return the output from one receive
+           returns: our command's undecoded output"""
+        data = self.sock.recv( self.readSize )
+        if not data:
+            raise Exception( '%s: command server exited' % self.name )
+        output = []
+        for kind, payload in self.frames.feed( data ):
+            if kind in ( 'o', 'e' ):
+                output.append( payload )
+            elif kind == 'p':
+                if self.background:
+                    self.bgGroups.append( int( payload ) )
+                else:
+                    self.lastPid = int( payload )
+            elif kind == 'x':
+                self.lastExit = int( payload )
+                self.waiting = False
+            elif kind == 'r':
+                # Our server is ready, so our namespaces exist
+                self.waiting = False
+        return b''.join( output )
+
+    def monitorBytes( self, timeoutms=None, findPid=True ):
+        """Monitor and return the undecoded output of a command.
+           Set self.waiting to False if command has completed.
+           timeoutms: timeout in ms or None to wait indefinitely
+           findPid: look for PID of a background command"""
+        if self.readbuf:
+            # Left over from readline()
+            return self.takeBytes()
+        if not self.pollOut.poll( timeoutms ):
+            return b''
+        data = self.readBytes()
+        # Only background commands print a pid marker; otherwise our
+        # command's output may contain anything, including ^A
+        return self.findPid( data ) if findPid and self.background else data
+
+    def cleanup( self ):
+        "Close our socket and reap our command server."
+        if self.sock:
+            self.outToNode.pop( self.sock.fileno(), None )
+            self.inToNode.pop( self.sock.fileno(), None )
+            self.sock.close()
+            self.sock = None
+        LightHost.cleanup( self )
+
 class CPULimitedHost( Host ):
 
     "CPU limited host"
@@ -677,12 +1589,13 @@ def __init__( self, name, sched='cfs', **kwargs ):
         # Initialize class if necessary
         if not CPULimitedHost.inited:
             CPULimitedHost.init()
-        # Create a cgroup and move shell into it
-        self.cgroup = 'cpu,cpuacct,cpuset:/' + self.name
-        errFail( 'cgcreate -g ' + self.cgroup )
+        # Create a cgroup and move shell into it, writing cgroup
+        # files directly rather than running cgcreate etc.
+        self.cgroup = Cgroup( self.name )
+        self.cgroup.create()
         # We don't add ourselves to a cpuset because you must
         # specify the cpu and memory placement first
-        errFail( 'cgclassify -g cpu,cpuacct:/%s %s' % ( self.name, self.pid ) )
+        self.cgroup.attach( self.pid )
         # BL: Setting the correct period/quota is tricky, particularly
         # for RT. RT allows very small quotas, but the overhead
         # seems to be high. CFS has a mininimum quota of 1 ms, but
@@ -690,33 +1603,33 @@ def __init__( self, name, sched='cfs', **kwargs ):
         self.period_us = kwargs.get( 'period_us', 100000 )
         self.sched = sched
         if sched == 'rt':
+            if self.cgroup.version != 1:
+                raise Exception( 'sched=rt requires cgroup v1' )
             self.checkRtGroupSched()
             self.rtprio = 20
 
     def cgroupSet( self, param, value, resource='cpu' ):
         "Set a cgroup parameter and return its value"
-        cmd = 'cgset -r %s.%s=%s /%s' % (
-            resource, param, value, self.name )
-        quietRun( cmd )
-        nvalue = int( self.cgroupGet( param, resource ) )
-        if nvalue != value:
+        try:
+            self.cgroup.set( resource, param, value )
+        except ( IOError, OSError ) as e:
+            error( '*** error: cgroupSet: %s.%s: %s\n' %
+                   ( resource, param, e ) )
+        nvalue = self.cgroupGet( param, resource )
+        if str( nvalue ) != str( value ):
             error( '*** error: cgroupSet: %s set to %s instead of %s\n'
                    % ( param, nvalue, value ) )
         return nvalue
 
     def cgroupGet( self, param, resource='cpu' ):
         "Return value of cgroup parameter"
-        cmd = 'cgget -r %s.%s /%s' % (
-            resource, param, self.name )
-        return int( quietRun( cmd ).split()[ -1 ] )
+        value = self.cgroup.get( resource, param )
+        return int( value ) if value.lstrip( '-' ).isdigit() else value
 
     def cgroupDel( self ):
         "Clean up our cgroup"
-        # info( '*** deleting cgroup', self.cgroup, '\n' )
-        _out, _err, exitcode = errRun( 'cgdelete -r ' + self.cgroup )
-        # Sometimes cgdelete returns a resource busy error but still
-        # deletes the group; next attempt will give "no such file"
-        return exitcode == 0 or ( 'no such file' in _err.lower() )
+        # rmdir fails with EBUSY until our processes have exited
+        return self.cgroup.delete()
 
     def popen( self, *args, **kwargs ):
         """Return a Popen() object in node's namespace
@@ -814,29 +1727,35 @@ def setCPUFrac( self, f, sched=None ):
         else:
             return
         # Set cgroup's period and quota
-        setPeriod = self.cgroupSet( pstr, period )
-        setQuota = self.cgroupSet( qstr, quota )
+        if sched == 'cfs':
+            setPeriod, setQuota = self.cgroup.setCFS( period, quota )
+            if ( setPeriod, setQuota ) != ( period, quota ):
+                error( '*** error: setCPUFrac: %d/%dus set instead of '
+                       '%d/%dus\n' % ( setQuota, setPeriod, quota, period ) )
+        else:
+            setPeriod = self.cgroupSet( pstr, period )
+            setQuota = self.cgroupSet( qstr, quota )
         if sched == 'rt':
             # Set RT priority if necessary
             sched = self.chrt()
         info( '(%s %d/%dus) ' % ( sched, setQuota, setPeriod ) )
 
-    def setCPUs( self, cores, mems=0 ):
-        "Specify (real) cores that our cgroup can run on"
-        if not cores:
+    def setCPUs( self, cores, mems=None ):
+        """Specify (real) cores that our cgroup can run on
+           cores: core number, list, or list string, e.g. '0-3'
+           mems: memory nodes (default: the NUMA nodes of cores)"""
+        if cores in ( None, '', [] ):
             return
         if isinstance( cores, list ):
             cores = ','.join( [ str( c ) for c in cores ] )
-        self.cgroupSet( resource='cpuset', param='cpus',
-                        value=cores )
-        # Memory placement is probably not relevant, but we
-        # must specify it anyway
-        self.cgroupSet( resource='cpuset', param='mems',
-                        value=mems)
+        # We must specify memory placement, and it should be local
+        if mems is None:
+            mems = CpuTopology.local().mems( cores )
+        self.cgroup.setCPUs( cores, mems )
         # We have to do this here after we've specified
         # cpus and mems
-        errFail( 'cgclassify -g cpuset:/%s %s' % (
-                 self.name, self.pid ) )
+        if self.cgroup.version == 1:
+            self.cgroup.attach( self.pid, controllers=[ 'cpuset' ] )
 
     def config( self, cpu=-1, cores=None, **params ):
         """cpu: desired overall system CPU fraction
@@ -894,7 +1813,9 @@ def __init__( self, name, dpid=None, opts='', listenPort=None, **params):
         self.opts = opts
         self.listenPort = listenPort
         if not self.inNamespace:
-            self.controlIntf = Intf( 'lo', self, port=0 )
+            # lo is always up in the root namespace, so we don't
+            # configure it (which would also wait for our shell)
+            self.controlIntf = Intf( 'lo', self, port=0, up=None )
 
     def defaultDpid( self, dpid=None ):
         "Return correctly formatted dpid from dpid or switch name (s1 -> 1)"
@@ -1057,7 +1978,8 @@ class OVSSwitch( Switch ):
 
     def __init__( self, name, failMode='secure', datapath='kernel',
                   inband=False, protocols=None,
-                  reconnectms=1000, stp=False, batch=False, **params ):
+                  reconnectms=1000, stp=False, batch=False, ovsdb=False,
+                  **params ):
         """name: name for switch
            failMode: controller loss behavior (secure|standalone)
            datapath: userspace or kernel mode (kernel|user)
@@ -1066,7 +1988,9 @@ def __init__( self, name, failMode='secure', datapath='kernel',
                       Unspecified (or old OVS version) uses OVS default
            reconnectms: max reconnect timeout in ms (0/None for default)
            stp: enable STP (False, requires failMode=standalone)
-           batch: enable batch startup (False)"""
+           batch: enable batch startup (False)
+           ovsdb: talk to ovsdb-server directly rather than
+                  running ovs-vsctl (False)"""
         Switch.__init__( self, name, **params )
         self.failMode = failMode
         self.datapath = datapath
@@ -1077,6 +2001,8 @@ def __init__( self, name, failMode='secure', datapath='kernel',
         self._uuids = []  # controller UUIDs
         self.batch = batch
         self.commands = []  # saved commands for batch startup
+        self.ovsdb = ovsdb
+        self.ops = []  # saved OVSDB operations for batch startup
 
     @classmethod
     def setup( cls ):
@@ -1110,6 +2036,23 @@ def dpctl( self, *args ):
         "Run ovs-ofctl command"
         return self.cmd( 'ovs-ofctl', args[ 0 ], self, *args[ 1: ] )
 
+    vswitchdb = None  # shared VSwitchDB connection for ovsdb=True
+
+    @classmethod
+    def vsdb( cls ):
+        """Return our (shared, persistent) connection to ovsdb-server,
+           with its replica up to date"""
+        db = OVSSwitch.vswitchdb
+        if db:
+            try:
+                db.flush()
+            except ( EOFError, socket.error ):
+                db.close()
+                db = None
+        if db is None:
+            db = OVSSwitch.vswitchdb = VSwitchDB()
+        return db
+
     def vsctl( self, *args, **kwargs ):
         "Run ovs-vsctl command (or queue for later execution)"
         if self.batch:
@@ -1128,17 +2071,28 @@ def TCReapply( intf ):
 
     def attach( self, intf ):
         "Connect a data port"
-        self.vsctl( 'add-port', self, intf )
+        if self.ovsdb:
+            db = self.vsdb()
+            db.commit( db.addPortOps( self.name, str( intf ),
+                                      self.intfColumns( intf ) ) )
+        else:
+            self.vsctl( 'add-port', self, intf )
         self.cmd( 'ifconfig', intf, 'up' )
         self.TCReapply( intf )
 
     def detach( self, intf ):
         "Disconnect a data port"
-        self.vsctl( 'del-port', self, intf )
+        if self.ovsdb:
+            db = self.vsdb()
+            db.commit( db.delPortOps( self.name, str( intf ) ) )
+        else:
+            self.vsctl( 'del-port', self, intf )
 
     def controllerUUIDs( self, update=False ):
         """Return ovsdb UUIDs for our controllers
            update: update cached value"""
+        if self.ovsdb:
+            return self.vsdb().controllerUUIDs( self.name )
         if not self._uuids or update:
             controllers = self.cmd( 'ovs-vsctl -- get Bridge', self,
                                     'Controller' ).strip()
@@ -1151,12 +2105,85 @@ def controllerUUIDs( self, update=False ):
 
     def connected( self ):
         "Are we connected to at least one of our controllers?"
+        if self.ovsdb:
+            return ( self.vsdb().connected( self.name ) or
+                     self.failMode == 'standalone' )
         for uuid in self.controllerUUIDs():
             if 'true' in self.vsctl( '-- get Controller',
                                      uuid, 'is_connected' ):
                 return True
         return self.failMode == 'standalone'
 
+    @classmethod
+    def waitConnectedAll( cls, switches, timeout=None, delay=.5, db=None ):
+        """Wait for switches to connect to their controllers, using a
+           single OVSDB monitor on the Bridge and Controller tables
+           rather than polling each switch with ovs-vsctl
+           switches: switches to wait for (switches which override
+                     connected(), e.g. OVSBridge, are polled)
+           timeout: time to wait, or None to wait indefinitely
+           delay: seconds between polls of other switches
+           db: OVSDB connection (default: vsdb() if any switch
+               uses ovsdb, else a new connection to ovsdb-server)
+           returns: list of switches which did not connect, or None
+                    if we could not connect to ovsdb-server"""
+        shared = db is None and any( getattr( s, 'ovsdb', False )
+                                     for s in switches )
+        if shared:
+            db = cls.vsdb()
+        elif db is None:
+            try:
+                db = OVSDB()
+            except ( socket.error, OSError ) as e:
+                debug( 'waitConnectedAll: cannot connect to OVSDB: %s\n' % e )
+                return None
+        connected = getattr( OVSSwitch.connected, '__func__',
+                             OVSSwitch.connected )
+        monitored = set( s for s in switches
+                         if getattr( s.connected, '__func__', None ) is
+                         connected )
+        remaining = list( switches )
+
+        def isConnected( switch ):
+            "Is switch connected, according to our OVSDB replica?"
+            if switch not in monitored:
+                return switch.connected()
+            if switch.failMode == 'standalone':
+                return True
+            bridges = db.tables.get( 'Bridge', {} ).values()
+            controllers = db.tables.get( 'Controller', {} )
+            for bridge in bridges:
+                if bridge.get( 'name' ) == switch.name:
+                    return any( controllers.get( uuid, {} ).get(
+                        'is_connected' ) is True
+                        for uuid in asList( bridge.get( 'controller' ) ) )
+            return False
+
+        def check( *_args ):
+            "Check remaining switches"
+            for switch in tuple( remaining ):
+                if isConnected( switch ):
+                    info( '%s ' % switch )
+                    remaining.remove( switch )
+            return not remaining
+
+        if not shared:
+            # (VSwitchDB already monitors these)
+            db.monitor( { 'Bridge': [ 'name', 'controller' ],
+                          'Controller': [ 'is_connected' ] } )
+        polled = [ s for s in switches if s not in monitored ]
+        end = None if timeout is None else time() + timeout
+        while not check():
+            wait = None if end is None else end - time()
+            if wait is not None and wait <= 0:
+                break
+            if polled:
+                wait = delay if wait is None else min( wait, delay )
+            db.poll( wait )
+        if not shared:
+            db.close()
+        return remaining
+
     def intfOpts( self, intf ):
         "Return OVS interface options for intf"
         opts = ''
@@ -1185,24 +2212,77 @@ def bridgeOpts( self ):
         opts += ' other-config:dp-desc=%s' % self.name
         return opts
 
+    def intfColumns( self, intf ):
+        "Return OVSDB Interface columns for intf (as in intfOpts())"
+        columns = {}
+        if not self.isOldOVS():
+            columns[ 'ofport_request' ] = int( self.ports[ intf ] )
+            if isinstance( intf, OVSIntf ):
+                intf1, intf2 = intf.link.intf1, intf.link.intf2
+                peer = intf1 if intf1 != intf else intf2
+                columns.update( type='patch',
+                                options={ 'peer': str( peer ) } )
+        return columns
+
+    def bridgeColumns( self ):
+        "Return OVSDB Bridge columns (as in bridgeOpts())"
+        otherConfig = { 'datapath-id': self.dpid, 'dp-desc': self.name }
+        if not self.inband:
+            otherConfig[ 'disable-in-band' ] = 'true'
+        columns = { 'other_config': otherConfig,
+                    'fail_mode': self.failMode }
+        if self.datapath == 'user':
+            columns[ 'datapath_type' ] = 'netdev'
+        if self.protocols and not self.isOldOVS():
+            columns[ 'protocols' ] = self.protocols.split( ',' )
+        if self.stp and self.failMode == 'standalone':
+            columns[ 'stp_enable' ] = True
+        return columns
+
+    def startOVSDB( self, intfs, clist ):
+        """Start up switch with a single OVSDB transaction
+           (or save it for batchStartup())
+           intfs: data interfaces to add
+           clist: list of ( name, target ) for controllers"""
+        db = self.vsdb()
+        controllers = [ dict( target=target ) for _name, target in clist ]
+        if self.reconnectms:
+            for controller in controllers:
+                controller[ 'max_backoff' ] = self.reconnectms
+        ops = db.delBridgeOps( self.name ) + db.addBridgeOps(
+            self.name, [ ( str( intf ), self.intfColumns( intf ) )
+                         for intf in intfs ],
+            controllers, self.bridgeColumns() )
+        if self.batch:
+            self.ops = ops
+        else:
+            db.commit( ops )
+
     def start( self, controllers ):
-        "Start up a new OVS OpenFlow switch using ovs-vsctl"
+        "Start up a new OVS OpenFlow switch using ovs-vsctl (or OVSDB)"
         if self.inNamespace:
             raise Exception(
                 'OVS kernel switch does not work in a namespace' )
         int( self.dpid, 16 )  # DPID must be a hex string
-        # Command to add interfaces
-        intfs = ''.join( ' -- add-port %s %s' % ( self, intf ) +
-                         self.intfOpts( intf )
-                         for intf in self.intfList()
-                         if self.ports[ intf ] and not intf.IP() )
-        # Command to create controller entries
+        intfList = [ intf for intf in self.intfList()
+                     if self.ports[ intf ] and not intf.IP() ]
+        # Controller entries
         clist = [ ( self.name + c.name, '%s:%s:%d' %
                   ( c.protocol, c.IP(), c.port ) )
                   for c in controllers ]
         if self.listenPort:
             clist.append( ( self.name + '-listen',
                             'ptcp:%s' % self.listenPort ) )
+        if self.ovsdb:
+            self.startOVSDB( intfList, clist )
+            if not self.batch:
+                for intf in self.intfList():
+                    self.TCReapply( intf )
+            return
+        # Command to add interfaces
+        intfs = ''.join( ' -- add-port %s %s' % ( self, intf ) +
+                         self.intfOpts( intf ) for intf in intfList )
+        # Command to create controller entries
         ccmd = '-- --id=@%s create Controller target=\\"%s\\"'
         if self.reconnectms:
             ccmd += ' max_backoff=%d' % self.reconnectms
@@ -1234,8 +2314,19 @@ def batchStartup( cls, switches, run=errRun ):
            switches: switches to start up
            run: function to run commands (errRun)"""
         info( '...' )
+        # Switches using OVSDB: a single transaction for all of them
+        ops = []
+        for switch in switches:
+            if switch.ovsdb:
+                ops += switch.ops
+                switch.ops = []
+                switch.batch = False
+        if ops:
+            cls.vsdb().commit( ops )
         cmds = 'ovs-vsctl'
         for switch in switches:
+            if switch.ovsdb:
+                continue
             if switch.isOldOVS():
                 # Ideally we'd optimize this also
                 run( 'ovs-vsctl del-br %s' % switch )
@@ -1248,32 +2339,51 @@ def batchStartup( cls, switches, run=errRun ):
                 cmds += ' ' + cmd
                 switch.cmds = []
                 switch.batch = False
-        if cmds:
+        if cmds != 'ovs-vsctl':
             run( cmds, shell=True )
         # Reapply link config if necessary...
-        for switch in switches:
-            for intf in switch.intfs.values():
-                if isinstance( intf, TCIntf ):
-                    intf.config( **intf.params )
+        TCIntf.beginBatch()
+        try:
+            for switch in switches:
+                for intf in switch.intfs.values():
+                    if isinstance( intf, TCIntf ):
+                        intf.config( **intf.params )
+        finally:
+            TCIntf.endBatch()
         return switches
 
     def stop( self, deleteIntfs=True ):
         """Terminate OVS switch.
            deleteIntfs: delete interfaces? (True)"""
-        self.cmd( 'ovs-vsctl del-br', self )
+        if self.ovsdb:
+            db = self.vsdb()
+            db.commit( db.delBridgeOps( self.name ) )
+        else:
+            self.cmd( 'ovs-vsctl del-br', self )
         if self.datapath == 'user':
             self.cmd( 'ip link del', self )
         super( OVSSwitch, self ).stop( deleteIntfs )
 
+    def reset( self ):
+        "Forget our controllers and saved commands, so we can be reused"
+        self._uuids, self.commands, self.ops = [], [], []
+        super( OVSSwitch, self ).reset()
+
     @classmethod
     def batchShutdown( cls, switches, run=errRun ):
         "Shut down a list of OVS switches"
+        # First, delete them all from ovsdb
+        names = [ s.name for s in switches if s.ovsdb ]
+        if names:
+            db = cls.vsdb()
+            db.commit( db.delBridgeOps( *names ) )
+        others = [ s for s in switches if not s.ovsdb ]
         delcmd = 'del-br %s'
-        if switches and not switches[ 0 ].isOldOVS():
+        if others and not others[ 0 ].isOldOVS():
             delcmd = '--if-exists ' + delcmd
-        # First, delete them all from ovsdb
-        run( 'ovs-vsctl ' +
-             ' -- '.join( delcmd % s for s in switches ) )
+        if others:
+            run( 'ovs-vsctl ' +
+                 ' -- '.join( delcmd % s for s in others ) )
         # Next, shut down all of the processes
         pids = ' '.join( str( switch.pid ) for switch in switches )
         run( 'kill -HUP ' + pids )
@@ -0,0 +1,704 @@
+"""
+ovsdb.py: minimal OVSDB (RFC 7047) JSON-RPC client
+
+OVSDB talks to ovsdb-server over its unix socket (usually
+/var/run/openvswitch/db.sock), so that we can monitor tables for
+changes (e.g. Controller.is_connected for waitConnected()) and
+run transactions without running ovs-vsctl for each switch.
+
+VSwitchDB is an OVSDB client for the Open_vSwitch database, which
+builds transactions like the ones ovs-vsctl sends (add-br, del-br,
+add-port, del-port) so that many changes can be made at once.
+
+OVSDBStub is a small in-process stand-in for ovsdb-server which
+serves a schema-less database over a unix socket, for testing.
+
+Values are converted between OVSDB's JSON encoding and Python:
+sets become lists, maps become dicts, and UUIDs become UUID strings.
+"""
+
+import copy
+import json
+import os
+import socket
+import tempfile
+import threading
+import uuid as uuidlib
+from select import select
+from time import time
+
+from mininet.log import debug
+from mininet.util import decode, encode
+
+
+class UUID( str ):
+    "OVSDB row UUID"
+
+
+class NamedUUID( str ):
+    "Name for the UUID of a row inserted in the same transaction"
+
+
+class OVSDBError( Exception ):
+    "Error returned by ovsdb-server"
+
+
+def fromJSON( value ):
+    "Convert OVSDB JSON value to Python"
+    if isinstance( value, list ) and len( value ) == 2:
+        kind, data = value
+        if kind == 'set':
+            return [ fromJSON( v ) for v in data ]
+        if kind == 'map':
+            return dict( ( fromJSON( k ), fromJSON( v ) ) for k, v in data )
+        if kind == 'uuid':
+            return UUID( data )
+    return value
+
+def toJSON( value ):
+    "Convert Python value to OVSDB JSON"
+    if isinstance( value, UUID ):
+        return [ 'uuid', str( value ) ]
+    if isinstance( value, NamedUUID ):
+        return [ 'named-uuid', str( value ) ]
+    if isinstance( value, ( list, tuple, set ) ):
+        return [ 'set', [ toJSON( v ) for v in value ] ]
+    if isinstance( value, dict ):
+        return [ 'map', [ [ toJSON( k ), toJSON( v ) ]
+                          for k, v in value.items() ] ]
+    return value
+
+def asList( value ):
+    "Return an OVSDB set (which may be a single atom) as a list"
+    if value is None:
+        return []
+    return value if isinstance( value, list ) else [ value ]
+
+# Transaction operations
+
+def where( column, value, function='==' ):
+    "Return condition for the where clause of an operation"
+    return [ column, function, toJSON( value ) ]
+
+def insertOp( table, row, uuidName=None ):
+    "Return insert operation; uuidName: NamedUUID for the new row"
+    op = { 'op': 'insert', 'table': table,
+           'row': dict( ( k, toJSON( v ) ) for k, v in row.items() ) }
+    if uuidName:
+        op[ 'uuid-name' ] = str( uuidName )
+    return op
+
+def updateOp( table, conditions, row ):
+    "Return update operation"
+    return { 'op': 'update', 'table': table, 'where': conditions,
+             'row': dict( ( k, toJSON( v ) ) for k, v in row.items() ) }
+
+def mutateOp( table, conditions, column, mutator, value ):
+    "Return mutate operation for a single column"
+    return { 'op': 'mutate', 'table': table, 'where': conditions,
+             'mutations': [ [ column, mutator, toJSON( value ) ] ] }
+
+def deleteOp( table, conditions ):
+    "Return delete operation"
+    return { 'op': 'delete', 'table': table, 'where': conditions }
+
+def selectOp( table, conditions, columns=None ):
+    "Return select operation"
+    op = { 'op': 'select', 'table': table, 'where': conditions }
+    if columns is not None:
+        op[ 'columns' ] = list( columns )
+    return op
+
+
+class JSONStream( object ):
+    "JSON-RPC messages over a stream socket"
+
+    def __init__( self, sock ):
+        self.sock = sock
+        self.buf = ''
+        self.decoder = json.JSONDecoder()
+        self.lock = threading.Lock()
+
+    def send( self, msg ):
+        "Send a message"
+        with self.lock:
+            self.sock.sendall( encode( json.dumps( msg ) ) )
+
+    def recv( self ):
+        """Read available data and return list of complete messages
+           raises EOFError if the connection was closed"""
+        data = self.sock.recv( 65536 )
+        if not data:
+            raise EOFError( 'OVSDB connection closed' )
+        self.buf += decode( data )
+        msgs = []
+        while True:
+            self.buf = self.buf.lstrip()
+            if not self.buf:
+                break
+            try:
+                msg, end = self.decoder.raw_decode( self.buf )
+            except ValueError:
+                break  # incomplete message
+            msgs.append( msg )
+            self.buf = self.buf[ end: ]
+        return msgs
+
+
+class OVSDB( object ):
+    "Minimal OVSDB JSON-RPC client"
+
+    sockPath = '/var/run/openvswitch/db.sock'
+
+    def __init__( self, path=None, db='Open_vSwitch' ):
+        """path: ovsdb-server unix socket path (default: sockPath)
+           db: database name
+           raises socket.error if we can't connect"""
+        self.path = path or self.sockPath
+        self.db = db
+        sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        sock.connect( self.path )
+        self.stream = JSONStream( sock )
+        self.nextId = 0
+        self.replies = {}  # id -> reply message
+        self.monitors = {}  # monitor id -> callback
+        self.tables = {}  # table -> { uuid: row } for monitored tables
+
+    def close( self ):
+        "Close our connection"
+        if self.stream:
+            self.stream.sock.close()
+            self.stream = None
+
+    def dispatch( self, msg ):
+        "Handle a message from the server"
+        method = msg.get( 'method' )
+        if method == 'echo':
+            self.stream.send( { 'result': msg[ 'params' ],
+                                'error': None, 'id': msg[ 'id' ] } )
+        elif method == 'update':
+            monitorId, updates = msg[ 'params' ]
+            self.update( monitorId, updates )
+        elif method is None:
+            self.replies[ msg.get( 'id' ) ] = msg
+
+    def poll( self, timeout=None ):
+        """Wait up to timeout seconds for messages and handle them
+           returns: True if we received anything"""
+        readable, _w, _x = select( [ self.stream.sock ], [], [], timeout )
+        if not readable:
+            return False
+        for msg in self.stream.recv():
+            self.dispatch( msg )
+        return True
+
+    def call( self, method, *params ):
+        """Send a request and wait for its result
+           raises OVSDBError on failure"""
+        self.nextId += 1
+        msgId = self.nextId
+        self.stream.send( { 'method': method, 'params': list( params ),
+                            'id': msgId } )
+        while msgId not in self.replies:
+            self.poll()
+        reply = self.replies.pop( msgId )
+        if reply.get( 'error' ):
+            raise OVSDBError( '%s: %s' % ( method, reply[ 'error' ] ) )
+        return reply.get( 'result' )
+
+    def update( self, monitorId, updates ):
+        """Apply table updates from a monitor to self.tables and call
+           its callback with { table: { uuid: row or None } }"""
+        changes = {}
+        for table, rows in updates.items():
+            replica = self.tables.setdefault( table, {} )
+            for uuid, row in rows.items():
+                uuid = UUID( uuid )
+                new = row.get( 'new' )
+                if new is None:
+                    replica.pop( uuid, None )
+                    changes.setdefault( table, {} )[ uuid ] = None
+                else:
+                    new = dict( ( k, fromJSON( v ) ) for k, v in new.items() )
+                    replica.setdefault( uuid, {} ).update( new )
+                    changes.setdefault( table, {} )[ uuid ] = replica[ uuid ]
+        callback = self.monitors.get( monitorId )
+        if callback:
+            callback( changes )
+
+    def monitor( self, tables, callback=None ):
+        """Monitor tables, keeping self.tables up to date
+           tables: dict of table name to list of columns
+           callback: optional function called with each set of changes
+           returns: monitor id"""
+        monitorId = 'monitor%d' % ( len( self.monitors ) + 1 )
+        self.monitors[ monitorId ] = callback
+        requests = dict( ( table, { 'columns': list( columns ) } )
+                         for table, columns in tables.items() )
+        result = self.call( 'monitor', self.db, monitorId, requests )
+        debug( 'OVSDB monitor %s: %s\n' % ( monitorId, result ) )
+        self.update( monitorId, result )
+        return monitorId
+
+    def transact( self, *ops ):
+        """Run operations in a single transaction
+           returns: list of operation results
+           raises OVSDBError if the transaction failed"""
+        results = self.call( 'transact', self.db, *ops )
+        for i, result in enumerate( results ):
+            if result and result.get( 'error' ):
+                op = ops[ i ][ 'op' ] if i < len( ops ) else 'commit'
+                raise OVSDBError( 'transact: %s: %s: %s' % (
+                    op, result[ 'error' ], result.get( 'details', '' ) ) )
+        return results
+
+    def flush( self ):
+        "Handle any messages which have already arrived"
+        while self.poll( 0 ):
+            pass
+
+    def cancel( self, monitorId ):
+        "Cancel a monitor"
+        self.call( 'monitor_cancel', monitorId )
+        del self.monitors[ monitorId ]
+
+    def waitFor( self, condition, timeout=None ):
+        """Handle messages until condition() is true
+           timeout: seconds to wait, or None to wait indefinitely
+           returns: condition()"""
+        end = None if timeout is None else time() + timeout
+        while not condition():
+            remaining = None if end is None else end - time()
+            if remaining is not None and remaining <= 0:
+                break
+            self.poll( remaining )
+        return condition()
+
+
+class VSwitchDB( OVSDB ):
+    """OVSDB client for the Open_vSwitch database: keeps a replica of
+       the tables that ovs-vsctl's add-br/del-br/add-port/del-port use
+       and returns operations for them, so that any number of them
+       can be committed in a single transaction"""
+
+    columns = { 'Open_vSwitch': [ 'bridges', 'next_cfg', 'cur_cfg' ],
+                'Bridge': [ 'name', 'ports', 'controller' ],
+                'Port': [ 'name', 'interfaces' ],
+                'Controller': [ 'target', 'is_connected' ] }
+
+    def __init__( self, path=None, db='Open_vSwitch' ):
+        OVSDB.__init__( self, path, db )
+        self.rowCount = 0  # for NamedUUIDs
+        self.monitor( self.columns )
+
+    def namedUUID( self ):
+        "Return a new NamedUUID"
+        self.rowCount += 1
+        return NamedUUID( 'row%d' % self.rowCount )
+
+    def rows( self, table ):
+        "Return replica of table as { uuid: row }"
+        return self.tables.get( table, {} )
+
+    def bridges( self ):
+        "Return dict of bridge names to UUIDs"
+        return dict( ( row.get( 'name' ), uuid )
+                     for uuid, row in self.rows( 'Bridge' ).items() )
+
+    def ports( self ):
+        "Return dict of port names to UUIDs"
+        return dict( ( row.get( 'name' ), uuid )
+                     for uuid, row in self.rows( 'Port' ).items() )
+
+    def controllerUUIDs( self, bridge ):
+        "Return UUIDs of bridge's controllers"
+        uuid = self.bridges().get( bridge )
+        if uuid is None:
+            return []
+        return asList( self.rows( 'Bridge' )[ uuid ].get( 'controller' ) )
+
+    def connected( self, bridge ):
+        "Is bridge connected to at least one of its controllers?"
+        controllers = self.rows( 'Controller' )
+        return any( controllers.get( uuid, {} ).get( 'is_connected' ) is True
+                    for uuid in self.controllerUUIDs( bridge ) )
+
+    def portOps( self, name, columns=None ):
+        """Return operations to create a port with a single interface
+           name: port/interface name
+           columns: additional Interface columns
+           returns: ops, NamedUUID of new Port row"""
+        intf, port = self.namedUUID(), self.namedUUID()
+        intfRow = dict( columns or {}, name=name )
+        ops = [ insertOp( 'Interface', intfRow, intf ),
+                insertOp( 'Port', { 'name': name, 'interfaces': [ intf ] },
+                          port ) ]
+        return ops, port
+
+    def addPortOps( self, bridge, name, columns=None ):
+        "Return operations to add port name to bridge (add-port)"
+        ops, port = self.portOps( name, columns )
+        ops.append( mutateOp( 'Bridge', [ where( 'name', bridge ) ],
+                              'ports', 'insert', [ port ] ) )
+        return ops
+
+    def delPortOps( self, bridge, name ):
+        "Return operations to delete port name from bridge (del-port)"
+        uuid = self.ports().get( name )
+        if uuid is None:
+            return []
+        intfs = asList( self.rows( 'Port' )[ uuid ].get( 'interfaces' ) )
+        return ( [ mutateOp( 'Bridge', [ where( 'name', bridge ) ],
+                             'ports', 'delete', [ uuid ] ),
+                   deleteOp( 'Port', [ where( '_uuid', uuid ) ] ) ] +
+                 [ deleteOp( 'Interface', [ where( '_uuid', intf ) ] )
+                   for intf in intfs ] )
+
+    def addBridgeOps( self, name, intfs=(), controllers=(), columns=None ):
+        """Return operations to add a bridge (add-br and add-port)
+           name: bridge name
+           intfs: list of ( name, Interface columns ) for data ports
+           controllers: list of Controller rows
+           columns: additional Bridge columns"""
+        ops, ports, cids = [], [], []
+        for intf, intfColumns in ( [ ( name, { 'type': 'internal' } ) ] +
+                                   list( intfs ) ):
+            portOps, port = self.portOps( intf, intfColumns )
+            ops += portOps
+            ports.append( port )
+        for controller in controllers:
+            cid = self.namedUUID()
+            ops.append( insertOp( 'Controller', controller, cid ) )
+            cids.append( cid )
+        bridge = self.namedUUID()
+        row = dict( columns or {}, name=name, ports=ports, controller=cids )
+        ops += [ insertOp( 'Bridge', row, bridge ),
+                 mutateOp( 'Open_vSwitch', [], 'bridges', 'insert',
+                           [ bridge ] ) ]
+        return ops
+
+    def delBridgeOps( self, *names ):
+        """Return operations to delete bridges, along with their ports,
+           interfaces and controllers (--if-exists del-br)"""
+        ops, bridges = [], self.bridges()
+        for name in names:
+            uuid = bridges.get( name )
+            if uuid is None:
+                continue
+            bridge = self.rows( 'Bridge' )[ uuid ]
+            ops += [ mutateOp( 'Open_vSwitch', [], 'bridges', 'delete',
+                               [ uuid ] ),
+                     deleteOp( 'Bridge', [ where( '_uuid', uuid ) ] ) ]
+            for port in asList( bridge.get( 'ports' ) ):
+                row = self.rows( 'Port' ).get( port, {} )
+                ops.append( deleteOp( 'Port', [ where( '_uuid', port ) ] ) )
+                ops += [ deleteOp( 'Interface', [ where( '_uuid', intf ) ] )
+                         for intf in asList( row.get( 'interfaces' ) ) ]
+            ops += [ deleteOp( 'Controller', [ where( '_uuid', cid ) ] )
+                     for cid in asList( bridge.get( 'controller' ) ) ]
+        return ops
+
+    def commit( self, ops, wait=True, timeout=None ):
+        """Run ops in a single transaction and, like ovs-vsctl, wait
+           for ovs-vswitchd to apply the new configuration
+           wait: wait for ovs-vswitchd?
+           timeout: time to wait, or None to wait indefinitely
+           returns: operation results"""
+        ops = list( ops )
+        if not ops:
+            return []
+        self.flush()
+        root = self.rows( 'Open_vSwitch' )
+        wait = wait and any( 'cur_cfg' in row for row in root.values() )
+        if wait:
+            ops += [ mutateOp( 'Open_vSwitch', [], 'next_cfg', '+=', 1 ),
+                     selectOp( 'Open_vSwitch', [], [ 'next_cfg' ] ) ]
+        results = self.transact( *ops )
+        if wait:
+            nextCfg = results[ len( ops ) - 1 ][ 'rows' ][ 0 ][ 'next_cfg' ]
+            if not self.waitFor(
+                    lambda: all( row.get( 'cur_cfg', 0 ) >= nextCfg
+                                 for row in root.values() ), timeout ):
+                debug( 'VSwitchDB: timed out waiting for ovs-vswitchd\n' )
+        return results
+
+
+class OVSDBStub( object ):
+    """In-process stand-in for ovsdb-server, for testing: serves a
+       schema-less database over a unix socket. Tables and rows are
+       created on demand by insert(). Since there is no schema, there
+       is no garbage collection of unreferenced rows."""
+
+    def __init__( self, path=None, db='Open_vSwitch' ):
+        """path: unix socket path (default: in a new temporary directory)
+           db: database name"""
+        if path is None:
+            self.tmpdir = tempfile.mkdtemp( prefix='ovsdbstub' )
+            path = os.path.join( self.tmpdir, 'db.sock' )
+        else:
+            self.tmpdir = None
+        self.path = path
+        self.db = db
+        self.tables = {}  # table -> { uuid: row }
+        self.monitors = []  # ( stream, monitor id, { table: columns } )
+        self.pending = None  # notifications during a transaction
+        self.lock = threading.RLock()
+        self.listener = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        self.listener.bind( path )
+        self.listener.listen( 5 )
+        self.streams = []
+        self.running = True
+        self.thread = threading.Thread( target=self.serve )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop( self ):
+        "Stop serving and clean up"
+        self.running = False
+        self.thread.join()
+        for stream in self.streams:
+            stream.sock.close()
+        self.listener.close()
+        os.unlink( self.path )
+        if self.tmpdir:
+            os.rmdir( self.tmpdir )
+
+    # Database operations (which notify monitors)
+
+    def insert( self, table, row, uuid=None ):
+        "Insert a row and return its UUID"
+        with self.lock:
+            uuid = UUID( uuid or uuidlib.uuid4() )
+            self.tables.setdefault( table, {} )[ uuid ] = dict( row )
+            self.notify( table, uuid, None, self.tables[ table ][ uuid ] )
+            return uuid
+
+    def update( self, table, uuid, **columns ):
+        "Update columns of a row"
+        with self.lock:
+            row = self.tables[ table ][ uuid ]
+            old = dict( row )
+            row.update( columns )
+            self.notify( table, uuid, old, row )
+
+    def delete( self, table, uuid ):
+        "Delete a row"
+        with self.lock:
+            old = self.tables[ table ].pop( uuid )
+            self.notify( table, uuid, old, None )
+
+    @staticmethod
+    def rowUpdate( columns, old, new ):
+        "Return monitor row update with only the monitored columns"
+        update = {}
+        for name, row in ( ( 'old', old ), ( 'new', new ) ):
+            if row is not None:
+                update[ name ] = dict( ( c, toJSON( row[ c ] ) )
+                                       for c in columns if c in row )
+        return update
+
+    def notify( self, table, uuid, old, new ):
+        "Send update notifications to monitors of table"
+        if self.pending is not None:
+            self.pending.append( ( table, uuid, old, new ) )
+            return
+        for stream, monitorId, tables in list( self.monitors ):
+            if table not in tables:
+                continue
+            update = { table: { uuid: self.rowUpdate(
+                tables[ table ], old, new ) } }
+            try:
+                stream.send( { 'method': 'update', 'id': None,
+                               'params': [ monitorId, update ] } )
+            except socket.error:
+                self.monitors.remove( ( stream, monitorId, tables ) )
+
+    # JSON-RPC server
+
+    def serve( self ):
+        "Serve clients until stop()"
+        while self.running:
+            socks = [ self.listener ] + [ s.sock for s in self.streams ]
+            readable, _w, _x = select( socks, [], [], .1 )
+            for sock in readable:
+                if sock is self.listener:
+                    conn, _addr = self.listener.accept()
+                    self.streams.append( JSONStream( conn ) )
+                    continue
+                stream = [ s for s in self.streams if s.sock is sock ][ 0 ]
+                try:
+                    msgs = stream.recv()
+                except ( EOFError, socket.error ):
+                    self.disconnect( stream )
+                    continue
+                for msg in msgs:
+                    self.handle( stream, msg )
+
+    def disconnect( self, stream ):
+        "Forget a client"
+        with self.lock:
+            self.streams.remove( stream )
+            self.monitors = [ m for m in self.monitors
+                              if m[ 0 ] is not stream ]
+            stream.sock.close()
+
+    def handle( self, stream, msg ):
+        "Handle a request"
+        method, params = msg.get( 'method' ), msg.get( 'params', [] )
+        handler = getattr( self, 'do_' + str( method ), None )
+        if method is None:
+            return  # reply (e.g. to echo)
+        with self.lock:
+            try:
+                if not handler:
+                    raise OVSDBError( 'unknown method' )
+                result, err = handler( stream, *params ), None
+            except ( OVSDBError, KeyError, ValueError, TypeError ) as e:
+                result, err = None, { 'error': str( e ) }
+        stream.send( { 'result': result, 'error': err, 'id': msg[ 'id' ] } )
+
+    @staticmethod
+    def do_echo( _stream, *params ):
+        "Echo request"
+        return list( params )
+
+    def do_list_dbs( self, _stream ):
+        "List databases"
+        return [ self.db ]
+
+    def do_monitor( self, stream, db, monitorId, requests ):
+        "Start monitoring tables and return their current contents"
+        if db != self.db:
+            raise OVSDBError( 'unknown database %s' % db )
+        tables = dict( ( table, request.get( 'columns', [] ) )
+                       for table, request in requests.items() )
+        self.monitors.append( ( stream, monitorId, tables ) )
+        return dict( ( table, dict(
+            ( uuid, self.rowUpdate( columns, None, row ) )
+            for uuid, row in self.tables.get( table, {} ).items() ) )
+            for table, columns in tables.items() )
+
+    def do_monitor_cancel( self, stream, monitorId ):
+        "Stop monitoring"
+        self.monitors = [ m for m in self.monitors
+                          if m[ :2 ] != ( stream, monitorId ) ]
+        return {}
+
+    def do_transact( self, _stream, db, *ops ):
+        "Run operations, committing them only if they all succeed"
+        if db != self.db:
+            raise OVSDBError( 'unknown database %s' % db )
+        saved, self.pending = copy.deepcopy( self.tables ), []
+        names, results = {}, []
+        try:
+            for op in ops:
+                results.append( self.operation( op, names ) )
+        except ( OVSDBError, KeyError, ValueError, TypeError ) as e:
+            self.tables, self.pending = saved, None
+            return results + [ { 'error': 'constraint violation',
+                                 'details': str( e ) } ]
+        pending, self.pending = self.pending, None
+        for update in pending:
+            self.notify( *update )
+        return results
+
+    # Transaction operations
+
+    @classmethod
+    def resolve( cls, value, names ):
+        "Replace named-uuids in JSON value and convert it to Python"
+        def sub( value ):
+            "Substitute UUIDs for named-uuids"
+            if isinstance( value, list ):
+                if len( value ) == 2 and value[ 0 ] == 'named-uuid':
+                    return [ 'uuid', names[ value[ 1 ] ] ]
+                return [ sub( v ) for v in value ]
+            return value
+        return fromJSON( sub( value ) )
+
+    @staticmethod
+    def matches( uuid, row, conditions ):
+        "Does row match all conditions?"
+        for column, function, value in conditions:
+            actual = uuid if column == '_uuid' else row.get( column )
+            if isinstance( actual, list ) or isinstance( value, list ):
+                actual, value = asList( actual ), asList( value )
+            if function == '==':
+                match = actual == value
+            elif function == '!=':
+                match = actual != value
+            elif function == 'includes':
+                match = all( v in actual for v in value )
+            elif function == 'excludes':
+                match = not any( v in actual for v in value )
+            else:
+                raise OVSDBError( 'unsupported function %s' % function )
+            if not match:
+                return False
+        return True
+
+    @staticmethod
+    def mutate( row, mutations ):
+        "Return new column values for row after mutations"
+        columns = {}
+        for column, mutator, value in mutations:
+            current = columns.get( column, row.get( column ) )
+            if mutator == 'insert' and isinstance( value, dict ):
+                current = dict( current or {} )
+                current.update( value )
+            elif mutator == 'insert':
+                current = asList( current ) + [
+                    v for v in asList( value ) if v not in asList( current ) ]
+            elif mutator == 'delete' and isinstance( current, dict ):
+                current = dict( ( k, v ) for k, v in current.items()
+                                if k not in value )
+            elif mutator == 'delete':
+                current = [ v for v in asList( current )
+                            if v not in asList( value ) ]
+            elif mutator == '+=':
+                current = ( current or 0 ) + value
+            elif mutator == '-=':
+                current = ( current or 0 ) - value
+            else:
+                raise OVSDBError( 'unsupported mutator %s' % mutator )
+            columns[ column ] = current
+        return columns
+
+    def operation( self, op, names ):
+        "Perform a single operation and return its result"
+        kind, table = op[ 'op' ], op.get( 'table' )
+        if kind == 'comment':
+            return {}
+        if kind == 'insert':
+            row = dict( ( k, self.resolve( v, names ) )
+                        for k, v in op.get( 'row', {} ).items() )
+            uuid = self.insert( table, row )
+            if 'uuid-name' in op:
+                names[ op[ 'uuid-name' ] ] = uuid
+            return { 'uuid': toJSON( uuid ) }
+        conditions = [ ( column, function, self.resolve( value, names ) )
+                       for column, function, value in op.get( 'where', [] ) ]
+        rows = [ ( uuid, row )
+                 for uuid, row in list( self.tables.get( table, {} ).items() )
+                 if self.matches( uuid, row, conditions ) ]
+        if kind == 'select':
+            columns = op.get( 'columns' )
+            return { 'rows': [
+                dict( ( c, toJSON( v ) )
+                      for c, v in dict( row, _uuid=uuid ).items()
+                      if columns is None or c in columns )
+                for uuid, row in rows ] }
+        for uuid, row in rows:
+            if kind == 'update':
+                self.update( table, uuid, **dict(
+                    ( k, self.resolve( v, names ) )
+                    for k, v in op[ 'row' ].items() ) )
+            elif kind == 'mutate':
+                mutations = [ ( column, mutator, self.resolve( v, names ) )
+                              for column, mutator, v in op[ 'mutations' ] ]
+                self.update( table, uuid, **self.mutate( row, mutations ) )
+            elif kind == 'delete':
+                self.delete( table, uuid )
+            else:
+                raise OVSDBError( 'unsupported operation %s' % kind )
+        return { 'count': len( rows ) }
@@ -0,0 +1,201 @@
+"""
+placement.py: pin hosts to CPUs using the machine's CPU topology
+
+Mininet( autoPinCpus=True ) used to pin hosts to CPUs round-robin,
+which ignores hyperthread siblings and NUMA nodes, so hosts that talk
+to each other through the same switch could end up on different
+sockets. A CpuPlacer reads the CPU topology from sysfs and:
+
+- places each group of hosts (e.g. the hosts attached to the same
+  switch) on a single NUMA node, balancing load across nodes
+- uses separate physical cores before hyperthread siblings
+- keeps reserved cores (by default, the first physical core of the
+  first NUMA node) free for switches, controllers and the kernel
+  datapath
+
+Mininet passes the hosts' groups from its Topo to place() before
+adding hosts, and asks cpuFor() for hosts that weren't in the plan.
+"""
+
+import os
+from glob import glob
+
+from mininet.log import warn
+
+SYS_CPU = '/sys/devices/system/cpu'
+SYS_NODE = '/sys/devices/system/node'
+
+
+def parseCpuList( text ):
+    "Parse a CPU list such as '0-3,8' and return a list of ints"
+    cpus = []
+    for part in text.strip().split( ',' ):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split( '-' )
+            cpus.extend( range( int( first ), int( last ) + 1 ) )
+        else:
+            cpus.append( int( part ) )
+    return cpus
+
+def cpuListStr( cpus ):
+    "Return a CPU list string such as '0-3,8' for a list of ints"
+    ranges, cpus = [], sorted( set( cpus ) )
+    for cpu in cpus:
+        if ranges and cpu == ranges[ -1 ][ 1 ] + 1:
+            ranges[ -1 ][ 1 ] = cpu
+        else:
+            ranges.append( [ cpu, cpu ] )
+    return ','.join( str( first ) if first == last else
+                     '%d-%d' % ( first, last ) for first, last in ranges )
+
+
+class CpuTopology( object ):
+    "Online CPUs, their hyperthread siblings and their NUMA nodes"
+
+    _local = None  # cached topology of this machine
+
+    def __init__( self, cpuDir=SYS_CPU, nodeDir=SYS_NODE ):
+        """cpuDir: sysfs CPU directory
+           nodeDir: sysfs NUMA node directory"""
+        def read( path, default ):
+            "Return contents of path, or default"
+            try:
+                with open( path ) as f:
+                    return f.read().strip()
+            except IOError:
+                return default
+        self.cpus = parseCpuList(
+            read( os.path.join( cpuDir, 'online' ), '0' ) )
+        self.siblings = {}  # cpu -> tuple of its hyperthread siblings
+        for cpu in self.cpus:
+            path = os.path.join( cpuDir, 'cpu%d' % cpu, 'topology',
+                                 'thread_siblings_list' )
+            siblings = parseCpuList( read( path, str( cpu ) ) )
+            self.siblings[ cpu ] = tuple( sorted(
+                c for c in siblings if c in self.cpus ) ) or ( cpu, )
+        self.numaNode = dict.fromkeys( self.cpus, 0 )  # cpu -> node
+        for path in glob( os.path.join( nodeDir, 'node[0-9]*' ) ):
+            node = int( os.path.basename( path )[ 4: ] )
+            for cpu in parseCpuList( read( os.path.join( path, 'cpulist' ),
+                                           '' ) ):
+                if cpu in self.numaNode:
+                    self.numaNode[ cpu ] = node
+
+    @classmethod
+    def local( cls ):
+        "Return (cached) topology of this machine"
+        if not cls._local:
+            cls._local = cls()
+        return cls._local
+
+    def nodes( self ):
+        "Return dict of NUMA node to its CPUs"
+        nodes = {}
+        for cpu in self.cpus:
+            nodes.setdefault( self.numaNode[ cpu ], [] ).append( cpu )
+        return nodes
+
+    def cores( self, cpus ):
+        """Group cpus into physical cores
+           returns: list of tuples of sibling CPUs"""
+        cpus, cores = set( cpus ), []
+        for cpu in sorted( cpus ):
+            core = tuple( c for c in self.siblings[ cpu ] if c in cpus )
+            if core not in cores:
+                cores.append( core )
+        return cores
+
+    def mems( self, cpus ):
+        """Return memory (NUMA) nodes for cpus, for cpuset.mems
+           cpus: list of ints, int, or CPU list string"""
+        if isinstance( cpus, int ):
+            cpus = [ cpus ]
+        elif not isinstance( cpus, list ):
+            cpus = parseCpuList( str( cpus ) )
+        return cpuListStr( self.numaNode.get( cpu, 0 ) for cpu in cpus )
+
+
+class CpuPlacer( object ):
+    "Assign hosts to CPUs, keeping groups on a NUMA node"
+
+    def __init__( self, topology=None, reserve=1 ):
+        """topology: CpuTopology (default: this machine's)
+           reserve: number of physical cores to keep free"""
+        self.topology = topology or CpuTopology.local()
+        nodes = self.topology.nodes()
+        cores = self.topology.cores( nodes[ min( nodes ) ] )
+        if reserve >= len( self.topology.cores( self.topology.cpus ) ):
+            if reserve:
+                warn( '*** CpuPlacer: not enough cores to reserve %d\n' %
+                      reserve )
+            reserve = 0
+        self.reserved = sorted( cpu for core in cores[ :reserve ]
+                                for cpu in core )
+        # For each node, its free CPUs in the order that we use them
+        self.order = {}
+        for node, cpus in nodes.items():
+            cpus = [ cpu for cpu in cpus if cpu not in self.reserved ]
+            if cpus:
+                self.order[ node ] = self.cpuOrder( cpus )
+        self.load = dict.fromkeys( self.order, 0 )  # hosts per node
+        self.groupNode = {}  # group -> NUMA node
+
+    def cpuOrder( self, cpus ):
+        "Return cpus ordered so that we use each physical core first"
+        cores = self.topology.cores( cpus )
+        width = max( len( core ) for core in cores )
+        return [ core[ i ] for i in range( width ) for core in cores
+                 if i < len( core ) ]
+
+    def nodeFor( self, group=None, size=1 ):
+        """Return (and remember) the NUMA node for group: the node that
+           would be least loaded (relative to its CPUs) after adding
+           size more hosts
+           group: group key (e.g. switch name), or None"""
+        node = self.groupNode.get( group )
+        if node is None:
+            node = min( self.order, key=lambda n: (
+                float( self.load[ n ] + size ) / len( self.order[ n ] ), n ) )
+            if group is not None:
+                self.groupNode[ group ] = node
+        return node
+
+    def cpuFor( self, group=None ):
+        """Return a CPU for a host
+           group: host's group (e.g. switch name), or None"""
+        node = self.nodeFor( group )
+        cpus = self.order[ node ]
+        cpu = cpus[ self.load[ node ] % len( cpus ) ]
+        self.load[ node ] += 1
+        return cpu
+
+    def place( self, groups ):
+        """Assign CPUs to groups of hosts, largest groups first
+           groups: dict of group key to list of host names
+           returns: dict of host name to CPU"""
+        plan = {}
+        for group, hosts in sorted( groups.items(),
+                                    key=lambda item: ( -len( item[ 1 ] ),
+                                                       str( item[ 0 ] ) ) ):
+            self.nodeFor( group, len( hosts ) )
+            for host in hosts:
+                plan[ host ] = self.cpuFor( group )
+        return plan
+
+    @staticmethod
+    def topoGroups( topo ):
+        """Return hosts in topo grouped by the (first) switch that
+           they are connected to
+           returns: dict of switch (or host) name to host names"""
+        switchOf = {}
+        for src, dst in topo.links( sort=True ):
+            for host, other in ( src, dst ), ( dst, src ):
+                if ( not topo.isSwitch( host ) and topo.isSwitch( other )
+                     and host not in switchOf ):
+                    switchOf[ host ] = other
+        groups = {}
+        for host in topo.hosts():
+            groups.setdefault( switchOf.get( host, host ), [] ).append( host )
+        return groups
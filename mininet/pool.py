@@ -0,0 +1,143 @@
+"""
+pool.py: reuse hosts and switches across Mininet instances
+
+Test suites often build and stop a network for every test case, which
+means starting (and later killing) a shell and namespaces for every
+node, every time. If we pass the same NodePool to each Mininet:
+
+    pool = NodePool()
+    net = Mininet( topo, pool=pool )
+    ...
+    net.stop()  # hosts and switches go back to the pool
+    net = Mininet( topo, pool=pool )  # and are reused here
+    ...
+    net.stop()
+    pool.terminate()
+
+then Mininet.stop() resets its hosts and switches and returns them to
+the pool rather than terminating them, and the next Mininet reuses any
+idle node with the same class, name and parameters.
+
+Resetting a node kills any processes in its network namespace (or,
+for nodes in the root namespace, in its shell's session) other than its
+shell, and flushes its routes, neighbor entries and the addresses and
+qdiscs on lo. Interfaces (and their addresses and qdiscs) have already
+been deleted along with the network's links.
+"""
+
+import os
+import signal
+
+from mininet.log import info, debug
+from mininet.node import Node
+from mininet.util import batchRunAll
+
+
+def nodeProcs( nodes ):
+    """Return processes other than nodes' shells that are running in
+       nodes' network namespaces, or, for nodes in the root namespace,
+       in their shells' sessions
+       nodes: nodes with running shells
+       returns: dict of node to list of pids"""
+    netnsNodes, sessionNodes = {}, {}
+    for node in nodes:
+        if node.inNamespace:
+            try:
+                st = os.stat( '/proc/%d/ns/net' % node.pid )
+            except OSError:
+                continue
+            netnsNodes[ st.st_dev, st.st_ino ] = node
+        else:
+            sessionNodes[ node.pid ] = node
+    procs = { node: [] for node in nodes }
+    shells = set( node.pid for node in nodes )
+    for pid in os.listdir( '/proc' ):
+        if not pid.isdigit() or int( pid ) in shells:
+            continue
+        try:
+            st = os.stat( '/proc/%s/ns/net' % pid )
+            node = netnsNodes.get( ( st.st_dev, st.st_ino ) )
+            if not node and sessionNodes:
+                with open( '/proc/%s/stat' % pid ) as f:
+                    # Skip the command name, which may contain spaces
+                    fields = f.read().rsplit( ')', 1 )[ 1 ].split()
+                node = sessionNodes.get( int( fields[ 3 ] ) )
+        except ( OSError, IOError, IndexError, ValueError ):
+            continue
+        if node:
+            procs[ node ].append( int( pid ) )
+    return procs
+
+
+class NodePool( object ):
+    "Idle hosts and switches which Mininet can reuse"
+
+    # Commands (for ip -batch) to flush state in a reused namespace
+    flushCmds = [ 'route flush table main', 'neigh flush all',
+                  'addr flush dev lo scope global', 'qdisc del dev lo root' ]
+
+    def __init__( self ):
+        self.idle = {}  # ( class, name ) -> list of idle nodes
+        self.nodeParams = {}  # node -> parameters it was created with
+
+    def node( self, cls, name, **params ):
+        """Return an idle node of class cls with the given name and
+           parameters, or a new node if there isn't one
+           cls: node class
+           name: node name
+           params: node parameters"""
+        nodes = self.idle.get( ( cls, name ), [] )
+        for node in nodes:
+            if self.nodeParams[ node ] == params:
+                nodes.remove( node )
+                node.params = dict( params )
+                debug( '*** Reusing %s from pool\n' % name )
+                return node
+        node = cls( name, **params )
+        self.nodeParams[ node ] = dict( params )
+        return node
+
+    def release( self, nodes ):
+        """Reset nodes and return them to the pool. Nodes that we
+           didn't create, and nodes that are busy or whose shells
+           have exited, are terminated.
+           nodes: stopped nodes whose links have been deleted"""
+        nodes, others = self.reusable( nodes )
+        Node.terminateAll( others )
+        for node, pids in nodeProcs( nodes ).items():
+            for pid in pids:
+                try:
+                    os.kill( pid, signal.SIGKILL )
+                except OSError:
+                    pass
+            if pids:
+                debug( '*** %s: killed %s\n' % ( node.name, pids ) )
+        # Flush everything we can in one ip -batch per namespace
+        batchRunAll( [ 'ip', '-force', '-batch', '-' ],
+                     { node: self.flushCmds
+                       for node in nodes if node.inNamespace } )
+        for node in nodes:
+            node.reset()
+            self.idle.setdefault( ( type( node ), node.name ),
+                                  [] ).append( node )
+        info( '*** Returned %d nodes to pool\n' % len( nodes ) )
+
+    def reusable( self, nodes ):
+        """Split nodes into ones that we can reuse and others
+           nodes: nodes to check
+           returns: reusable nodes, others"""
+        reusable, others = [], []
+        for node in nodes:
+            if ( node in self.nodeParams and not node.waiting and
+                 node.shell and node.shell.poll() is None ):
+                reusable.append( node )
+            else:
+                self.nodeParams.pop( node, None )
+                others.append( node )
+        return reusable, others
+
+    def terminate( self ):
+        "Terminate all of our idle nodes"
+        nodes = [ node for nodes in self.idle.values() for node in nodes ]
+        Node.terminateAll( nodes )
+        self.idle, self.nodeParams = {}, {}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test Cgroup file handling, using a temporary directory as a
+   cgroup filesystem"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from math import isnan
+
+from mininet.cgroup import Cgroup, ResourceSampler
+
+class Host( object ):
+    "Minimal host with a cgroup"
+
+    def __init__( self, name ):
+        self.name = name
+        self.cgroup = None
+
+class testCgroup( unittest.TestCase ):
+    "Test cgroup v1 and v2 paths and parameters"
+
+    def setUp( self ):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown( self ):
+        shutil.rmtree( self.dir )
+
+    def testV1( self ):
+        "v1: a directory per controller, and separate CFS files"
+        for controller in 'cpu', 'cpuacct', 'cpuset':
+            os.mkdir( os.path.join( self.dir, controller ) )
+        cg = Cgroup( 'h1', cgroupDir=self.dir )
+        self.assertEqual( 1, cg.version )
+        cg.create()
+        self.assertEqual( os.path.join( self.dir, 'cpu/h1/cpu.cfs_quota_us' ),
+                          cg.path( 'cpu', 'cfs_quota_us' ) )
+        self.assertEqual( ( 100000, 5000 ), cg.setCFS( 100000, 5000 ) )
+        cg.attach( 42 )
+        with open( os.path.join( self.dir, 'cpuacct/h1/cgroup.procs' ) ) as f:
+            self.assertEqual( '42', f.read().strip() )
+        self.assertFalse( os.path.exists(
+            os.path.join( self.dir, 'cpuset/h1/cgroup.procs' ) ) )
+
+    def testV2( self ):
+        "v2: one directory, cpu.max, and controllers enabled for children"
+        for name in 'cgroup.controllers', 'cgroup.subtree_control':
+            open( os.path.join( self.dir, name ), 'w' ).close()
+        cg = Cgroup( 'h1', cgroupDir=self.dir )
+        self.assertEqual( 2, cg.version )
+        cg.create()
+        self.assertEqual( [ os.path.join( self.dir, 'h1' ) ], cg.dirs() )
+        with open( os.path.join( self.dir, 'cgroup.subtree_control' ) ) as f:
+            self.assertEqual( '+cpu +cpuset', f.read().strip() )
+        self.assertEqual( ( 100000, 5000 ), cg.setCFS( 100000, 5000 ) )
+        self.assertEqual( ( 100000, -1 ), cg.setCFS( 100000, -1 ) )
+        self.assertEqual( 'max 100000', cg.get( 'cpu', 'max' ) )
+
+    def testSampler( self ):
+        "ResourceSampler reads each host's stats into its arrays"
+        for controller in 'cpu', 'cpuacct', 'cpuset', 'memory', 'pids':
+            os.mkdir( os.path.join( self.dir, controller ) )
+        hosts = []
+        for name in 'h1', 'h2':
+            host = Host( name )
+            host.cgroup = Cgroup( name, cgroupDir=self.dir )
+            host.cgroup.create()
+            hosts.append( host )
+        paths = hosts[ 1 ].cgroup.statPaths()
+
+        def write( stat, value ):
+            "Write value to h2's stat file"
+            with open( paths[ stat ], 'w' ) as f:
+                f.write( '%d\n' % value )
+
+        write( 'cpu', 10**9 )
+        write( 'memory', 4096 )
+        sampler = ResourceSampler( hosts, maxSamples=2 )
+        self.assertEqual( 0, sampler.sample() )
+        write( 'cpu', 3 * 10**9 )
+        self.assertEqual( 1, sampler.sample() )
+        self.assertEqual( None, sampler.sample() )
+        sampler.close()
+        self.assertEqual( [ 1.0, 3.0 ], sampler.series( hosts[ 1 ], 'cpu' ) )
+        self.assertEqual( [ 4096, 4096 ],
+                          sampler.series( hosts[ 1 ], 'memory' ) )
+        # h1 has no stat files, and h2 has no pids.current
+        self.assertTrue( all( isnan( value ) for value in
+                              sampler.series( hosts[ 0 ], 'cpu' ) +
+                              sampler.series( hosts[ 1 ], 'pids' ) ) )
+        self.assertTrue( sampler.cpuUtilization( hosts[ 1 ] )[ 0 ] > 0 )
+
+if __name__ == '__main__':
+    unittest.main()
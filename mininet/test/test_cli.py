@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test CLI commands that run on several nodes at once"""
+
+import logging
+import os
+import tempfile
+import unittest
+
+from mininet.cli import CLI
+from mininet.log import lg, setLogLevel
+from mininet.net import Mininet
+from mininet.node import LightHost
+from mininet.clean import cleanup
+
+class OutputRecorder( logging.Handler ):
+    "Record the messages that we are passed"
+
+    def __init__( self ):
+        logging.Handler.__init__( self )
+        self.messages = []
+
+    def emit( self, record ):
+        self.messages.append( record.getMessage() )
+
+class testParallel( unittest.TestCase ):
+    "Test the parallel CLI command"
+
+    def setUp( self ):
+        self.net = Mininet( host=LightHost, controller=None )
+        for name in 'h1', 'h2', 'h3':
+            self.net.addHost( name )
+        self.net.start()
+        self.recorder = OutputRecorder()
+        lg.addHandler( self.recorder )
+        setLogLevel( 'output' )
+
+    def tearDown( self ):
+        lg.removeHandler( self.recorder )
+        self.net.stop()
+
+    def runCLI( self, line ):
+        "Run line as a CLI script, returning our output"
+        with tempfile.NamedTemporaryFile( 'w', delete=False ) as f:
+            f.write( line + '\n' )
+        try:
+            with open( os.devnull ) as devnull:
+                CLI( self.net, stdin=devnull, script=f.name )
+        finally:
+            os.unlink( f.name )
+        return ''.join( self.recorder.messages )
+
+    def testParallel( self ):
+        "Output is prefixed with node names, and we get each node's time"
+        out = self.runCLI( 'parallel h1,h3 echo $((1+1)); printf x' )
+        lines = out.splitlines()
+        # Nodes' lines may be interleaved, but each node's are in order
+        for name in 'h1', 'h3':
+            prefix = name + ': '
+            self.assertEqual( [ prefix + '2', prefix + 'x' ],
+                              [ line for line in lines
+                                if line.startswith( prefix ) ] )
+        self.assertNotIn( 'h2:', out )
+        self.assertIn( '*** 2 nodes: min ', out )
+
+    def testPattern( self ):
+        "Node patterns match several nodes"
+        out = self.runCLI( 'parallel h* true' )
+        self.assertIn( '*** 3 nodes: ', out )
+
+if __name__ == '__main__':
+    unittest.main()
+    cleanup()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test LightHost and AgentHost, which run commands without a shell
+   or pty, and the framed protocol that AgentHost uses."""
+
+import os
+import unittest
+
+from mininet.net import Mininet
+from mininet.node import Node, LightHost, AgentHost
+from mininet.agent import FrameReader, packFrame, packCommand
+from mininet.clean import cleanup
+from mininet.util import quietRun
+
+class testLightHost( unittest.TestCase ):
+    "Test LightHost commands in a two-host network"
+
+    hostClass = LightHost
+
+    def setUp( self ):
+        self.net = Mininet( host=self.hostClass, controller=None,
+                            netns=True )
+        h1, h2 = self.net.addHost( 'h1' ), self.net.addHost( 'h2' )
+        self.net.addLink( h1, h2 )
+        self.net.start()
+
+    def tearDown( self ):
+        self.net.stop()
+
+    def testCmd( self ):
+        "cmd(), cmdBatch() and pexec() run in our namespace without a pty"
+        h1 = self.net[ 'h1' ]
+        self.assertEqual( None, h1.master )
+        self.assertIn( 'h1-eth0', h1.cmd( 'ip link show' ) )
+        self.assertEqual( [ ( 'x\n', 0 ), ( '', 1 ) ],
+                          h1.cmdBatch( [ 'echo x', 'false' ] ) )
+        self.assertIn( 'h1-eth0', h1.pexec( 'ip link show' )[ 0 ] )
+
+    def testBackground( self ):
+        "Background commands return immediately and set lastPid"
+        h1 = self.net[ 'h1' ]
+        self.assertEqual( '', h1.cmd( 'sleep 60 &' ) )
+        self.assertIn( 'sleep', h1.cmd( 'ps -o args= -p', h1.lastPid ) )
+
+    def testSendInt( self ):
+        "sendInt() interrupts a running command"
+        h1 = self.net[ 'h1' ]
+        h1.sendCmd( 'sleep 60' )
+        h1.sendInt()
+        h1.waitOutput()
+        self.assertFalse( h1.waiting )
+
+    def testNetns( self ):
+        "Our namespaces are registered with ip netns until we stop"
+        h1 = self.net[ 'h1' ]
+        self.assertIn( 'h1-eth0', quietRun( 'ip -n h1 link show' ) )
+        Node.detachNetnsAll( [ h1 ] )
+        self.assertFalse( os.path.exists( '/var/run/netns/h1' ) )
+
+    def testAddrCache( self ):
+        "IP() is cached until our namespace reports an address change"
+        h1 = self.net[ 'h1' ]
+        intf = h1.defaultIntf()
+        self.assertEqual( '10.0.0.1', intf.currentIP() )
+        self.assertFalse( intf.addrStale )
+        h1.cmd( 'ip addr flush dev %s; ip addr add 10.0.0.9/8 dev %s' %
+                ( intf, intf ) )
+        self.assertEqual( '10.0.0.9', h1.IP() )
+        h1.setIP( '10.0.0.7/8' )
+        self.assertFalse( intf.addrStale )
+        self.assertEqual( '10.0.0.7', intf.currentIP() )
+
+    def testNetlinkSetIP( self ):
+        "Setting an address with netlink sets the intf up, like ifconfig"
+        h1 = self.net[ 'h1' ]
+        h1.netlink = True
+        intf = h1.defaultIntf()
+        intf.ifconfig( 'down' )
+        intf.setIP( '10.0.0.5', 8 )
+        self.assertTrue( intf.isUp() )
+        self.assertEqual( '10.0.0.5', intf.updateIP() )
+
+class testAgentHost( testLightHost ):
+    "Test AgentHost commands in a two-host network"
+
+    hostClass = AgentHost
+
+    def testExit( self ):
+        "We get exit status and (undecodable) binary output"
+        h1 = self.net[ 'h1' ]
+        output = h1.cmd( 'printf "a\\377b"; echo c >&2; exit 3' )
+        self.assertEqual( 3, h1.lastExit )
+        self.assertEqual( 'a\ufffdbc\n', output )
+
+class testFrames( unittest.TestCase ):
+    "Test framed protocol helpers"
+
+    def testFrameReader( self ):
+        "FrameReader reassembles frames from arbitrary chunks"
+        data = ( packCommand( [ 'bash', '-c', 'ls' ] ) +
+                 packFrame( 'o', b'\0\xff' ) + packFrame( 'x', '0' ) )
+        reader, frames = FrameReader(), []
+        for i in range( len( data ) ):
+            frames += reader.feed( data[ i: i + 1 ] )
+        self.assertEqual( [ ( 'c', b'bash\0-c\0ls' ), ( 'o', b'\0\xff' ),
+                            ( 'x', b'0' ) ], frames )
+        self.assertEqual( b'', reader.buf )
+
+if __name__ == '__main__':
+    unittest.main()
+    cleanup()
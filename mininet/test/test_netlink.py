@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test netlink message encoding in mininet.netlink."""
+
+import unittest
+
+from mininet.netlink import _attr, _attrs, _mac, _macstr, _broadcast
+from mininet.node import Node
+
+class testNetlink( unittest.TestCase ):
+    "Test netlink helpers that don't need a kernel"
+
+    def testAttrs( self ):
+        "Packed attributes are aligned and parse back correctly"
+        data = ( _attr( 3, b'h1-eth0\0' ) +
+                 _attr( 1, _mac( '00:00:00:00:00:01' ) ) )
+        self.assertEqual( 0, len( data ) % 4 )
+        attrs = _attrs( data )
+        self.assertEqual( b'h1-eth0\0', attrs[ 3 ] )
+        self.assertEqual( '00:00:00:00:00:01', _macstr( attrs[ 1 ] ) )
+
+    def testBroadcast( self ):
+        "Broadcast address matches what ifconfig would set"
+        self.assertEqual( b'\x0a\xff\xff\xff', _broadcast( '10.0.0.1', 8 ) )
+
+    def testRoute( self ):
+        "setDefaultRoute() arguments are parsed for netlink when possible"
+        self.assertEqual( ( 'h1-eth0', None ), Node.nlRoute( 'h1-eth0' ) )
+        self.assertEqual( ( 'h1-eth0', '10.0.0.1' ),
+                          Node.nlRoute( 'dev h1-eth0 via 10.0.0.1' ) )
+        self.assertEqual( None, Node.nlRoute( 'via 10.0.0.1 metric 5' ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test Node output buffering and parsing, using a pipe as output."""
+
+import os
+import select
+import socket
+import unittest
+from time import time
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from mininet.agent import FrameReader, packFrame
+from mininet.node import Node, AgentHost
+from mininet.util import getincrementaldecoder, PhaseTimer
+
+class PipeNode( Node ):
+    "Node whose shell output comes from a pipe that we write to"
+
+    def __init__( self ):  # pylint: disable=super-init-not-called
+        self.readbuf, self.lineScan = bytearray(), 0
+        self.decoder = getincrementaldecoder()
+        rfd, self.wfd = os.pipe()
+        self.stdout = os.fdopen( rfd, 'rb' )
+        self.pollOut = select.poll()
+        self.pollOut.register( self.stdout )
+        self.waiting, self.lastPid = True, None
+
+    def output( self, data ):
+        "Write data as if our shell had printed it"
+        os.write( self.wfd, data )
+
+class SocketNode( AgentHost ):
+    "AgentHost whose command server is a socket that we write frames to"
+
+    def __init__( self ):  # pylint: disable=super-init-not-called
+        self.name = 'socketnode'
+        self.readbuf, self.lineScan = bytearray(), 0
+        self.decoder = getincrementaldecoder()
+        self.sock, self.server = socket.socketpair()
+        # Fail rather than hang if we wait for frames that never come
+        self.sock.settimeout( 5 )
+        self.frames = FrameReader()
+        self.pollOut = select.poll()
+        self.pollOut.register( self.sock )
+        self.waiting, self.lastPid, self.lastExit = True, None, None
+        self.background, self.bgGroups = False, []
+
+    def output( self, kind, payload ):
+        "Send a frame as if our command server had sent it"
+        self.server.sendall( packFrame( kind, payload ) )
+
+class testNodeIO( unittest.TestCase ):
+    "Test read(), readline(), monitor() and waitOutput()"
+
+    def testReadline( self ):
+        "readline() returns complete lines and buffers the rest"
+        node = PipeNode()
+        node.output( b'one\ntw' )
+        self.assertEqual( 'one', node.readline() )
+        node.output( b'o' )
+        self.assertEqual( None, node.readline() )
+        node.output( b'\nthree' )
+        self.assertEqual( 'two', node.readline() )
+        self.assertEqual( 'th', node.read( 2 ) )
+        self.assertEqual( 'ree', node.monitor() )
+
+    def testWaitOutput( self ):
+        "waitOutput() strips the PID marker and stops at the sentinel"
+        node = PipeNode()
+        node.output( b'\x01' + b'42\r\nab\xc3' )
+        node.output( b'\xa9\n\x7f' )
+        self.assertEqual( u'ab\xe9\n', node.waitOutput() )
+        self.assertEqual( 42, node.lastPid )
+        self.assertFalse( node.waiting )
+
+    def testSink( self ):
+        "waitOutput( sink=f ) passes output to f rather than returning it"
+        node, chunks = PipeNode(), []
+        node.output( b'x' * 60000 + b'\x7f' )
+        self.assertEqual( '', node.waitOutput( sink=chunks.append ) )
+        self.assertEqual( b'x' * 60000, b''.join( chunks ) )
+
+    def testAgentOutput( self ):
+        "AgentHost output may contain ^A, which isn't a PID marker"
+        node = SocketNode()
+        node.output( 'o', b'a\x01b' )
+        node.output( 'x', '0' )
+        self.assertEqual( u'a\x01b', node.waitOutput() )
+        self.assertEqual( ( None, 0 ), ( node.lastPid, node.lastExit ) )
+
+    def testAgentBackground( self ):
+        "AgentHost background commands still report their PID"
+        node = SocketNode()
+        node.background = True
+        node.output( 'p', '7' )
+        node.output( 'o', b'\x01' + b'42\n' )
+        node.output( 'x', '0' )
+        self.assertEqual( u'', node.waitOutput() )
+        self.assertEqual( ( 42, [ 7 ] ), ( node.lastPid, node.bgGroups ) )
+
+class MarkedNode( Node ):
+    "Node that notes when it is terminated"
+
+    def terminate( self ):
+        self.terminated = True
+        Node.terminate( self )
+
+class testShell( unittest.TestCase ):
+    "Test commands and termination with real nodes"
+
+    def setUp( self ):
+        self.nodes = [ Node( 'h1' ), MarkedNode( 'h2' ), Node( 'h3' ) ]
+
+    def tearDown( self ):
+        for node in self.nodes:
+            node.terminate()
+
+    def testCmdBatch( self ):
+        "cmdBatch() splits output and exit codes by command"
+        node = self.nodes[ 0 ]
+        cmds = [ 'echo one', 'true', 'printf "a\\nb"; false',
+                 'status() { return 3; }; status' ]
+        # (our shell's pty turns \n into \r\n, as it does for cmd())
+        expected = [ ( 'one\r\n', 0 ), ( '', 0 ), ( 'a\r\nb', 1 ),
+                     ( '', 3 ) ]
+        self.assertEqual( expected, node.cmdBatch( cmds ) )
+        # Results are the same if we send commands in several chunks
+        node.batchChars = 20
+        self.assertEqual( expected, node.cmdBatch( cmds ) )
+        self.assertEqual( 'ok\r\n', node.cmd( 'echo ok' ) )
+
+    def testCmdBatchDelimiters( self ):
+        "cmdBatch() output may contain prompts, but not newlines"
+        node = self.nodes[ 0 ]
+        self.assertEqual( [ ( '\x7f', 0 ), ( 'b\r\n', 0 ), ( 'c\r\n', 0 ) ],
+                          node.cmdBatch( [ 'printf "\\177"', 'echo b',
+                                           'echo c' ] ) )
+        self.assertRaises( Exception, node.cmdBatch,
+                           [ 'echo x\necho y', 'echo z' ] )
+        self.assertEqual( 'ok\r\n', node.cmd( 'echo ok' ) )
+
+    def testTerminateAll( self ):
+        "terminateAll() stops every node, including ones that override it"
+        shells = [ node.shell for node in self.nodes ]
+        timer = PhaseTimer()
+        Node.terminateAll( self.nodes, timer )
+        self.assertEqual( [ None ] * 3, [ n.shell for n in self.nodes ] )
+        self.assertTrue( all( shell.poll() is not None for shell in shells ) )
+        self.assertTrue( self.nodes[ 1 ].terminated )
+        self.assertEqual( [ 'signal', 'reap' ],
+                          [ name for name, _secs in timer.phases ] )
+
+@unittest.skipIf( asyncio is None, 'asyncio is not available' )
+class testAsync( unittest.TestCase ):
+    "Test the asyncio API with real nodes"
+
+    def setUp( self ):
+        self.nodes = [ Node( name ) for name in ( 'h1', 'h2' ) ]
+
+    def tearDown( self ):
+        for node in self.nodes:
+            node.terminate()
+
+    def testAcmd( self ):
+        "acmd() runs commands on several nodes at once"
+        loop, results = asyncio.new_event_loop(), []
+
+        def run():
+            "Run a command on each node concurrently, within our loop"
+            results.append( asyncio.gather( *(
+                node.acmd( 'sleep 1; echo', node.name )
+                for node in self.nodes ) ) )
+            results[ 0 ].add_done_callback( lambda _future: loop.stop() )
+
+        start = time()
+        try:
+            loop.call_soon( run )
+            loop.run_forever()
+        finally:
+            loop.close()
+        outputs = results[ 0 ].result()
+        self.assertEqual( [ 'h1', 'h2' ], [ o.strip() for o in outputs ] )
+        self.assertTrue( time() - start < 1.9 )
+        self.assertFalse( any( node.waiting for node in self.nodes ) )
+
+if __name__ == '__main__':
+    unittest.main()
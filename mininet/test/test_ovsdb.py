@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test the OVSDB client in mininet.ovsdb against OVSDBStub."""
+
+import unittest
+from threading import Timer
+from time import time
+
+from mininet.ovsdb import ( OVSDB, OVSDBStub, OVSDBError, UUID, NamedUUID,
+                            VSwitchDB, insertOp, mutateOp, selectOp, where )
+from mininet.node import OVSSwitch
+
+class FakeSwitch( OVSSwitch ):
+    "OVSSwitch that we can create without a shell or OVS"
+    # pylint: disable=super-init-not-called
+    def __init__( self, name, failMode='secure', ovsdb=False ):
+        self.name = name
+        self.failMode = failMode
+        self.ovsdb = ovsdb
+        self.dpid = '1'
+        self.inband = False
+        self.datapath = 'kernel'
+        self.protocols = None
+        self.stp = False
+        self.reconnectms = 1000
+        self.batch = True
+        self.ops = []
+        self.intfs = {}
+
+    def __str__( self ):
+        return self.name
+
+class testOVSDB( unittest.TestCase ):
+    "Test OVSDB monitors and waitConnectedAll()"
+
+    def setUp( self ):
+        self.stub = OVSDBStub()
+
+    def tearDown( self ):
+        self.stub.stop()
+
+    def addBridge( self, name, connected=False ):
+        "Add a bridge with one controller and return the controller UUID"
+        controller = self.stub.insert( 'Controller',
+                                       { 'is_connected': connected } )
+        self.stub.insert( 'Bridge', { 'name': name,
+                                      'controller': [ controller ] } )
+        return controller
+
+    def testMonitor( self ):
+        "Monitor replicates the table and reports changes"
+        controller = self.addBridge( 's1' )
+        db = OVSDB( self.stub.path )
+        changes = []
+        db.monitor( { 'Controller': [ 'is_connected' ] }, changes.append )
+        self.assertEqual( False, db.tables[ 'Controller' ][ controller ][
+            'is_connected' ] )
+        self.stub.update( 'Controller', controller, is_connected=True )
+        self.assertTrue( db.waitFor( lambda: len( changes ) == 2, 2 ) )
+        self.assertEqual( { 'Controller': { controller:
+                                            { 'is_connected': True } } },
+                          changes[ -1 ] )
+        self.assertTrue( isinstance( list( db.tables[ 'Controller' ] )[ 0 ],
+                                     UUID ) )
+        self.assertEqual( [ 1, 'x' ], db.call( 'echo', 1, 'x' ) )
+        db.close()
+
+    def testWaitConnected( self ):
+        "waitConnectedAll() returns as soon as the last switch connects"
+        c1, c2 = self.addBridge( 's1' ), self.addBridge( 's2' )
+        self.addBridge( 's3' )
+        switches = [ FakeSwitch( 's1' ), FakeSwitch( 's2' ),
+                     FakeSwitch( 's3', failMode='standalone' ) ]
+        for c in c1, c2:
+            Timer( .2, self.stub.update, [ 'Controller', c ],
+                   { 'is_connected': True } ).start()
+        start = time()
+        remaining = OVSSwitch.waitConnectedAll(
+            switches, timeout=5, db=OVSDB( self.stub.path ) )
+        self.assertEqual( [], remaining )
+        self.assertTrue( time() - start < 2 )
+
+    def testTimeout( self ):
+        "waitConnectedAll() returns switches which don't connect"
+        self.addBridge( 's1', connected=True )
+        self.addBridge( 's2' )
+        s1, s2 = FakeSwitch( 's1' ), FakeSwitch( 's2' )
+        remaining = OVSSwitch.waitConnectedAll(
+            [ s1, s2 ], timeout=.3, db=OVSDB( self.stub.path ) )
+        self.assertEqual( [ s2 ], remaining )
+
+class testVSwitchDB( unittest.TestCase ):
+    "Test OVSDB transactions and VSwitchDB against OVSDBStub"
+
+    def setUp( self ):
+        self.stub = OVSDBStub()
+        self.root = self.stub.insert( 'Open_vSwitch', { 'bridges': [] } )
+        self.db = VSwitchDB( self.stub.path )
+
+    def tearDown( self ):
+        self.db.close()
+        OVSSwitch.vswitchdb = None
+        self.stub.stop()
+
+    def names( self, table ):
+        "Return names of rows in stub table"
+        return sorted( row[ 'name' ]
+                       for row in self.stub.tables.get( table, {} ).values() )
+
+    def testTransact( self ):
+        "Named UUIDs are resolved and failed transactions roll back"
+        br = NamedUUID( 'br' )
+        results = self.db.transact(
+            insertOp( 'Bridge', { 'name': 's1' }, br ),
+            mutateOp( 'Open_vSwitch', [], 'bridges', 'insert', [ br ] ),
+            selectOp( 'Bridge', [ where( 'name', 's1' ) ], [ '_uuid' ] ) )
+        uuid = UUID( results[ 0 ][ 'uuid' ][ 1 ] )
+        self.assertEqual( [ 'uuid', uuid ], results[ 2 ][ 'rows' ][ 0 ][
+            '_uuid' ] )
+        self.assertEqual( [ uuid ], self.stub.tables[ 'Open_vSwitch' ][
+            self.root ][ 'bridges' ] )
+        self.assertRaises( OVSDBError, self.db.transact,
+                           insertOp( 'Bridge', { 'name': 's2' } ),
+                           { 'op': 'frobnicate', 'table': 'Bridge' } )
+        self.assertEqual( [ 's1' ], self.names( 'Bridge' ) )
+
+    def testBridges( self ):
+        "add-br, add-port, del-port and del-br equivalents"
+        db = self.db
+        db.commit( db.addBridgeOps(
+            's1', [ ( 's1-eth1', { 'ofport_request': 1 } ) ],
+            [ { 'target': 'tcp:127.0.0.1:6653' } ],
+            { 'fail_mode': 'secure' } ) )
+        db.commit( db.addPortOps( 's1', 's1-eth2' ) )
+        self.assertEqual( [ 's1', 's1-eth1', 's1-eth2' ],
+                          self.names( 'Interface' ) )
+        self.assertEqual( [ 's1' ], list( db.bridges() ) )
+        self.assertEqual( 1, len( db.controllerUUIDs( 's1' ) ) )
+        self.assertFalse( db.connected( 's1' ) )
+        db.commit( db.delPortOps( 's1', 's1-eth1' ) )
+        self.assertEqual( [ 's1', 's1-eth2' ], self.names( 'Port' ) )
+        db.commit( db.delBridgeOps( 's1', 'nonexistent' ) )
+        for table in 'Bridge', 'Port', 'Interface', 'Controller':
+            self.assertEqual( {}, self.stub.tables[ table ] )
+        self.assertEqual( [], self.stub.tables[ 'Open_vSwitch' ][
+            self.root ][ 'bridges' ] )
+
+    def testWaitCfg( self ):
+        "commit() waits for cur_cfg to catch up with next_cfg"
+        self.stub.update( 'Open_vSwitch', self.root, next_cfg=0, cur_cfg=0 )
+        Timer( .2, self.stub.update, [ 'Open_vSwitch', self.root ],
+               { 'cur_cfg': 1 } ).start()
+        start = time()
+        self.db.commit( self.db.addBridgeOps( 's1' ), timeout=5 )
+        self.assertTrue( .1 < time() - start < 2 )
+
+    def testBatchStartup( self ):
+        "Switches with ovsdb=True start up in one transaction"
+        OVSSwitch.vswitchdb = self.db
+        switches = [ FakeSwitch( 's%d' % i, ovsdb=True ) for i in ( 1, 2 ) ]
+        for switch in switches:
+            switch.startOVSDB( [], [ ( 'c0', 'tcp:127.0.0.1:6653' ) ] )
+        self.assertEqual( [], self.names( 'Bridge' ) )
+        calls = []
+        OVSSwitch.batchStartup( switches, run=calls.append )
+        self.assertEqual( [], calls )
+        self.assertEqual( [ 's1', 's2' ], self.names( 'Bridge' ) )
+        self.assertFalse( switches[ 0 ].connected() )
+        cid = switches[ 0 ].controllerUUIDs()[ 0 ]
+        self.stub.update( 'Controller', cid, is_connected=True )
+        self.assertEqual( [ switches[ 1 ] ], OVSSwitch.waitConnectedAll(
+            switches, timeout=.3 ) )
+
+if __name__ == '__main__':
+    unittest.main()
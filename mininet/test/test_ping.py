@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test PingMatrix and parsing of pingMatrix()'s script output, using
+   a fake ping command."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from subprocess import Popen, PIPE
+
+from mininet.net import Mininet, PingMatrix
+from mininet.util import decode
+
+# Reply from addresses ending in .2, and drop everything else
+FAKEPING = r'''#!/bin/sh
+for ip; do :; done
+echo "PING $ip ($ip) 56(84) bytes of data."
+echo "--- $ip ping statistics ---"
+if [ "${ip##*.}" = 2 ]; then
+    echo "2 packets transmitted, 2 received, 0% packet loss, time 1ms"
+    echo "rtt min/avg/max/mdev = 0.040/0.050/0.060/0.010 ms"
+else
+    echo "2 packets transmitted, 0 received, 100% packet loss, time 1ms"
+fi
+'''
+
+class Host( object ):
+    "Minimal host with a name"
+
+    def __init__( self, name ):
+        self.name = name
+
+class testPing( unittest.TestCase ):
+    "Test ping result parsing and PingMatrix"
+
+    def testMatrix( self ):
+        "PingMatrix reports loss, rtt and totals"
+        h1, h2, h3 = hosts = [ Host( n ) for n in ( 'h1', 'h2', 'h3' ) ]
+        results = PingMatrix( hosts )
+        results.add( h1, h2, ( 2, 2, 0.04, 0.05, 0.06, 0.01 ) )
+        results.add( h1, h3, ( 2, 1, 0.04, 0.05, 0.06, 0.01 ) )
+        results.add( h2, h1, ( 2, 0, 0, 0, 0, 0 ) )
+        self.assertEqual( [ [ None, 0.0, 50.0 ], [ 100.0, None, None ],
+                            [ None, None, None ] ], results.matrix() )
+        self.assertEqual( 0.05, results.rtt( h1, h3 ) )
+        self.assertEqual( None, results.rtt( h2, h1 ) )
+        self.assertEqual( ( 6, 3 ), results.packets() )
+        self.assertEqual( 50.0, results.ploss() )
+        self.assertEqual( '       h1   h2   h3\n'
+                          '  h1    -   0%  50%', str( results )[ :39 ] )
+
+    def testScript( self ):
+        "pingScript's output lines are parsed into indexed results"
+        bindir = tempfile.mkdtemp()
+        try:
+            path = os.path.join( bindir, 'ping' )
+            with open( path, 'w' ) as f:
+                f.write( FAKEPING )
+            os.chmod( path, 0o755 )
+            env = dict( os.environ,
+                        PATH=bindir + os.pathsep + os.environ[ 'PATH' ] )
+            args = [ '0', '10.0.0.2', '1', '10.0.0.3', '2', '10.0.0.2' ]
+            out = Popen( [ 'sh', '-c', Mininet.pingScript, 'ping', '2',
+                           '-c2' ] + args, stdout=PIPE,
+                         env=env ).communicate()[ 0 ]
+        finally:
+            shutil.rmtree( bindir )
+        # (splitlines() would also split at our \036 separators)
+        results = dict( Mininet.parsePingLine( line ) for line in
+                        decode( out ).split( '\n' ) if line )
+        self.assertEqual( { 0: ( 2, 2, 0.04, 0.05, 0.06, 0.01 ),
+                            1: ( 1, 0, 0, 0, 0, 0 ),
+                            2: ( 2, 2, 0.04, 0.05, 0.06, 0.01 ) },
+                          results )
+        self.assertEqual( None, Mininet.parsePingLine( 'garbage\n' ) )
+
+    def testMissing( self ):
+        "Destinations without IPs, and pings that never report, are lost"
+        net = Mininet( controller=None )
+        h1, h2, h3 = [ net.addHost( 'h%d' % i ) for i in ( 1, 2, 3 ) ]
+        net.addLink( h1, h2 )
+        net.addLink( h1, h3 )
+        try:
+            net.build()
+            h3.defaultIntf().ip = None
+            # Our ping script fails without printing any results
+            net.pingScript = 'exit 1'
+            rows = []
+            results = net.pingMatrix( count=2, rowDone=lambda src, row:
+                                      rows.append( ( src, row ) ) )
+        finally:
+            net.stop()
+        lost, none = ( 2, 0, 0, 0, 0, 0 ), ( 0, 0, 0, 0, 0, 0 )
+        self.assertEqual( [ ( h1, [ ( h2, lost ), ( h3, none ) ] ),
+                            ( h2, [ ( h1, lost ), ( h3, none ) ] ),
+                            ( h3, [ ( h1, lost ), ( h2, lost ) ] ) ],
+                          rows )
+        self.assertEqual( ( 8, 0 ), results.packets() )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test CPU topology parsing and host placement, using a temporary
+   directory as sysfs"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mininet.placement import ( CpuTopology, CpuPlacer, parseCpuList,
+                                cpuListStr )
+from mininet.topo import LinearTopo
+
+class testPlacement( unittest.TestCase ):
+    "Test placement on 2 NUMA nodes with 2 hyperthreaded cores each"
+
+    def setUp( self ):
+        self.dir = tempfile.mkdtemp()
+        cpuDir, nodeDir = ( os.path.join( self.dir, 'cpu' ),
+                            os.path.join( self.dir, 'node' ) )
+
+        def write( path, text ):
+            "Write text to path, creating its directory"
+            if not os.path.isdir( os.path.dirname( path ) ):
+                os.makedirs( os.path.dirname( path ) )
+            with open( path, 'w' ) as f:
+                f.write( text + '\n' )
+
+        write( os.path.join( cpuDir, 'online' ), '0-7' )
+        for cpu in range( 8 ):
+            write( os.path.join( cpuDir, 'cpu%d' % cpu, 'topology',
+                                 'thread_siblings_list' ),
+                   '%d,%d' % ( cpu % 4, cpu % 4 + 4 ) )
+        write( os.path.join( nodeDir, 'node0', 'cpulist' ), '0-1,4-5' )
+        write( os.path.join( nodeDir, 'node1', 'cpulist' ), '2-3,6-7' )
+        self.topology = CpuTopology( cpuDir, nodeDir )
+
+    def tearDown( self ):
+        shutil.rmtree( self.dir )
+
+    def testCpuList( self ):
+        "CPU lists are parsed and formatted"
+        self.assertEqual( [ 0, 1, 2, 5 ], parseCpuList( '0-2,5\n' ) )
+        self.assertEqual( '0-2,5', cpuListStr( [ 5, 1, 0, 2 ] ) )
+
+    def testTopology( self ):
+        "We find siblings and NUMA nodes"
+        self.assertEqual( { 0: [ 0, 1, 4, 5 ], 1: [ 2, 3, 6, 7 ] },
+                          self.topology.nodes() )
+        self.assertEqual( [ ( 2, 6 ), ( 3, 7 ) ],
+                          self.topology.cores( [ 2, 3, 6, 7 ] ) )
+        self.assertEqual( '0-1', self.topology.mems( '1,6' ) )
+
+    def testPlace( self ):
+        "Groups share a NUMA node, and we avoid the reserved core"
+        placer = CpuPlacer( self.topology )
+        self.assertEqual( [ 0, 4 ], placer.reserved )
+        plan = placer.place( { 's1': [ 'h1', 'h2', 'h3' ], 's2': [ 'h4' ] } )
+        self.assertEqual( { 'h1': 2, 'h2': 3, 'h3': 6, 'h4': 1 }, plan )
+
+    def testTopoGroups( self ):
+        "Hosts are grouped by switch"
+        groups = CpuPlacer.topoGroups( LinearTopo( k=2, n=2 ) )
+        self.assertEqual( { 's1': [ 'h1s1', 'h2s1' ],
+                            's2': [ 'h1s2', 'h2s2' ] }, groups )
+
+if __name__ == '__main__':
+    unittest.main()
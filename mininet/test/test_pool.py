@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test reusing hosts across Mininet instances with a NodePool"""
+
+import unittest
+
+from mininet.net import Mininet
+from mininet.node import Host
+from mininet.pool import NodePool, nodeProcs
+from mininet.clean import cleanup
+
+class testNodePool( unittest.TestCase ):
+    "Test that pooled hosts are reset and reused"
+
+    def setUp( self ):
+        self.pool = NodePool()
+
+    def tearDown( self ):
+        self.pool.terminate()
+
+    def makeNet( self ):
+        "Return a started network of two connected hosts"
+        net = Mininet( host=Host, controller=None, pool=self.pool )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        net.addLink( h1, h2 )
+        net.start()
+        return net
+
+    def testReuse( self ):
+        "Hosts are reused, with no leftover processes or addresses"
+        net = self.makeNet()
+        h1 = net[ 'h1' ]
+        h1.cmd( 'sleep 60 &' )
+        h1.cmd( 'ip addr add 10.9.9.9/32 dev lo' )
+        net.stop()
+        self.assertEqual( { h1: [] }, nodeProcs( [ h1 ] ) )
+        net = self.makeNet()
+        self.assertIs( h1, net[ 'h1' ] )
+        self.assertEqual( [ 'h1-eth0' ], h1.intfNames() )
+        self.assertNotIn( '10.9.9.9', h1.cmd( 'ip addr show dev lo' ) )
+        self.assertEqual( 0, net.ping( [ h1, net[ 'h2' ] ] ) )
+        net.stop()
+
+    def testParams( self ):
+        "Hosts are only reused if their parameters match"
+        h1 = self.pool.node( Host, 'h1', ip='10.0.0.1' )
+        self.pool.release( [ h1 ] )
+        h1b = self.pool.node( Host, 'h1', ip='10.0.0.2' )
+        self.assertIsNot( h1, h1b )
+        self.assertIs( h1, self.pool.node( Host, 'h1', ip='10.0.0.1' ) )
+        self.pool.release( [ h1, h1b ] )
+
+if __name__ == '__main__':
+    unittest.main()
+    cleanup()
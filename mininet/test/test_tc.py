@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test incremental tc configuration in mininet.link.TCIntf."""
+
+import unittest
+
+from mininet.link import TCIntf
+
+class testTCDiff( unittest.TestCase ):
+    "Test TCIntf.tcDiff(), which doesn't need a kernel"
+
+    @staticmethod
+    def tree( bw=None, delay=None ):
+        "Return qdisc tree for bw and delay"
+        cmds, parent = [], ' root '
+        if bw:
+            cmds = [ '%s qdisc add dev %s root handle 5:0 htb default 1',
+                     '%s class add dev %s parent 5:0 classid 5:1 htb ' +
+                     'rate %fMbit burst 15k' % bw ]
+            parent = ' parent 5:1 '
+        delaycmds, _parent = TCIntf.delayCmds( parent, delay=delay )
+        return TCIntf.tcTree( cmds + delaycmds )
+
+    def testAdd( self ):
+        "New configuration is added without deleting the default qdisc"
+        lines = TCIntf.tcDiff( 'h1-eth0', None, self.tree( 10, '1ms' ),
+                               ( 'noqueue', '0:' ) )
+        self.assertEqual( 3, len( lines ) )
+        self.assertTrue( lines[ 0 ].startswith(
+            'qdisc add dev h1-eth0 root handle 5:0 htb' ) )
+        self.assertTrue( lines[ 2 ].endswith( 'netem delay 1ms' ) )
+
+    def testChange( self ):
+        "Changing delay is a single qdisc change"
+        current = self.tree( 10, '1ms' )
+        lines = TCIntf.tcDiff( 'h1-eth0', current, self.tree( 10, '5ms' ),
+                               ( 'htb', '5:' ) )
+        self.assertEqual(
+            [ 'qdisc change dev h1-eth0 parent 5:1 handle 10: netem '
+              'delay 5ms' ], lines )
+        self.assertEqual( [], TCIntf.tcDiff( 'h1-eth0', current, current,
+                                             ( 'htb', '5:' ) ) )
+
+    def testRebuild( self ):
+        "Changing structure, or losing our root qdisc, rebuilds the tree"
+        current = self.tree( 10, '1ms' )
+        lines = TCIntf.tcDiff( 'h1-eth0', current, self.tree( None, '1ms' ),
+                               ( 'htb', '5:' ) )
+        self.assertEqual( 'qdisc del dev h1-eth0 root', lines[ 0 ] )
+        self.assertEqual( 2, len( lines ) )
+        lines = TCIntf.tcDiff( 'h1-eth0', current, current,
+                               ( 'noqueue', '0:' ) )
+        self.assertEqual( 3, len( lines ) )
+
+    def testRemove( self ):
+        "Removing all parameters deletes our configuration"
+        self.assertEqual( [ 'qdisc del dev h1-eth0 root' ],
+                          TCIntf.tcDiff( 'h1-eth0', self.tree( 10 ), [],
+                                         ( 'htb', '5:' ) ) )
+
+if __name__ == '__main__':
+    unittest.main()
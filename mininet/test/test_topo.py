@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test Topo with its MultiGraph and CompactMultiGraph backends,
+   and lazy Topo streaming."""
+
+import unittest
+
+from mininet.topo import Topo, MultiGraph, CompactMultiGraph
+
+class TreeTopo( Topo ):
+    "Two-level tree with a loop link and a multi-link"
+    def build( self, fanout=3 ):
+        core = self.addSwitch( 's1' )
+        for i in range( 2, 2 + fanout ):
+            edge = self.addSwitch( 's%d' % i )
+            self.addLink( core, edge, bw=10 )
+            for j in range( 1, 1 + fanout ):
+                host = self.addHost( 'h%d%d' % ( i, j ), ip='10.0.%d.%d' %
+                                     ( i, j ) )
+                self.addLink( host, edge, bw=10, delay='1ms' )
+        self.addLink( core, 's2', port1=10, bw=20 )
+        self.addLink( 's3', 's3' )
+
+class testTopo( unittest.TestCase ):
+    "Test that both graph backends behave the same"
+
+    def testBackends( self ):
+        "CompactMultiGraph gives the same results as MultiGraph"
+        topos = [ TreeTopo( graphClass=g )
+                  for g in ( MultiGraph, CompactMultiGraph ) ]
+        results = [ ( t.nodes(), t.hosts(), t.switches(),
+                      t.links( sort=True, withKeys=True, withInfo=True ),
+                      t.port( 's1', 's2' ), t.port( 's3', 's3' ),
+                      t.linkInfo( 's2', 's1', key=2 ), t.nodeInfo( 'h21' ) )
+                    for t in topos ]
+        self.assertEqual( results[ 0 ], results[ 1 ] )
+        self.assertEqual( [ ( 1, 1 ), ( 10, 5 ) ], results[ 1 ][ 4 ] )
+        self.assertEqual( [ ( 5, 6 ), ( 6, 5 ) ], results[ 1 ][ 5 ] )
+
+    def testMixedKeys( self ):
+        "port() copes with edge keys of different types"
+        for graphClass in MultiGraph, CompactMultiGraph:
+            topo = Topo( graphClass=graphClass )
+            for name in 's1', 's2':
+                topo.addSwitch( name )
+            topo.addLink( 's1', 's2' )
+            topo.addLink( 's1', 's2', key='backup' )
+            self.assertEqual( [ ( 1, 1 ), ( 2, 2 ) ],
+                              topo.port( 's1', 's2' ) )
+            self.assertEqual( 2, topo.linkInfo( 's2', 's1',
+                                                key='backup' )[ 'port1' ] )
+
+    def testCompact( self ):
+        "CompactMultiGraph shares edge attributes and writes through"
+        topo = TreeTopo( graphClass=CompactMultiGraph )
+        self.assertEqual( 4, len( topo.g.attrs ) )
+        topo.setlinkInfo( 's1', 's2', dict( topo.linkInfo( 's1', 's2' ),
+                                            bw=5 ) )
+        self.assertEqual( 5, topo.linkInfo( 's2', 's1' )[ 'bw' ] )
+        self.assertEqual( 10, topo.linkInfo( 's1', 's3' )[ 'bw' ] )
+
+    def testStream( self ):
+        "A lazy Topo streams in build() order without storing anything"
+        topo = TreeTopo( fanout=2, lazy=True )
+        items = []
+        topo.stream( lambda name, info: items.append( name ),
+                     lambda info: items.append(
+                         ( info[ 'node1' ], info[ 'node2' ],
+                           info.get( 'port1' ) ) ) )
+        self.assertEqual( [ 's1', 's2', ( 's1', 's2', None ), 'h21',
+                            ( 'h21', 's2', None ) ], items[ :5 ] )
+        self.assertEqual( ( 's1', 's2', 10 ), items[ -2 ] )
+        self.assertEqual( 0, len( topo.g ) )
+        # Accessing a lazy Topo builds it; then stream() replays it
+        self.assertEqual( TreeTopo( fanout=2 ).links( sort=True ),
+                          topo.links( sort=True ) )
+        nodes = []
+        topo.stream( lambda name, info: nodes.append( name ),
+                     lambda info: None )
+        self.assertEqual( topo.hosts() + topo.switches(), nodes )
+
+    def testStreamQuery( self ):
+        "build() can't examine a Topo while it is being streamed"
+        class QueryTopo( Topo ):
+            "Topo whose build() asks for its hosts"
+            def build( self ):
+                self.addHost( 'h1' )
+                self.addSwitch( 's1' )
+                for host in self.hosts():
+                    self.addLink( host, 's1' )
+        topo, nodes = QueryTopo( lazy=True ), []
+        self.assertRaises( Exception, topo.stream,
+                           lambda name, info: nodes.append( name ),
+                           lambda info: None )
+        self.assertEqual( [ 'h1', 's1' ], nodes )
+        # Once streaming has stopped, we can build it as usual
+        self.assertEqual( [ ( 'h1', 's1' ) ], topo.links() )
+
+if __name__ == '__main__':
+    unittest.main()
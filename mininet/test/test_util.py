@@ -3,9 +3,18 @@
 """Package: mininet
    Test functions defined in mininet.util."""
 
+import os
+import shutil
+import tempfile
 import unittest
+from time import sleep
 
-from mininet.util import quietRun
+from mininet.util import ( quietRun, IndexedList, PortAllocator,
+                           recordNetns, recordedNetns, PhaseTimer,
+                           makeIntfPairs, batchRunAll )
+from mininet.clean import staleNetns
+from mininet.node import Node
+from mininet.net import Mininet
 
 class testQuietRun( unittest.TestCase ):
     """Test quietRun that runs a command and returns its merged output from
@@ -35,5 +44,177 @@ def testMultipleReads( self ):
             output = quietRun(testQuietRun.getEchoCmd( n ) )
             self.assertEqual( n, len( output ) )
 
+class testIndexedList( unittest.TestCase ):
+    "Test IndexedList, which behaves like a list of unique items"
+
+    def testList( self ):
+        "Append, remove, index and concatenate like a list"
+        items = IndexedList( [ 'a', 'b', 'c' ] )
+        items.append( 'd' )
+        items.remove( 'b' )
+        self.assertEqual( [ 'a', 'c', 'd' ], items )
+        self.assertEqual( ( 'a', 'c', 'd' ),
+                          ( items[ 0 ], items[ 1 ], items[ -1 ] ) )
+        self.assertEqual( [ 'c', 'd' ], items[ 1: ] )
+        self.assertEqual( [ 'a', 'c', 'd', 'e' ], items + [ 'e' ] )
+        self.assertEqual( [ 'e', 'a', 'c', 'd' ], [ 'e' ] + items )
+        self.assertTrue( 'c' in items and 'b' not in items )
+        self.assertEqual( 3, len( items ) )
+        self.assertEqual( 'd', items.pop() )
+        self.assertRaises( ValueError, items.remove, 'b' )
+        self.assertRaises( IndexError, items.__getitem__, 2 )
+
+    def testPositions( self ):
+        "Indexing stays correct as items are removed and appended"
+        items = IndexedList( range( 10 ) )
+        for item in 3, 9, 0:
+            items.remove( item )
+        items.append( 10 )
+        expected = [ 1, 2, 4, 5, 6, 7, 8, 10 ]
+        self.assertEqual( expected, [ items[ i ] for i in
+                                      range( len( items ) ) ] )
+        self.assertEqual( [ 10, 8 ], list( reversed( items ) )[ :2 ] )
+        self.assertEqual( 2, items.index( 4 ) )
+        self.assertRaises( ValueError, items.index, 3 )
+        self.assertEqual( len( expected ), len( items.slots ) )
+
+    def testInterleaved( self ):
+        "Removes interleaved with indexing match a list"
+        items, expected = IndexedList( range( 30 ) ), list( range( 30 ) )
+        for step in range( 25 ):
+            item = expected[ step * 7 % len( expected ) ]
+            items.remove( item )
+            expected.remove( item )
+            self.assertEqual( expected, [ items[ i ] for i in
+                                          range( len( items ) ) ] )
+            self.assertEqual( expected.index( expected[ -1 ] ),
+                              items.index( expected[ -1 ] ) )
+        items.append( expected[ 0 ] )
+        self.assertEqual( expected, items )
+
+    def testRemoveFirst( self ):
+        "Removing the first item repeatedly only compacts occasionally"
+        items = IndexedList( range( 1000 ) )
+        compactions = []
+        compact = items.compact
+        items.compact = lambda: compactions.append( 1 ) or compact()
+        for item in range( 1000 ):
+            self.assertEqual( ( item, 0 ),
+                              ( items[ 0 ], items.index( item ) ) )
+            items.remove( items[ 0 ] )
+        self.assertEqual( ( [], 0 ), ( list( items ), len( items.slots ) ) )
+        self.assertTrue( len( compactions ) <= 11 )
+
+class testPortAllocator( unittest.TestCase ):
+    "Test PortAllocator"
+
+    def testAllocate( self ):
+        "Allocate from base, skip reserved ports and reuse released ones"
+        ports = PortAllocator( base=1 )
+        self.assertEqual( [ 1, 2 ], [ ports.allocate(), ports.allocate() ] )
+        ports.reserve( 10 )
+        self.assertEqual( 11, ports.allocate() )
+        ports.release( 2 )
+        ports.release( 1 )
+        self.assertFalse( 1 in ports )
+        self.assertEqual( [ 1, 2, 12 ], [ ports.allocate() for _ in
+                                          range( 3 ) ] )
+        ports.release( 12 )
+        ports.reserve( 12 )
+        self.assertEqual( 13, ports.allocate() )
+
+class testPhaseTimer( unittest.TestCase ):
+    "Test PhaseTimer"
+
+    def testPhases( self ):
+        "Each phase is timed from the end of the previous one"
+        timer = PhaseTimer()
+        sleep( .05 )
+        first = timer.phase( 'nodes' )
+        second = timer.phase( 'links' )
+        self.assertTrue( first >= .05 > second )
+        self.assertEqual( [ ( 'nodes', first ), ( 'links', second ) ],
+                          timer.phases )
+        self.assertEqual( first + second, timer.total() )
+        self.assertEqual( 'nodes:%.3fs links:%.3fs' % ( first, second ),
+                          str( timer ) )
+
+class testNetnsRecord( unittest.TestCase ):
+    "Test our record of the netns names that Mininet registered"
+
+    def setUp( self ):
+        self.dir = tempfile.mkdtemp()
+        self.record = os.path.join( self.dir, 'record' )
+
+    def tearDown( self ):
+        shutil.rmtree( self.dir )
+
+    def testRecord( self ):
+        "Names are added and removed"
+        recordNetns( add=[ 'h1', 'h2' ], path=self.record )
+        recordNetns( add=[ 'h3' ], remove=[ 'h1' ], path=self.record )
+        self.assertEqual( set( [ 'h2', 'h3' ] ),
+                          recordedNetns( self.record ) )
+
+    def testStale( self ):
+        "Only recorded names are stale, whether or not they still exist"
+        for name in 'h1', 'other':
+            open( os.path.join( self.dir, name ), 'w' ).close()
+        self.assertEqual( [ 'h1', 'h2' ], staleNetns(
+            self.dir, names=[ 'h1', 'h2' ] ) )
+
+class testBatch( unittest.TestCase ):
+    "Test batched ip commands with real nodes"
+
+    def setUp( self ):
+        self.h1, self.h2 = Node( 'h1' ), Node( 'h2' )
+
+    def tearDown( self ):
+        for node in self.h1, self.h2:
+            node.terminate()
+
+    def testMakeIntfPairs( self ):
+        "Pairs are made in chunks, and errors are reported per pair"
+        pairs = [ ( 'h1-eth%d' % i, 'h2-eth%d' % i, None, None,
+                    self.h1, self.h2 ) for i in range( 3 ) ]
+        # A duplicate name fails without affecting the other pairs
+        pairs.insert( 1, pairs[ 0 ] )
+        errors = makeIntfPairs( pairs, chunkSize=2 )
+        self.assertEqual( [ False, True, False, False ],
+                          [ bool( err ) for err in errors ] )
+        for i in range( 3 ):
+            self.assertIn( 'h1-eth%d' % i, self.h1.cmd( 'ip link' ) )
+            self.assertIn( 'h2-eth%d' % i, self.h2.cmd( 'ip link' ) )
+
+    def testBatchRunAll( self ):
+        "Errors are mapped to the lines that caused them, for each node"
+        results = batchRunAll( [ 'ip', '-force', '-batch', '-' ], {
+            self.h1: [ 'link set lo up', 'bogus', 'link set lo up' ],
+            self.h2: [ 'link show dev nosuch', 'link set lo up' ] } )
+        self.assertEqual( [ False, True, False ],
+                          [ bool( err ) for err in results[ self.h1 ] ] )
+        self.assertIn( 'bogus', results[ self.h1 ][ 1 ] )
+        self.assertEqual( [ True, False ],
+                          [ bool( err ) for err in results[ self.h2 ] ] )
+        self.assertIn( 'nosuch', results[ self.h2 ][ 0 ] )
+
+class testStaticArp( unittest.TestCase ):
+    "Test static ARP entries in a two-host network"
+
+    def testStaticArp( self ):
+        "staticArp() adds permanent entries for the other hosts"
+        net = Mininet( controller=None )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        net.addLink( h1, h2 )
+        net.start()
+        try:
+            net.staticArp()
+            for src, dst in ( h1, h2 ), ( h2, h1 ):
+                neigh = src.cmd( 'ip neigh show', dst.IP() )
+                self.assertIn( dst.MAC(), neigh )
+                self.assertIn( 'PERMANENT', neigh )
+        finally:
+            net.stop()
+
 if __name__ == "__main__":
     unittest.main()
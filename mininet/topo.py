@@ -11,7 +11,9 @@
 setup for testing, and can even be emulated with the Mininet package.
 """
 
-from mininet.util import irange, natural, naturalSeq
+from array import array
+
+from mininet.util import irange, natural
 
 class MultiGraph( object ):
     "Utility class to track nodes and edges - replaces networkx.MultiGraph"
@@ -82,6 +84,14 @@ def __getitem__( self, node ):
         "Return link dict for given src node"
         return self.edge[ node ]
 
+    def get_edge_data( self, src, dst, key=None, default=None ):
+        """Return dict of key to attributes for edges between src and
+           dst, or attributes of the edge with key, or default"""
+        entry = self.edge.get( src, {} ).get( dst )
+        if entry is not None and key is not None:
+            entry = entry.get( key )
+        return default if entry is None else entry
+
     def __len__( self ):
         "Return the number of nodes"
         return len( self.node )
@@ -96,23 +106,330 @@ def convertTo( self, cls, data=False, keys=False ):
         return g
 
 
+class CompactNodeView( object ):
+    "Dict-like view of CompactMultiGraph node attributes, by node name"
+
+    def __init__( self, graph ):
+        self.graph = graph
+
+    def __getitem__( self, node ):
+        return self.graph.nodeAttrs[ self.graph.ids[ node ] ]
+
+    def __setitem__( self, node, attrs ):
+        self.graph.nodeAttrs[ self.graph.nodeId( node ) ] = attrs
+
+    def __contains__( self, node ):
+        return node in self.graph.ids
+
+    def __iter__( self ):
+        return iter( self.graph.names )
+
+    def __len__( self ):
+        return len( self.graph.names )
+
+    def get( self, node, default=None ):
+        "Return attributes for node, or default"
+        return self[ node ] if node in self else default
+
+    def keys( self ):
+        "Return node names"
+        return list( self.graph.names )
+
+    def values( self ):
+        "Return node attribute dicts"
+        return list( self.graph.nodeAttrs )
+
+    def items( self ):
+        "Return list of ( node, attributes )"
+        return list( zip( self.graph.names, self.graph.nodeAttrs ) )
+
+
+class CompactEdgeEntry( dict ):
+    "Dict of edge key to attributes for g[ src ][ dst ]; writes through"
+
+    def __init__( self, graph, edges ):
+        "edges: list of edge ids"
+        dict.__init__( self, ( ( graph.keys[ e ], graph.edgeAttrs( e ) )
+                               for e in edges ) )
+        self.graph = graph
+        self.edges = dict( ( graph.keys[ e ], e ) for e in edges )
+
+    def __setitem__( self, key, attrs ):
+        self.graph.setEdgeAttrs( self.edges[ key ], attrs )
+        dict.__setitem__( self, key, attrs )
+
+
+class CompactMultiGraph( object ):
+    """MultiGraph with the same API which uses much less memory for
+       very large topologies: node names are interned as integer ids,
+       edges are stored in arrays, and the node1/node2/port1/port2
+       attributes which Topo.addLink() adds are stored in arrays, so
+       that edges with otherwise identical attributes share a single
+       attribute dict. Edge attribute dicts are therefore copies: to
+       change them, assign g[ src ][ dst ][ key ] (e.g. setlinkInfo())"""
+
+    # Edge flags: which attributes are stored in arrays
+    NODES, PORT1, PORT2 = 1, 2, 4
+
+    def __init__( self ):
+        self.names = []  # node id to name
+        self.ids = {}  # name to node id
+        self.nodeAttrs = []  # node id to attribute dict
+        self.node = CompactNodeView( self )
+        self.src, self.dst = array( 'i' ), array( 'i' )
+        self.port1, self.port2 = array( 'i' ), array( 'i' )
+        self.flags = array( 'b' )
+        self.keys = []  # edge keys
+        self.attrIds = array( 'i' )  # edge id to index in self.attrs
+        self.attrs = []  # shared edge attribute dicts
+        self.attrIndex = {}  # ( sorted items ) to index in self.attrs
+        self.nextKey = {}  # node pair to next default edge key
+        self.adjacency = None  # node id to edge ids, built on demand
+
+    def nodeId( self, node ):
+        "Return (interned) id for node, adding it if necessary"
+        nodeId = self.ids.get( node )
+        if nodeId is None:
+            nodeId = self.ids[ node ] = len( self.names )
+            self.names.append( node )
+            self.nodeAttrs.append( {} )
+        return nodeId
+
+    def add_node( self, node, attr_dict=None, **attrs):
+        """Add node to graph
+           attr_dict: attribute dict (optional)
+           attrs: more attributes (optional)
+           warning: updates attr_dict with attrs"""
+        attr_dict = {} if attr_dict is None else attr_dict
+        attr_dict.update( attrs )
+        self.nodeAttrs[ self.nodeId( node ) ] = attr_dict
+
+    def internAttrs( self, attrs ):
+        "Return index of shared attribute dict equal to attrs"
+        try:
+            frozen = tuple( sorted( attrs.items() ) )
+            index = self.attrIndex.get( frozen )
+        except TypeError:
+            # Unhashable values: don't share
+            frozen, index = None, None
+        if index is None:
+            index = len( self.attrs )
+            self.attrs.append( attrs )
+            if frozen is not None:
+                self.attrIndex[ frozen ] = index
+        return index
+
+    def splitAttrs( self, src, dst, attrs ):
+        "Return flags, port1, port2, shared attribute index for attrs"
+        attrs, flags, ports = dict( attrs ), 0, [ -1, -1 ]
+        if ( attrs.get( 'node1' ), attrs.get( 'node2' ) ) == ( src, dst ):
+            del attrs[ 'node1' ], attrs[ 'node2' ]
+            flags |= self.NODES
+        for i, name in enumerate( ( 'port1', 'port2' ) ):
+            port = attrs.get( name )
+            if type( port ) is int and 0 <= port < 2**31:
+                del attrs[ name ]
+                flags |= self.PORT1 << i
+                ports[ i ] = port
+        return flags, ports[ 0 ], ports[ 1 ], self.internAttrs( attrs )
+
+    def edgeAttrs( self, edge ):
+        "Return (a copy of the) attribute dict for edge id"
+        attrs = dict( self.attrs[ self.attrIds[ edge ] ] )
+        flags = self.flags[ edge ]
+        if flags & self.NODES:
+            attrs.update( node1=self.names[ self.src[ edge ] ],
+                          node2=self.names[ self.dst[ edge ] ] )
+        if flags & self.PORT1:
+            attrs[ 'port1' ] = self.port1[ edge ]
+        if flags & self.PORT2:
+            attrs[ 'port2' ] = self.port2[ edge ]
+        return attrs
+
+    def setEdgeAttrs( self, edge, attrs ):
+        "Replace attributes of edge id"
+        names = self.names
+        src, dst = names[ self.src[ edge ] ], names[ self.dst[ edge ] ]
+        ( self.flags[ edge ], self.port1[ edge ], self.port2[ edge ],
+          self.attrIds[ edge ] ) = self.splitAttrs( src, dst, attrs )
+
+    def edgeIds( self, srcId, dstId ):
+        "Return ids of edges between node ids srcId and dstId"
+        if self.adjacency is None:
+            self.adjacency = {}
+            for edge, nodeId in enumerate( self.src ):
+                self.adjacency.setdefault( nodeId, [] ).append( edge )
+            for edge, nodeId in enumerate( self.dst ):
+                if nodeId != self.src[ edge ]:
+                    self.adjacency.setdefault( nodeId, [] ).append( edge )
+        pairs = ( srcId, dstId ), ( dstId, srcId )
+        return [ e for e in self.adjacency.get( srcId, () )
+                 if ( self.src[ e ], self.dst[ e ] ) in pairs ]
+
+    def add_edge( self, src, dst, key=None, attr_dict=None, **attrs ):
+        """Add edge to graph
+           key: optional key
+           attr_dict: optional attribute dict
+           attrs: more attributes
+           warning: updates attr_dict with attrs"""
+        attr_dict = {} if attr_dict is None else attr_dict
+        attr_dict.update( attrs )
+        srcId, dstId = self.nodeId( src ), self.nodeId( dst )
+        pair = ( min( srcId, dstId ) << 32 ) | max( srcId, dstId )
+        # If no key, pick next ordinal number
+        nextKey = self.nextKey.get( pair, 1 )
+        if key is None:
+            key = nextKey
+        elif pair in self.nextKey:
+            # Replace existing edge with the same key, if any
+            for edge in self.edgeIds( srcId, dstId ):
+                if self.keys[ edge ] == key:
+                    self.setEdgeAttrs( edge, attr_dict )
+                    return key
+        if isinstance( key, int ):
+            nextKey = max( nextKey, key + 1 )
+        self.nextKey[ pair ] = nextKey
+        flags, port1, port2, attrId = self.splitAttrs( src, dst, attr_dict )
+        edge = len( self.keys )
+        self.src.append( srcId )
+        self.dst.append( dstId )
+        self.flags.append( flags )
+        self.port1.append( port1 )
+        self.port2.append( port2 )
+        self.attrIds.append( attrId )
+        self.keys.append( key )
+        if self.adjacency is not None:
+            self.adjacency.setdefault( srcId, [] ).append( edge )
+            if dstId != srcId:
+                self.adjacency.setdefault( dstId, [] ).append( edge )
+        return key
+
+    def nodes( self, data=False):
+        """Return list of graph nodes
+           data: return list of ( node, attrs)"""
+        return self.node.items() if data else self.node.keys()
+
+    def edges_iter( self, data=False, keys=False ):
+        "Iterator: return graph edges, optionally with data and keys"
+        names = self.names
+        for edge, key in enumerate( self.keys ):
+            src, dst = names[ self.src[ edge ] ], names[ self.dst[ edge ] ]
+            if data:
+                attrs = self.edgeAttrs( edge )
+                if keys:
+                    yield( src, dst, key, attrs )
+                else:
+                    yield( src, dst, attrs )
+            else:
+                if keys:
+                    yield( src, dst, key )
+                else:
+                    yield( src, dst )
+
+    def edges( self, data=False, keys=False ):
+        "Return list of graph edges"
+        return list( self.edges_iter( data=data, keys=keys ) )
+
+    def __getitem__( self, node ):
+        "Return link dict for given src node"
+        srcId = self.ids[ node ]
+        self.edgeIds( srcId, srcId )  # build adjacency if necessary
+        entries = {}
+        for edge in self.adjacency.get( srcId, () ):
+            dstId = self.dst[ edge ]
+            if dstId == srcId:
+                dstId = self.src[ edge ]
+            entries.setdefault( dstId, [] ).append( edge )
+        return dict( ( self.names[ dstId ], CompactEdgeEntry( self, edges ) )
+                     for dstId, edges in entries.items() )
+
+    def get_edge_data( self, src, dst, key=None, default=None ):
+        """Return dict of key to attributes for edges between src and
+           dst (in either direction, as for self[ src ][ dst ]), or
+           attributes of the edge with key, or default"""
+        srcId, dstId = self.ids.get( src ), self.ids.get( dst )
+        if srcId is None or dstId is None:
+            return default
+        edges = self.edgeIds( srcId, dstId )
+        if key is not None:
+            edges = [ e for e in edges if self.keys[ e ] == key ]
+            return self.edgeAttrs( edges[ 0 ] ) if edges else default
+        return CompactEdgeEntry( self, edges ) if edges else default
+
+    def __len__( self ):
+        "Return the number of nodes"
+        return len( self.names )
+
+    def convertTo( self, cls, data=False, keys=False ):
+        """Convert to a new object of networkx.MultiGraph-like class cls
+           data: include node and edge data
+           keys: include edge keys as well as edge data"""
+        g = cls()
+        g.add_nodes_from( self.nodes( data=data ) )
+        g.add_edges_from( self.edges( data=( data or keys ), keys=keys ) )
+        return g
+
+
 class Topo( object ):
     "Data center network representation for structured multi-trees."
 
+    graphClass = MultiGraph  # or CompactMultiGraph for huge topologies
+
     def __init__( self, *args, **params ):
         """Topo object.
            Optional named parameters:
            hinfo: default host options
            sopts: default switch options
            lopts: default link options
+           graphClass: graph class (default: self.graphClass)
+           lazy: don't call build() until needed (see stream())
            calls build()"""
-        self.g = MultiGraph()
+        self.g = params.pop( 'graphClass', self.graphClass )()
+        self.naturalKeys = {}  # cache for naturalKey()
         self.hopts = params.pop( 'hopts', {} )
         self.sopts = params.pop( 'sopts', {} )
         self.lopts = params.pop( 'lopts', {} )
         # ports[src][dst][sport] is port on dst that connects to src
         self.ports = {}
-        self.build( *args, **params )
+        self.nextPorts = {}  # node to next port for newPort()
+        self.lazy = params.pop( 'lazy', False )
+        self.args, self.params = args, params
+        self.sinks = None  # ( addNode, addLink ) while streaming
+        self.built = False
+        if not self.lazy:
+            self.materialize()
+
+    def materialize( self ):
+        "Call build() to fill in our graph, if we haven't already"
+        if self.sinks:
+            # build() would run again, and stream everything twice
+            raise Exception( 'build() cannot examine a Topo while it is '
+                             'being streamed (see stream())' )
+        if not self.built:
+            self.built = True
+            self.build( *self.args, **self.params )
+
+    def stream( self, addNode, addLink ):
+        """Pass nodes and links to addNode( name, info ) and
+           addLink( info ) as build() generates them, rather than
+           storing them in our graph. This lets a network come up
+           while the rest of a (lazy) topology is still being
+           generated, without holding all of it in memory.
+           Links are passed after the nodes they connect, and ports
+           are passed only if build() specified them.
+           If we have been built, we replay our graph in the usual
+           (sorted) order instead."""
+        if self.built:
+            for name in self.hosts() + self.switches():
+                addNode( name, self.nodeInfo( name ) )
+            for _src, _dst, info in self.links( sort=True, withInfo=True ):
+                addLink( info )
+            return
+        self.sinks = addNode, addLink
+        try:
+            self.build( *self.args, **self.params )
+        finally:
+            self.sinks = None
 
     def build( self, *args, **params ):
         "Override this method to build your topology."
@@ -123,6 +440,9 @@ def addNode( self, name, **opts ):
            name: name
            opts: node options
            returns: node name"""
+        if self.sinks:
+            self.sinks[ 0 ]( name, opts )
+            return name
         self.g.add_node( name, **opts )
         return name
 
@@ -153,6 +473,13 @@ def addLink( self, node1, node2, port1=None, port2=None,
            returns: link info key"""
         if not opts and self.lopts:
             opts = self.lopts
+        if self.sinks:
+            opts = dict( opts, node1=node1, node2=node2 )
+            for name, port in ( 'port1', port1 ), ( 'port2', port2 ):
+                if port is not None:
+                    opts[ name ] = port
+            self.sinks[ 1 ]( opts )
+            return key
         port1, port2 = self.addPort( node1, node2, port1, port2 )
         opts = dict( opts )
         opts.update( node1=node1, node2=node2, port1=port1, port2=port2 )
@@ -160,8 +487,9 @@ def addLink( self, node1, node2, port1=None, port2=None,
 
     def nodes( self, sort=True ):
         "Return nodes in graph"
+        self.materialize()
         if sort:
-            return self.sorted( self.g.nodes() )
+            return sorted( self.g.nodes(), key=self.naturalKey )
         else:
             return self.g.nodes()
 
@@ -186,6 +514,7 @@ def iterLinks( self, withKeys=False, withInfo=False ):
            withKeys: return link keys
            withInfo: return link info
            returns: list of ( src, dst [,key, info ] )"""
+        self.materialize()
         for _src, _dst, key, info in self.g.edges_iter( data=True, keys=True ):
             node1, node2 = info[ 'node1' ], info[ 'node2' ]
             if withKeys:
@@ -208,9 +537,13 @@ def links( self, sort=False, withKeys=False, withInfo=False ):
         links = list( self.iterLinks( withKeys, withInfo ) )
         if not sort:
             return links
-        # Ignore info when sorting
+        # Ignore info when sorting; most keys are already cached by
+        # nodes(), so look them up without calling naturalKey()
         tupleSize = 3 if withKeys else 2
-        return sorted( links, key=( lambda l: naturalSeq( l[ :tupleSize ] ) ) )
+        keys, naturalKey = self.naturalKeys, self.naturalKey
+        return sorted( links, key=( lambda link: [
+            keys[ x ] if x in keys else naturalKey( x )
+            for x in link[ :tupleSize ] ] ) )
 
     # This legacy port management mechanism is clunky and will probably
     # be removed at some point.
@@ -223,17 +556,28 @@ def addPort( self, src, dst, sport=None, dport=None ):
         ports = self.ports
         ports.setdefault( src, {} )
         ports.setdefault( dst, {} )
-        # New port: number of outlinks + base
-        if sport is None:
-            src_base = 1 if self.isSwitch( src ) else 0
-            sport = len( ports[ src ] ) + src_base
-        if dport is None:
-            dst_base = 1 if self.isSwitch( dst ) else 0
-            dport = len( ports[ dst ] ) + dst_base
+        # New port: next free port starting at base
+        sport = self.newPort( src, sport )
+        dport = self.newPort( dst, dport )
         ports[ src ][ sport ] = ( dst, dport )
         ports[ dst ][ dport ] = ( src, sport )
         return sport, dport
 
+    def newPort( self, node, port=None ):
+        """Allocate a port on node: one more than the highest port
+           allocated so far, skipping ports which are in use
+           port: port number to use (optional)
+           returns: port"""
+        nextPort = self.nextPorts.get( node )
+        if nextPort is None:
+            nextPort = 1 if self.isSwitch( node ) else 0
+        if port is None:
+            port = nextPort
+            while port in self.ports[ node ]:
+                port += 1
+        self.nextPorts[ node ] = max( nextPort, port + 1 )
+        return port
+
     def port( self, src, dst ):
         """Get port numbers.
             src: source switch name
@@ -243,15 +587,24 @@ def port( self, src, dst ):
                 sport = port on source switch leading to the destination switch
                 dport = port on destination switch leading to the source switch
             Note that you can also look up ports using linkInfo()"""
-        # A bit ugly and slow vs. single-link implementation ;-(
-        ports = [ ( sport, entry[ 1 ] )
-                  for sport, entry in self.ports[ src ].items()
-                  if entry[ 0 ] == dst ]
+        self.materialize()
+        ports = []
+        # Links are in the order they were added
+        for info in self.g.get_edge_data( src, dst, default={} ).values():
+            pair = ( info.get( 'port1' ), info.get( 'port2' ) )
+            if info.get( 'node1' ) == src:
+                ports.append( pair )
+            if info.get( 'node2' ) == src:
+                # (loop links connect in both directions)
+                ports.append( pair[ ::-1 ] )
         return ports if len( ports ) != 1 else ports[ 0 ]
 
     def _linkEntry( self, src, dst, key=None ):
         "Helper function: return link entry and key"
-        entry = self.g[ src ][ dst ]
+        self.materialize()
+        entry = self.g.get_edge_data( src, dst )
+        if entry is None:
+            raise KeyError( ( src, dst ) )
         if key is None:
             key = min( entry )
         return entry, key
@@ -268,6 +621,7 @@ def setlinkInfo( self, src, dst, info, key=None ):
 
     def nodeInfo( self, name ):
         "Return metadata (dict) for node"
+        self.materialize()
         return self.g.node[ name ]
 
     def setNodeInfo( self, name, info ):
@@ -278,8 +632,16 @@ def convertTo( self, cls, data=True, keys=True ):
         """Convert to a new object of networkx.MultiGraph-like class cls
            data: include node and edge data (default True)
            keys: include edge keys as well as edge data (default True)"""
+        self.materialize()
         return self.g.convertTo( cls, data=data, keys=keys )
 
+    def naturalKey( self, item ):
+        "Cached natural sort key for item (see util.natural())"
+        key = self.naturalKeys.get( item )
+        if key is None:
+            key = self.naturalKeys[ item ] = natural( item )
+        return key
+
     @staticmethod
     def sorted( items ):
         "Items sorted in natural (i.e. alphabetical) order"
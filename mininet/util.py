@@ -3,7 +3,7 @@
 
 from mininet.log import output, info, error, warn, debug
 
-from time import sleep
+from time import sleep, time
 from resource import getrlimit, setrlimit, RLIMIT_NPROC, RLIMIT_NOFILE
 from select import poll, POLLIN, POLLHUP
 from subprocess import call, check_call, Popen, PIPE, STDOUT
@@ -12,8 +12,10 @@
 from os import O_NONBLOCK
 import os
 from functools import partial
+from heapq import heappush, heappop
 import sys
 import codecs
+from tempfile import TemporaryFile
 
 # Python 2/3 compatibility
 
@@ -23,7 +25,7 @@
 class NullCodec( object ):
     "Null codec for Python 2"
     @staticmethod
-    def decode( buf ):
+    def decode( buf, _final=False ):
         "Null decode"
         return buf
 
@@ -45,7 +47,7 @@ def encode( buf ):
 else:
     decode, encode = NullCodec.decode, NullCodec.encode
 
-    def getincrementaldecoder():
+    def getincrementaldecoder( _errors='strict' ):
         "Return null codec for Python 2"
         return NullCodec
 
@@ -266,6 +268,294 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
         raise Exception( "Error creating interface pair (%s,%s): %s " %
                          ( intf1, intf2, cmdOutput ) )
 
+def batchRun( cmd, lines, node=None ):
+    """Run a command which reads commands from stdin, such as
+       ip -force -batch - or tc -force -batch -, in node's namespace
+       cmd: command list
+       lines: list of commands to send to cmd
+       node: node to run cmd in (optional: root namespace)
+       returns: list of error output (or '') for each line"""
+    return batchRunAll( cmd, { node: lines } )[ node ]
+
+def batchRunAll( cmd, nodeLines ):
+    """Run batchRun() in parallel for several nodes
+       cmd: command list
+       nodeLines: dict of node (or None for root namespace) to lines
+       returns: dict of node to list of error output for each line"""
+    popens = {}
+    for node, lines in nodeLines.items():
+        # Use a temporary file for stdin, so that commands can't block
+        # while we are writing to other commands
+        stdin = TemporaryFile()
+        stdin.write( encode( ''.join( line + '\n' for line in lines ) ) )
+        stdin.seek( 0 )
+        if ( node and getattr( node, 'netnsAttached', False ) and
+                cmd[ 0 ] in ( 'ip', 'tc' ) ):
+            # ip and tc can enter a named netns themselves, which saves
+            # exec'ing mnexec and entering the node's other namespaces
+            popens[ node ] = Popen( cmd[ :1 ] + [ '-n', node.netns ] +
+                                    cmd[ 1: ], stdin=stdin, stdout=PIPE,
+                                    stderr=STDOUT )
+        else:
+            popens[ node ] = ( node.popen( cmd, stdin=stdin, stdout=PIPE,
+                                           stderr=STDOUT ) if node else
+                               Popen( cmd, stdin=stdin, stdout=PIPE,
+                                      stderr=STDOUT ) )
+        stdin.close()
+    results = {}
+    for node, popen in popens.items():
+        out, _err = popen.communicate()
+        # Error messages precede "Command failed -:<line>"
+        errors, message = [ '' ] * len( nodeLines[ node ] ), []
+        for outline in decode( out ).splitlines( True ):
+            match = re.match( r'Command failed \S+:(\d+)', outline )
+            if match:
+                line = int( match.group( 1 ) ) - 1
+                errors[ line ] = ''.join( message ) or outline
+                message = []
+            else:
+                message.append( outline )
+        results[ node ] = errors
+    return results
+
+# File listing the netns names that Mininet has registered, so that
+# cleanup can remove them without touching anyone else's namespaces
+NETNS_RECORD = '/var/run/mininet-netns'
+
+def recordedNetns( path=NETNS_RECORD ):
+    "Return set of netns names that Mininet has registered"
+    try:
+        with open( path ) as f:
+            return set( f.read().split() )
+    except IOError:
+        return set()
+
+def recordNetns( add=(), remove=(), path=NETNS_RECORD ):
+    """Add and remove netns names in our record of the names that
+       Mininet has registered
+       add, remove: lists of names"""
+    names = ( recordedNetns( path ) | set( add ) ) - set( remove )
+    try:
+        with open( path, 'w' ) as f:
+            f.write( ''.join( name + '\n' for name in sorted( names ) ) )
+    except IOError as e:
+        warn( '*** could not update %s: %s\n' % ( path, e ) )
+
+def makeIntfPairs( pairs, chunkSize=1000 ):
+    """Make many veth pairs using ip -batch, running one ip command
+       per chunkSize pairs in each node1's namespace
+       pairs: list of ( intf1, intf2, addr1, addr2, node1, node2 ),
+              as for makeIntfPair() with deleteIntfs=False
+       returns: list of error output (or '') for each pair"""
+    # Group pairs by the namespace where they are created
+    groups = {}
+    for i, ( intf1, intf2, addr1, addr2, node1, node2 ) in enumerate(
+            pairs ):
+        netns = 1 if not node2 else node2.pid
+        if addr1 is None and addr2 is None:
+            line = ( 'link add name %s type veth peer name %s netns %s' %
+                     ( intf1, intf2, netns ) )
+        else:
+            line = ( 'link add name %s address %s '
+                     'type veth peer name %s address %s netns %s' %
+                     ( intf1, addr1, intf2, addr2, netns ) )
+        groups.setdefault( node1, [] ).append( ( i, line ) )
+    errors = [ '' ] * len( pairs )
+    for node1, lines in groups.items():
+        for start in range( 0, len( lines ), chunkSize ):
+            chunk = lines[ start: start + chunkSize ]
+            # -force: keep going and report each failed line
+            chunkErrors = batchRun( [ 'ip', '-force', '-batch', '-' ],
+                                    [ line for _i, line in chunk ], node1 )
+            for ( i, _line ), err in zip( chunk, chunkErrors ):
+                errors[ i ] = err
+    return errors
+
+class IndexedList( object ):
+    """List-like sequence of unique, hashable items (e.g. nodes or
+       links) with constant-time append, remove, membership tests and
+       (amortized) indexing. Removed items leave holes in our list:
+       we skip holes at either end, and close up the others once they
+       fill half of our list, or when we need positions past them."""
+
+    _hole = object()  # marks a removed item's slot
+
+    def __init__( self, items=() ):
+        self.slots = []  # items (or holes) in order
+        self.positions = {}  # item -> index in self.slots
+        self.head = 0  # number of holes at the start of self.slots
+        self.extend( items )
+
+    def append( self, item ):
+        "Append item (if it isn't already present)"
+        if item in self.positions:
+            warn( '*** IndexedList: ignoring duplicate item %s\n' % item )
+            return
+        self.positions[ item ] = len( self.slots )
+        self.slots.append( item )
+
+    def extend( self, items ):
+        "Append items"
+        for item in items:
+            self.append( item )
+
+    def remove( self, item ):
+        "Remove item; raises ValueError if it isn't present"
+        try:
+            position = self.positions.pop( item )
+        except KeyError:
+            raise ValueError( 'IndexedList.remove(x): x not in list' )
+        slots = self.slots
+        slots[ position ] = self._hole
+        # Removing from either end (e.g. pop() or pop( 0 )) leaves
+        # no holes between our items
+        while slots and slots[ -1 ] is self._hole:
+            slots.pop()
+        while self.head < len( slots ) and slots[ self.head ] is self._hole:
+            self.head += 1
+        if 2 * len( self.positions ) <= len( slots ):
+            self.compact()
+
+    def discard( self, item ):
+        "Remove item if present"
+        if item in self.positions:
+            self.remove( item )
+
+    def pop( self, index=-1 ):
+        "Remove and return item at index (default last)"
+        item = self[ index ]
+        self.remove( item )
+        return item
+
+    def compact( self ):
+        "Close up any holes left by remove()"
+        if len( self.slots ) != len( self.positions ):
+            self.slots = [ item for item in self.slots
+                           if item is not self._hole ]
+            for i, item in enumerate( self.slots ):
+                self.positions[ item ] = i
+        self.head = 0
+
+    def _contiguous( self ):
+        "Close up any holes between our items, so positions are valid"
+        if len( self.slots ) - self.head != len( self.positions ):
+            self.compact()
+
+    def index( self, item ):
+        "Return index of item"
+        if item not in self.positions:
+            raise ValueError( '%r is not in list' % ( item, ) )
+        self._contiguous()
+        return self.positions[ item ] - self.head
+
+    def __getitem__( self, index ):
+        self._contiguous()
+        if isinstance( index, slice ):
+            return self.slots[ self.head: ][ index ]
+        if index < 0:
+            index += len( self.positions )
+        if not 0 <= index < len( self.positions ):
+            raise IndexError( 'IndexedList index out of range' )
+        return self.slots[ self.head + index ]
+
+    def __contains__( self, item ):
+        return item in self.positions
+
+    def __iter__( self ):
+        return ( item for item in self.slots if item is not self._hole )
+
+    def __reversed__( self ):
+        return ( item for item in reversed( self.slots )
+                 if item is not self._hole )
+
+    def __len__( self ):
+        return len( self.positions )
+
+    def __add__( self, other ):
+        return list( self ) + list( other )
+
+    def __radd__( self, other ):
+        return list( other ) + list( self )
+
+    def __eq__( self, other ):
+        if not isinstance( other, ( list, tuple, IndexedList ) ):
+            return NotImplemented
+        return list( self ) == list( other )
+
+    def __ne__( self, other ):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__( self ):
+        return repr( list( self ) )
+
+
+class PortAllocator( object ):
+    """Allocate port numbers starting at base: released ports are
+       reused (lowest first), and otherwise we return one more than
+       the highest port in use, so allocation doesn't depend on
+       the number of ports"""
+
+    def __init__( self, base=0 ):
+        self.base = base
+        self.nextPort = base  # one more than the highest port in use
+        self.used = set()
+        self.free = []  # heap of released ports
+
+    def allocate( self ):
+        "Return (and reserve) an unused port"
+        while self.free:
+            port = heappop( self.free )
+            if port not in self.used:
+                self.used.add( port )
+                return port
+        port = self.nextPort
+        self.reserve( port )
+        return port
+
+    def reserve( self, port ):
+        "Mark port as in use"
+        self.used.add( port )
+        if port >= self.nextPort:
+            self.nextPort = port + 1
+
+    def release( self, port ):
+        "Make port available for reuse"
+        if port in self.used:
+            self.used.remove( port )
+            heappush( self.free, port )
+
+    def __contains__( self, port ):
+        return port in self.used
+
+
+class PhaseTimer( object ):
+    """Record the elapsed (wall clock) time of successive phases
+       of a long-running operation such as Mininet.build()"""
+
+    def __init__( self ):
+        self.phases = []  # list of ( phase name, seconds )
+        self.last = time()
+
+    def phase( self, name ):
+        """Record time since the previous phase as phase name
+           returns: elapsed seconds"""
+        now = time()
+        elapsed = now - self.last
+        self.phases.append( ( name, elapsed ) )
+        self.last = now
+        return elapsed
+
+    def total( self ):
+        "Return total elapsed seconds for all phases"
+        return sum( elapsed for _name, elapsed in self.phases )
+
+    def __str__( self ):
+        return ' '.join( '%s:%.3fs' % ( name, elapsed )
+                         for name, elapsed in self.phases )
+
+
 def retry( retries, delaySecs, fn, *args, **keywords ):
     """Try something several times before giving up.
        n: number of times to retry
@@ -538,6 +828,9 @@ def mountCgroups():
     mounts = quietRun( 'grep cgroup /proc/mounts' )
     cgdir = '/sys/fs/cgroup'
     csdir = cgdir + '/cpuset'
+    if 'cgroup2 %s ' % cgdir in mounts:
+        # Unified (v2) hierarchy: controllers are enabled by Cgroup
+        return
     if ('cgroup %s' % cgdir not in mounts and
             'cgroups %s' % cgdir not in mounts):
         raise Exception( "cgroups not mounted on " + cgdir )
@@ -9,6 +9,7 @@
  *  - printing out the pid of a process so we can identify it later
  *  - attaching to a namespace and cgroup
  *  - setting RT scheduling
+ *  - serving commands over a framed protocol (see mininet/agent.py)
  *
  * Partially based on public domain setsid(1)
 */
@@ -24,6 +25,13 @@
 #include <sched.h>
 #include <ctype.h>
 #include <sys/mount.h>
+#include <sys/uio.h>
+#include <sys/wait.h>
+#include <poll.h>
+#include <signal.h>
+#include <string.h>
+#include <errno.h>
+#include <arpa/inet.h>
 
 #if !defined(VERSION)
 #define VERSION "(devel)"
@@ -32,7 +40,8 @@
 void usage(char *name)
 {
     printf("Execution utility for Mininet\n\n"
-           "Usage: %s [-cdnp] [-a pid] [-g group] [-r rtprio] cmd args...\n\n"
+           "Usage: %s [-cdnp] [-a pid] [-g group] [-r rtprio] cmd args...\n"
+           "       %s [-cdn] [-a pid] -s\n\n"
            "Options:\n"
            "  -c: close all file descriptors except stdin/out/error\n"
            "  -d: detach from tty by calling setsid()\n"
@@ -41,8 +50,9 @@ void usage(char *name)
            "  -a pid: attach to pid's network and mount namespaces\n"
            "  -g group: add to cgroup\n"
            "  -r rtprio: run with SCHED_RR (usually requires -g)\n"
+           "  -s: serve commands on stdin/stdout (see mininet/agent.py)\n"
            "  -v: print version\n",
-           name);
+           name, name);
 }
 
 
@@ -85,6 +95,17 @@ void cgroup(char *gname)
             fclose(f);
         }
     }
+    if (!count) {
+        /* cgroup v2: single unified hierarchy */
+        FILE *f;
+        snprintf(path, PATH_MAX, "/sys/fs/cgroup/%s/cgroup.procs", gname);
+        f = fopen(path, "w");
+        if (f) {
+            count++;
+            fprintf(f, "%d\n", pid);
+            fclose(f);
+        }
+    }
     if (!count) {
         fprintf(stderr, "cgroup: could not add to cgroup %s\n",
             gname);
@@ -92,6 +113,213 @@ void cgroup(char *gname)
     }
 }
 
+/* Command server (-s): we read frames from stdin and write frames to
+ * stdout, which are normally a socket. A frame is a type byte and a
+ * 4-byte (network order) payload length, followed by the payload.
+ *
+ * Requests:  'c' argv (NUL-separated): run a command
+ *            'i' data: write data to the command's stdin
+ *            'z': close the command's stdin
+ *            's' signal number: signal the command's process group
+ * Responses: 'r' pid: ready; 'p' pid: command started
+ *            'o' data, 'e' data: command's stdout/stderr
+ *            'x' status: command exited (128 + signal if killed)
+ *
+ * We run one command at a time; each is a session leader, so that
+ * signals reach its children too. When stdin closes, or we get
+ * SIGHUP, we hang up on the running command and exit.
+ */
+
+static volatile sig_atomic_t hungup = 0;
+
+void hup(int sig)
+{
+    hungup = sig;
+}
+
+/* Read exactly len bytes; return 0 on EOF or error */
+int readn(int fd, char *buf, size_t len)
+{
+    ssize_t n;
+    while (len > 0) {
+        n = read(fd, buf, len);
+        if (n < 0 && errno == EINTR && !hungup)
+            continue;
+        if (n <= 0)
+            return 0;
+        buf += n;
+        len -= n;
+    }
+    return 1;
+}
+
+/* Write a frame to stdout, exiting if we can't */
+void sendframe(char type, const char *data, size_t len)
+{
+    char header[5];
+    uint32_t nlen = htonl(len);
+    struct iovec iov[2];
+    ssize_t n;
+    header[0] = type;
+    memcpy(header + 1, &nlen, 4);
+    iov[0].iov_base = header;
+    iov[0].iov_len = 5;
+    iov[1].iov_base = (char *) data;
+    iov[1].iov_len = len;
+    while (iov[0].iov_len + iov[1].iov_len > 0) {
+        n = writev(1, iov, 2);
+        if (n < 0 && errno == EINTR)
+            continue;
+        if (n < 0)
+            exit(1);
+        if ((size_t) n >= iov[0].iov_len) {
+            n -= iov[0].iov_len;
+            iov[0].iov_len = 0;
+            iov[1].iov_base = (char *) iov[1].iov_base + n;
+            iov[1].iov_len -= n;
+        } else {
+            iov[0].iov_base = (char *) iov[0].iov_base + n;
+            iov[0].iov_len -= n;
+        }
+    }
+}
+
+void sendint(char type, int value)
+{
+    char buf[16];
+    sendframe(type, buf, snprintf(buf, sizeof(buf), "%d", value));
+}
+
+/* Fork and exec NUL-separated argv; return pid */
+pid_t spawn(char *args, size_t len, int *in, int *out, int *err)
+{
+    int pin[2], pout[2], perr[2];
+    char *argv[256];
+    int argc = 0;
+    size_t i = 0;
+    pid_t pid;
+    while (i < len && argc < 255) {
+        argv[argc++] = args + i;
+        i += strlen(args + i) + 1;
+    }
+    argv[argc] = NULL;
+    if (argc == 0 || pipe(pin) < 0 || pipe(pout) < 0 || pipe(perr) < 0)
+        return -1;
+    pid = fork();
+    if (pid == 0) {
+        setsid();
+        signal(SIGHUP, SIG_DFL);
+        dup2(pin[0], 0);
+        dup2(pout[1], 1);
+        dup2(perr[1], 2);
+        close(pin[0]); close(pin[1]);
+        close(pout[0]); close(pout[1]);
+        close(perr[0]); close(perr[1]);
+        execvp(argv[0], argv);
+        perror(argv[0]);
+        _exit(127);
+    }
+    close(pin[0]);
+    close(pout[1]);
+    close(perr[1]);
+    *in = pin[1];
+    *out = pout[0];
+    *err = perr[0];
+    return pid;
+}
+
+int serve(void)
+{
+    char header[5], *payload = NULL, buf[65536];
+    uint32_t len;
+    int in = -1, status, i;
+    pid_t pid = -1;
+    struct pollfd fds[3];
+    ssize_t n;
+
+    signal(SIGHUP, hup);
+    signal(SIGPIPE, SIG_IGN);
+    sendint('r', getpid());
+    fds[0].fd = 0;
+    fds[1].fd = fds[2].fd = -1;
+    for (i = 0; i < 3; i++)
+        fds[i].events = POLLIN;
+    while (!hungup) {
+        if (poll(fds, 3, -1) < 0) {
+            if (errno == EINTR)
+                continue;
+            break;
+        }
+        /* Command output; fd 1 is stdout and fd 2 is stderr */
+        for (i = 1; i < 3; i++) {
+            if (fds[i].fd < 0 || !fds[i].revents)
+                continue;
+            n = read(fds[i].fd, buf, sizeof(buf));
+            if (n > 0) {
+                sendframe(i == 1 ? 'o' : 'e', buf, n);
+            } else if (n == 0 || errno != EINTR) {
+                close(fds[i].fd);
+                fds[i].fd = -1;
+            }
+        }
+        /* Command complete once its stdout and stderr are closed */
+        if (pid > 0 && fds[1].fd < 0 && fds[2].fd < 0) {
+            while (waitpid(pid, &status, 0) < 0 && errno == EINTR)
+                ;
+            sendint('x', WIFSIGNALED(status) ?
+                    128 + WTERMSIG(status) : WEXITSTATUS(status));
+            if (in >= 0)
+                close(in);
+            pid = in = -1;
+        }
+        if (!fds[0].revents)
+            continue;
+        /* Request */
+        if (!readn(0, header, 5))
+            break;
+        memcpy(&len, header + 1, 4);
+        len = ntohl(len);
+        payload = realloc(payload, len + 1);
+        if (!payload || !readn(0, payload, len))
+            break;
+        payload[len] = '\0';
+        switch (header[0]) {
+        case 'c':
+            if (pid > 0) {
+                sendint('x', -1);
+                break;
+            }
+            pid = spawn(payload, len, &in, &fds[1].fd, &fds[2].fd);
+            if (pid < 0) {
+                pid = -1;
+                sendint('x', -1);
+            } else {
+                sendint('p', pid);
+            }
+            break;
+        case 'i':
+            if (in >= 0 && write(in, payload, len) < 0) {
+                close(in);
+                in = -1;
+            }
+            break;
+        case 'z':
+            if (in >= 0)
+                close(in);
+            in = -1;
+            break;
+        case 's':
+            /* If it hasn't called setsid() yet, signal it directly */
+            if (pid > 0 && kill(-pid, atoi(payload)) < 0)
+                kill(pid, atoi(payload));
+            break;
+        }
+    }
+    if (pid > 0)
+        kill(-pid, SIGHUP);
+    return 0;
+}
+
 int main(int argc, char *argv[])
 {
     int c;
@@ -102,7 +330,7 @@ int main(int argc, char *argv[])
     char *cwd = get_current_dir_name();
 
     static struct sched_param sp;
-    while ((c = getopt(argc, argv, "+cdnpa:g:r:vh")) != -1)
+    while ((c = getopt(argc, argv, "+cdnpa:g:r:svh")) != -1)
         switch(c) {
         case 'c':
             /* close file descriptors except stdin/out/error */
@@ -193,6 +421,9 @@ int main(int argc, char *argv[])
                 return 1;
             }
             break;
+        case 's':
+            /* Serve commands rather than running one */
+            return serve();
         case 'v':
             printf("%s\n", VERSION);
             exit(0);